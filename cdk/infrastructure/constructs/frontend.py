@@ -124,6 +124,8 @@ class Frontend(Construct):
             domain_zone=self.props.existing_resources.domain.zone,
             domain_name=self.domain_name,
             redirect_http=True,
+            # Long enough for answers that take several LLM calls
+            idle_timeout=Duration.seconds(300),
         )
 
     def _add_application_container_to_task(self) -> None:
@@ -143,6 +145,9 @@ class Frontend(Construct):
             environment={
                 'NODE_ENV': 'production',
                 'BACKEND_URL': self.props.config.backend_url,
+                # gunicorn.conf.py sizes workers and threads from these
+                'TASK_CPU_UNITS': str(self.props.cpu),
+                'TASK_MEMORY_MIB': str(self.props.memory_limit_mib),
             },
             secrets={
                 'CATALOG_USERNAME': Secret.from_secrets_manager(catalog_llm_secret, 'CATALOG_USERNAME'),
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_question(question):
+    # Punctuation becomes whitespace rather than disappearing so that
+    # identifiers like '1.5' and '15' still produce different keys.
+    folded = _PUNCTUATION.sub(' ', question.casefold())
+    return ' '.join(folded.split())
+
+
+def catalog_version(collection_schema, data_release=None):
+    # Only the structure of the schema is fingerprinted: example documents
+    # are sampled per worker and would otherwise differ between processes.
+    structure = []
+    for collection in collection_schema or []:
+        collection_type = collection.get('collection_type')
+        properties = collection.get(f'{collection_type}_properties') or []
+        structure.append([
+            collection['collection_name'],
+            collection_type,
+            sorted((p['name'], p['type']) for p in properties),
+        ])
+    payload = json.dumps([data_release or '', structure], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class AnswerCache:
+    """Two-tier cache of complete `ask_llm` responses.
+
+    The first tier is an in-process LRU with a TTL. The optional second tier
+    is a SQLite file shared by every worker on the host. Entries are tagged
+    with the catalog version and ignored once the version changes.
+    """
+
+    def __init__(self, max_size=256, ttl=3600, path=None, version=''):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.version = version
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._connection = None
+        self._connection_pid = None
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def make_key(self, question, *parts):
+        payload = json.dumps([normalize_question(question), *parts])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['disk_hits'] += 1
+            self._remember(key, value, now + self.ttl)
+        return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+        self._disk_set(key, value, expires_at)
+
+    def set_version(self, version):
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._memory.clear()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            connection = self._disk()
+            if connection is not None:
+                with connection:
+                    connection.execute('DELETE FROM answers')
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'version': self.version,
+                'size': len(self._memory),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'shared': self.path is not None,
+                **self._counters,
+            }
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _disk(self):
+        if self.path is None:
+            return None
+        # SQLite connections must not cross a fork, so each worker opens its
+        # own the first time it touches the shared tier.
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=5, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS answers ('
+                'key TEXT PRIMARY KEY, version TEXT, expires_at REAL, '
+                'value TEXT)'
+            )
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _disk_get(self, key, now):
+        with self._lock:
+            connection = self._disk()
+            if connection is None:
+                return None
+            row = connection.execute(
+                'SELECT value FROM answers '
+                'WHERE key = ? AND version = ? AND expires_at > ?',
+                (key, self.version, now),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def _disk_set(self, key, value, expires_at):
+        with self._lock:
+            connection = self._disk()
+            if connection is None:
+                return
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)',
+                    (key, self.version, expires_at,
+                     json.dumps(value, default=str)),
+                )
+                connection.execute(
+                    'DELETE FROM answers '
+                    'WHERE expires_at <= ? OR version != ?',
+                    (time.time(), self.version),
+                )
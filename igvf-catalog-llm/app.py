@@ -1,16 +1,47 @@
+import asyncio
+import json
 import os
-from flask import Flask, request, jsonify
+import queue
+import threading
+import time
+from flask import Flask, Response, request, jsonify, stream_with_context
 from arango import ArangoClient
-from langchain_community.graphs import ArangoGraph
-from langchain.chains import ArangoGraphQAChain
 from langchain_openai import ChatOpenAI
 from aql_examples import AQL_EXAMPLES
-from select_collections import select_collections
+from select_collections import (aselect_collections, select_collections,
+                                SELECT_COLLECTIONS_MODEL)
 from langchain_community.callbacks import get_openai_callback
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
-from prompt_template import AQL_GENERATION_PROMPT
+from answer_cache import AnswerCache, catalog_version, normalize_question
+from async_arango import AsyncArangoDatabase
+from aql_cache import AqlCache
+from aql_guard import AqlGuard
+from aql_validator import AqlValidator
+from result_cache import ResultCache
+from result_renderer import ResultRenderer
+from metrics import (ShapeTimings, metrics, prompt_cache_hit_rates,
+                     record_schema_report, record_token_usage,
+                     repair_success_rate)
+from collection_classifier import CollectionClassifier
+from example_bank import ExampleBank
+from example_selector import ExampleSelector, parse_examples
+from fast_path import FastPath
+from catalog_chain import AQL_ONLY, FULL, MODES, RAW, CatalogGraphQAChain
+from entity_index import EntityIndex, entity_collections, format_entities
+from schema_registry import GraphView, SchemaRegistry
+from single_flight import SingleFlight
+from schema_builder import build_schema
+from schema_snapshot import (SnapshotArangoGraph, build_snapshot,
+                             load_snapshot, write_snapshot)
+from http_clients import PooledArangoHTTPClient, openai_pool
+from prompt_template import (AQL_GENERATION_PROMPT, AQL_REPAIR_PROMPT,
+                             PROMPT_VERSION)
+
+
+def env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
 
 
 # Initialize Flask app
@@ -19,27 +50,122 @@ app = Flask(__name__)
 BACKEND_URL = os.environ.get('BACKEND_URL', 'https://db-dev.catalog.igvf.org/')
 DB_NAME = 'igvf'
 OPENAI_MODEL = 'gpt-4.1'
+# Bump when the catalog is reloaded so cached answers are invalidated
+CATALOG_DATA_RELEASE = os.environ.get('CATALOG_DATA_RELEASE')
+# Schema snapshot written by `python schema_snapshot.py`; workers load it
+# instead of sampling every collection at start up.
+SCHEMA_SNAPSHOT_PATH = os.environ.get('SCHEMA_SNAPSHOT_PATH')
+SCHEMA_SNAPSHOT_MAX_AGE = int(os.environ.get('SCHEMA_SNAPSHOT_MAX_AGE', 86400))
+# Used when there is no snapshot and collections have to be sampled
+SCHEMA_SAMPLE_WORKERS = int(os.environ.get('SCHEMA_SAMPLE_WORKERS', 8))
+SCHEMA_SAMPLE_SIZE = int(os.environ.get('SCHEMA_SAMPLE_SIZE', 1))
+SCHEMA_SAMPLE_TIMEOUT = int(os.environ.get('SCHEMA_SAMPLE_TIMEOUT', 30))
+# Keep-alive connections to ArangoDB per worker, shared by every thread or
+# task, and seconds a query may take to answer
+ARANGO_POOL_SIZE = int(os.environ.get(
+    'ARANGO_POOL_SIZE', max(SCHEMA_SAMPLE_WORKERS, 16)))
+ARANGO_TIMEOUT = int(os.environ.get('ARANGO_TIMEOUT', 60))
+# Number of few-shot examples included in each AQL generation prompt
+AQL_EXAMPLES_TOP_K = int(os.environ.get('AQL_EXAMPLES_TOP_K', 4))
+# Successful generations are kept as extra few-shot examples
+EXAMPLE_BANK_PATH = os.environ.get('EXAMPLE_BANK_PATH')
+EXAMPLE_BANK_TOP_K = int(os.environ.get('EXAMPLE_BANK_TOP_K', 2))
+# Collections are sent as field names and types with truncated examples,
+# packed under a token budget (0 disables the budget)
+SCHEMA_COMPACT = env_flag('SCHEMA_COMPACT', 'true')
+SCHEMA_TOKEN_BUDGET = int(os.environ.get('SCHEMA_TOKEN_BUDGET', 4000)) or None
+# Ask ArangoDB to cache results of read-only generated queries; needs the
+# server's query cache mode set to `demand`
+ARANGO_QUERY_CACHE = env_flag('ARANGO_QUERY_CACHE', 'false')
+# Run generated queries with their literals lifted into bind variables
+AQL_PARAMETERIZE = env_flag('AQL_PARAMETERIZE', 'true')
+# Check generated queries against the schema before executing them;
+# rejected queries go back to the model with the problems found
+AQL_VALIDATE = env_flag('AQL_VALIDATE', 'true')
+AQL_REQUIRE_LIMIT = env_flag('AQL_REQUIRE_LIMIT', 'true')
+# Repairs of a failed query each request may ask the model for
+AQL_REPAIR_ATTEMPTS = int(os.environ.get('AQL_REPAIR_ATTEMPTS', 4))
+# Candidate queries generated concurrently for each question (1 disables),
+# and seconds the others get to arrive once one is valid
+AQL_CANDIDATES = int(os.environ.get('AQL_CANDIDATES', 1))
+AQL_CANDIDATE_GRACE = float(os.environ.get('AQL_CANDIDATE_GRACE', 1.0))
+# Answer empty and small, regular results from templates instead of the
+# summarization prompt
+RENDER_SMALL_RESULTS = env_flag('RENDER_SMALL_RESULTS', 'true')
+# Explain generated queries and reject expensive plans before they run;
+# missing LIMITs and known index hints are added instead of rejected
+AQL_GUARD = env_flag('AQL_GUARD', 'true')
+# Directory of the entity index built with `python entity_index.py`
+ENTITY_INDEX_PATH = os.environ.get('ENTITY_INDEX_PATH')
+# Common question shapes are answered with templated AQL and no LLM calls
+FAST_PATH_ENABLED = env_flag('FAST_PATH_ENABLED', 'true')
+# Identical questions asked while one is being answered wait for its answer
+SINGLE_FLIGHT_ENABLED = env_flag('SINGLE_FLIGHT_ENABLED', 'true')
 
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
 limiter.init_app(app)
 
+arango_http_client = PooledArangoHTTPClient(
+    pool_maxsize=ARANGO_POOL_SIZE, request_timeout=ARANGO_TIMEOUT)
 
-def initialize_arango_graph():
-    # Connect to ArangoDB and initialize graph
 
-    username = os.environ['CATALOG_USERNAME']
-    password = os.environ['CATALOG_PASSWORD']
-    client = ArangoClient(hosts=BACKEND_URL)
+def connect_arango_db(http_client, verify=False):
+    client = ArangoClient(hosts=BACKEND_URL, http_client=http_client)
+    return client.db(DB_NAME, username=os.environ['CATALOG_USERNAME'],
+                     password=os.environ['CATALOG_PASSWORD'], verify=verify)
+
+
+def initialize_arango_graph():
+    # Connect to ArangoDB and initialize graph. The connection is verified
+    # up front: a graph loaded from a snapshot sends no request of its own.
     try:
-        db = client.db(DB_NAME, username=username, password=password)
+        db = connect_arango_db(arango_http_client, verify=True)
+        snapshot = load_snapshot(
+            SCHEMA_SNAPSHOT_PATH,
+            max_age=SCHEMA_SNAPSHOT_MAX_AGE,
+            backend_url=BACKEND_URL,
+            data_release=CATALOG_DATA_RELEASE,
+        )
+        if snapshot is not None:
+            graph = SnapshotArangoGraph(db, snapshot['schema'])
+        else:
+            schema = build_schema(
+                db,
+                sample_size=SCHEMA_SAMPLE_SIZE,
+                timeout=SCHEMA_SAMPLE_TIMEOUT,
+                max_workers=SCHEMA_SAMPLE_WORKERS,
+            )
+            graph = SnapshotArangoGraph(db, schema)
+            save_schema_snapshot(schema)
         # Return graph, connection status (True), and no error
-        return ArangoGraph(db), True, None
+        return graph, True, None
     except Exception as e:
         # Return None graph, connection status (False), and the error
         return None, False, str(e)
 
 
+def initialize_async_db(graph):
+    # Used by the ASGI entry point; the Flask app keeps to python-arango.
+    if not graph:
+        return None
+    return AsyncArangoDatabase(
+        BACKEND_URL, DB_NAME,
+        os.environ['CATALOG_USERNAME'], os.environ['CATALOG_PASSWORD'],
+        timeout=ARANGO_TIMEOUT, max_connections=ARANGO_POOL_SIZE)
+
+
+def save_schema_snapshot(schema):
+    if not SCHEMA_SNAPSHOT_PATH:
+        return
+    snapshot = build_snapshot(
+        schema, BACKEND_URL, DB_NAME, CATALOG_DATA_RELEASE)
+    try:
+        write_snapshot(SCHEMA_SNAPSHOT_PATH, snapshot)
+    except OSError as e:
+        print(f'Could not write schema snapshot: {e}')
+
+
 def initialize_collection_names(collection_schema):
     collection_names = [collection['collection_name']
                         for collection in collection_schema]
@@ -48,17 +174,176 @@ def initialize_collection_names(collection_schema):
 
 def initialize_llm():
 
-    model = ChatOpenAI(temperature=0, model_name=OPENAI_MODEL)
+    # Streamed answers report token usage too. Requests share this worker's
+    # keep-alive connections to OpenAI.
+    model = ChatOpenAI(temperature=0, model_name=OPENAI_MODEL,
+                       stream_usage=True,
+                       http_client=openai_pool.http_client,
+                       http_async_client=openai_pool.async_http_client,
+                       timeout=openai_pool.timeout)
     return model
 
 
-def ask_llm(question):
-    selected_collection_names = select_collections(question, collection_names)
+def initialize_answer_cache(collection_schema):
+    return AnswerCache(
+        max_size=int(os.environ.get('ANSWER_CACHE_SIZE', 256)),
+        ttl=int(os.environ.get('ANSWER_CACHE_TTL', 3600)),
+        path=os.environ.get('ANSWER_CACHE_PATH'),
+        version=catalog_version(collection_schema, CATALOG_DATA_RELEASE),
+    )
+
+
+def initialize_aql_cache():
+    return AqlCache(
+        max_size=int(os.environ.get('AQL_CACHE_SIZE', 1024)),
+        ttl=int(os.environ.get('AQL_CACHE_TTL', 0)),
+    )
+
+
+def initialize_result_cache(graph):
+    def marker(collection_name):
+        # A collection's revision changes whenever its documents do.
+        revision = graph.db.collection(collection_name).revision()
+        return (CATALOG_DATA_RELEASE, revision)
+
+    return ResultCache(
+        max_size=int(os.environ.get('RESULT_CACHE_SIZE', 512)),
+        marker=marker if graph else None,
+        check_interval=int(os.environ.get('RESULT_CACHE_CHECK_INTERVAL', 60)),
+    )
+
+
+def initialize_aql_guard(graph, async_db=None):
+    if not graph or not AQL_GUARD:
+        return None
+    return AqlGuard(
+        graph.db,
+        max_cost=float(os.environ.get('AQL_MAX_COST', 10_000_000)),
+        max_full_scan=int(os.environ.get('AQL_MAX_FULL_SCAN', 1_000_000)),
+        max_runtime=float(os.environ.get('AQL_MAX_RUNTIME', 30)),
+        memory_limit=int(os.environ.get('AQL_MEMORY_LIMIT', 0)),
+        async_db=async_db,
+    )
+
+
+def initialize_collection_classifier(collection_schema):
+    return CollectionClassifier(
+        collection_schema,
+        threshold=float(os.environ.get(
+            'COLLECTION_CLASSIFIER_THRESHOLD', 0.75)),
+        log_path=os.environ.get('COLLECTION_SELECTION_LOG'),
+    )
+
+
+def ask_llm(question, mode=FULL, on_event=None):
+    response, cache_key = answer_without_chain(question, mode)
+    if response is not None:
+        return response
+
+    # The local classifier answers most questions and only defers to the
+    # LLM-based selector when it is not confident.
+    entities = entity_index.resolve(question)
+    selected_collection_names = collection_classifier.select(
+        question, collection_names, fallback=select_collections,
+        entity_collections=entity_collections(entities))
+    chain = build_chain(question, selected_collection_names, entities, mode,
+                        on_event)
+    with get_openai_callback() as cb:
+        input_data = {
+            'user_input': question,
+            'query': question,
+        }
+        response = chain.invoke(input_data)
+        print(cb)
+    record_answer(question, mode, cache_key, response, cb)
+    return response
+
+
+async def aask_llm(question, mode=FULL, on_event=None):
+    """`ask_llm` for the ASGI app: model and database calls are awaited.
+
+    The fast path and the answer cache stay synchronous and run in a thread.
+    """
+    response, cache_key = await asyncio.to_thread(
+        answer_without_chain, question, mode)
+    if response is not None:
+        return response
+
+    entities = entity_index.resolve(question)
+    selected_collection_names = await collection_classifier.aselect(
+        question, collection_names, fallback=aselect_collections,
+        entity_collections=entity_collections(entities))
+    chain = build_chain(question, selected_collection_names, entities, mode,
+                        on_event)
+    with get_openai_callback() as cb:
+        input_data = {
+            'user_input': question,
+            'query': question,
+        }
+        response = await chain.ainvoke(input_data)
+        print(cb)
+    await asyncio.to_thread(
+        record_answer, question, mode, cache_key, response, cb)
+    return response
+
+
+def coalesced_ask_llm(question, mode=FULL):
+    """`ask_llm`, shared with an identical question already being answered."""
+    if single_flight is None:
+        return ask_llm(question, mode)
+    response = single_flight.do(
+        (normalize_question(question), mode), ask_llm, question, mode)
+    return with_question(response, question)
+
+
+async def coalesced_aask_llm(question, mode=FULL):
+    if single_flight is None:
+        return await aask_llm(question, mode)
+    response = await single_flight.ado(
+        (normalize_question(question), mode), aask_llm, question, mode)
+    return with_question(response, question)
+
+
+def with_question(response, question):
+    # Callers that shared an answer each see their own wording
+    response = dict(response)
+    for key in ('query', 'user_input'):
+        if key in response:
+            response[key] = question
+    return response
+
+
+def answer_without_chain(question, mode):
+    """A fast path or cached response, and the answer cache key."""
+    if fast_path is not None:
+        started = time.time()
+        response = fast_path.answer(question, execute=mode != AQL_ONLY)
+        if response is not None:
+            metrics.observe('fast_path.seconds', time.time() - started)
+            return response, None
+
+    cache_key = answer_cache.make_key(
+        question, SELECT_COLLECTIONS_MODEL, OPENAI_MODEL, PROMPT_VERSION)
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        return {**cached, 'query': question, 'user_input': question}, cache_key
+    return None, cache_key
+
+
+def build_chain(question, selected_collection_names, entities, mode=FULL,
+                on_event=None):
+    if on_event is not None:
+        on_event('collections',
+                 {'collections': list(selected_collection_names)})
     updated_graph = get_updated_graph(
-        graph, collection_schema, selected_collection_names)
-    chain = ArangoGraphQAChain.from_llm(
+        graph, schema_registry, selected_collection_names)
+    schema_report = updated_graph.schema.report()
+    print(f'Schema prompt: {schema_report}')
+    record_schema_report(schema_report)
+    chain = CatalogGraphQAChain.from_llm(
         model,
         aql_generation_prompt=AQL_GENERATION_PROMPT,
+        aql_fix_prompt=AQL_REPAIR_PROMPT,
         graph=updated_graph,
         verbose=True,
         allow_dangerous_requests=True,
@@ -68,7 +353,11 @@ def ask_llm(question):
     chain.top_k = 5
     # Specify the maximum amount of AQL Generation attempts that should be made
     # before returning an error
-    chain.max_aql_generation_attempts = 5
+    chain.max_aql_generation_attempts = 1 + AQL_REPAIR_ATTEMPTS
+    # Several first queries at once trade tokens for tail latency: a bad
+    # candidate no longer costs a serial repair round trip.
+    chain.candidates = AQL_CANDIDATES
+    chain.candidate_grace = AQL_CANDIDATE_GRACE
 
     # Specify whether or not to return the AQL Query in the output dictionary
     # Use `chain("...")` instead of `chain.invoke("...")` to see this change
@@ -79,102 +368,247 @@ def ask_llm(question):
     chain.return_aql_result = True
     # The AQL Examples modifier instructs the LLM to adapt its AQL-completion style
     # to the user's examples. These examples arepassed to the AQL Generation Prompt
-    # Template to promote few-shot-learning.
-
-    chain.aql_examples = AQL_EXAMPLES
-    with get_openai_callback() as cb:
-        input_data = {
-            'user_input': question,
-            'query': question,
-        }
-        response = chain.invoke(input_data)
-        print(cb)
-    return response
+    # Template to promote few-shot-learning. Only the examples closest to the
+    # selected collections and the question are sent.
+
+    chain.aql_examples = example_selector.select(
+        question, selected_collection_names)
+    # Identifiers resolved locally let the model look documents up by _id
+    # instead of guessing name filters.
+    chain.entities = format_entities(entities)
+    # AQL generated earlier for the same question and collections is reused,
+    # so only execution and summarization run on a hit.
+    chain.aql_cache = aql_cache
+    chain.aql_cache_key = aql_cache.make_key(
+        question, selected_collection_names, PROMPT_VERSION, schema_version)
+    chain.validator = aql_validator
+    chain.renderer = result_renderer
+    chain.mode = mode
+    chain.on_event = on_event
+    return chain
+
+
+def record_answer(question, mode, cache_key, response, cb):
+    record_token_usage('aql_chain', cb.prompt_tokens,
+                       cb.prompt_tokens_cached, cb.completion_tokens)
+    if response.get('aql_query') and response.get('aql_result'):
+        example_bank.record(question, response['aql_query'])
+    # Cached answers serve every mode, so only complete ones are stored.
+    if mode == FULL:
+        answer_cache.set(cache_key, response)
 
 
 graph, arango_healthy, arango_error = initialize_arango_graph()
 if graph:
+    schema_registry = SchemaRegistry(
+        graph.schema, compact=SCHEMA_COMPACT, token_budget=SCHEMA_TOKEN_BUDGET)
     collection_schema = graph.schema['Collection Schema']
     collection_names = initialize_collection_names(collection_schema)
     model = initialize_llm()
 else:
+    schema_registry = SchemaRegistry(None)
     collection_schema = None
     collection_names = []
     model = None
     print(f'Error initializing ArangoDB graph: {arango_error}')
-
-
-def get_updated_graph(graph, collection_schema, selected_collection_names):
-    collection_schema_updated = []
-    for collection_name in selected_collection_names:
-        for collection in collection_schema:
-            if collection['collection_name'] == collection_name:
-                collection_schema_updated.append(collection)
-                break
-    updated_graph = graph
-    updated_graph.schema['Collection Schema'] = collection_schema_updated
-    return updated_graph
-
-
-def build_response(block):
+schema_version = catalog_version(collection_schema, CATALOG_DATA_RELEASE)
+answer_cache = initialize_answer_cache(collection_schema)
+aql_cache = initialize_aql_cache()
+result_cache = initialize_result_cache(graph)
+shape_timings = ShapeTimings(
+    max_size=int(os.environ.get('AQL_SHAPE_TIMINGS_SIZE', 100)))
+async_db = initialize_async_db(graph)
+aql_guard = initialize_aql_guard(graph, async_db)
+result_renderer = ResultRenderer() if RENDER_SMALL_RESULTS else None
+# The guard adds a missing LIMIT itself, which is cheaper than asking the
+# model for a fixed query.
+aql_validator = AqlValidator(
+    collection_schema,
+    require_limit=AQL_REQUIRE_LIMIT and aql_guard is None,
+) if AQL_VALIDATE else None
+collection_classifier = initialize_collection_classifier(collection_schema)
+static_examples = parse_examples(AQL_EXAMPLES)
+example_bank = ExampleBank(
+    EXAMPLE_BANK_PATH, known=[example.aql for example in static_examples])
+example_selector = ExampleSelector(
+    static_examples, k=AQL_EXAMPLES_TOP_K, bank=example_bank,
+    bank_k=EXAMPLE_BANK_TOP_K)
+fast_path = FastPath(graph.db) if graph and FAST_PATH_ENABLED else None
+single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
+entity_index = EntityIndex.load(ENTITY_INDEX_PATH)
+
+
+def after_fork():
+    """Give a worker forked from a preloading master its own connections.
+
+    Workers would otherwise share the master's keep-alive sockets to
+    ArangoDB, so the graph, guard and fast path move to a client created in
+    the worker. The model is rebuilt on this process's OpenAI connection pool.
+    """
+    global arango_http_client, model
+    if graph:
+        arango_http_client = PooledArangoHTTPClient(
+            pool_maxsize=ARANGO_POOL_SIZE, request_timeout=ARANGO_TIMEOUT)
+        db = connect_arango_db(arango_http_client)
+        graph.set_db(db)
+        if aql_guard is not None:
+            aql_guard.db = db
+        if fast_path is not None:
+            fast_path.db = db
+    if model is not None:
+        model = initialize_llm()
+
+
+def get_updated_graph(graph, schema_registry, selected_collection_names):
+    # Requests get their own read-only view instead of mutating the shared
+    # graph, so concurrent requests never see each other's selection.
+    return GraphView(graph.db, schema_registry.view(selected_collection_names),
+                     result_cache=result_cache,
+                     server_cache=ARANGO_QUERY_CACHE,
+                     parameterize=AQL_PARAMETERIZE, guard=aql_guard,
+                     async_db=async_db, shape_timings=shape_timings)
+
+
+# Fields each mode does not produce
+OMITTED_FIELDS = {
+    AQL_ONLY: ['aql_result', 'result'],
+    RAW: ['result'],
+    FULL: [],
+}
+
+
+def build_response(block, mode=FULL):
+    omitted = ['aql_examples', 'user_input'] + OMITTED_FIELDS[mode]
     return {
-        **{k: v for k, v in block.items() if k not in ['aql_examples', 'user_input']},
+        **{k: v for k, v in block.items() if k not in omitted},
         'title': 'IGVF Catalog LLM Query',
     }
 # Create Flask endpoint for querying
 
 
-@app.route('/query', methods=['POST'])
-@limiter.limit('10 per minute')
-def query():
-    data = request.get_json()
+def check_query_request(data):
+    """Question and mode of a query request, or an error body and status.
+
+    Shared by the Flask routes and the ASGI app in asgi.py.
+    """
     if not data or 'password' not in data or 'query' not in data:
-        return jsonify({'error': 'password and query are required'}), 400
+        return None, None, ({'error': 'password and query are required'}, 400)
 
     # Check password
     if data['password'] != os.environ.get('CATALOG_PASSWORD'):
-        return jsonify({'error': 'wrong password'}), 403
+        return None, None, ({'error': 'wrong password'}, 403)
 
-    user_query = data['query']
+    mode = data.get('mode', FULL)
+    if mode not in MODES:
+        error = f'mode must be one of {", ".join(MODES)}'
+        return None, None, ({'error': error}, 400)
 
     if not model or not graph or not collection_schema:
-        return jsonify({'error': 'LLM or ArangoDB graph not initialized properly'}), 503
+        error = 'LLM or ArangoDB graph not initialized properly'
+        return None, None, ({'error': error}, 503)
+    return data['query'], mode, None
 
-    try:
-        response = ask_llm(user_query)
-        return jsonify(build_response(response))
-    except ValueError as e:
-        if 'Response is Invalid' in str(e):
-            response = {
-                'query': user_query,
-                'error': str(e),
-                'result': "Sorry, I can't help with this right now."
-            }
-            return jsonify(build_response(response))
-        error = {
+
+def parse_query_request():
+    """The question and mode of a query request, or an error response."""
+    user_query, mode, error = check_query_request(request.get_json())
+    if error is not None:
+        body, status = error
+        return None, None, (jsonify(body), status)
+    return user_query, mode, None
+
+
+def error_response(user_query, e, mode=FULL):
+    """Response body and status for an exception raised while answering."""
+    if isinstance(e, ValueError) and 'Response is Invalid' in str(e):
+        response = {
             'query': user_query,
-            'error': str(e)
+            'error': str(e),
+            'result': "Sorry, I can't help with this right now."
         }
-        return jsonify(error), 422
+        return build_response(response, mode), 200
+    error = {
+        'query': user_query,
+        'error': str(e)
+    }
+    return error, 422 if isinstance(e, ValueError) else 500
+
+
+@app.route('/query', methods=['POST'])
+@limiter.limit('10 per minute')
+def query():
+    user_query, mode, error = parse_query_request()
+    if error is not None:
+        return error
+
+    try:
+        started = time.time()
+        response = coalesced_ask_llm(user_query, mode)
+        metrics.observe(f'query.{mode}.seconds', time.time() - started)
+        return jsonify(build_response(response, mode))
     except Exception as e:
-        error = {
-            'query': user_query,
-            'error': str(e)
-        }
-        return jsonify(error), 500
+        body, status = error_response(user_query, e, mode)
+        return jsonify(body), status
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+def stream_answer(user_query, mode):
+    """Server-sent events for each stage of ask_llm, then the full response.
+
+    The pipeline runs in a thread of its own and hands its events over a
+    queue, so each one is written out as soon as its stage finishes.
+    """
+    events = queue.Queue()
+
+    def run():
+        started = time.time()
+        try:
+            response = ask_llm(
+                user_query, mode,
+                on_event=lambda event, data: events.put((event, data)))
+            metrics.observe(f'query.{mode}.seconds', time.time() - started)
+            events.put(('answer', build_response(response, mode)))
+        except Exception as e:
+            body, status = error_response(user_query, e, mode)
+            events.put(('answer' if status == 200 else 'error', body))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item = events.get()
+        if item is None:
+            return
+        yield format_event(*item)
+
+
+@app.route('/query/stream', methods=['POST'])
+@limiter.limit('10 per minute')
+def query_stream():
+    user_query, mode, error = parse_query_request()
+    if error is not None:
+        return error
+    return Response(
+        stream_with_context(stream_answer(user_query, mode)),
+        mimetype='text/event-stream',
+        # Proxies must pass events through as they are written
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 # Create Flask endpoint for health check
 
 
-@app.route('/health', methods=['GET'])
-def healthcheck():
+def health_status():
     if arango_healthy and model is not None:
-        return jsonify({
+        return {
             'status': 'OK',
             'arangodb': 'OK',
             'llm': 'OK',
             'backend_url': BACKEND_URL
-        }), 200
+        }, 200
     else:
         status = {'status': 'ERROR'}
         if not arango_healthy:
@@ -185,7 +619,47 @@ def healthcheck():
             status['llm'] = 'ERROR: LLM not initialized'
         else:
             status['llm'] = 'OK'
-        return jsonify(status), 503
+        return status, 503
+
+
+@app.route('/health', methods=['GET'])
+def healthcheck():
+    body, status = health_status()
+    return jsonify(body), status
+
+
+def stats_of(component):
+    return component.stats() if component is not None else None
+
+
+def metrics_body():
+    return {
+        'answer_cache': answer_cache.stats(),
+        'aql_cache': aql_cache.stats(),
+        'result_cache': result_cache.stats(),
+        'aql_shapes': shape_timings.snapshot(),
+        'aql_validator': stats_of(aql_validator),
+        'aql_guard': stats_of(aql_guard),
+        'result_renderer': stats_of(result_renderer),
+        'collection_classifier': collection_classifier.stats(),
+        'example_bank': example_bank.stats(),
+        'fast_path': stats_of(fast_path),
+        'single_flight': stats_of(single_flight),
+        'entity_index': {'names': len(entity_index)},
+        'prompt_cache_hit_rate': prompt_cache_hit_rates(),
+        'aql_repair_success_rate': repair_success_rate(),
+        'http_pools': {
+            'openai': openai_pool.stats(),
+            'arango': arango_http_client.stats(),
+            'arango_async': stats_of(async_db),
+        },
+        **metrics.snapshot(),
+    }
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_report():
+    return jsonify(metrics_body()), 200
 
 
 # Run the Flask app
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from answer_cache import normalize_question
+
+
+class AqlCache:
+    """In-process LRU of generated AQL that executed successfully.
+
+    Keyed on the normalized question, the selected collections, the prompt
+    version and the schema version, so a hit can skip AQL generation and go
+    straight to execution. Entries whose query later fails are evicted.
+    """
+
+    def __init__(self, max_size=1024, ttl=0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    @staticmethod
+    def make_key(question, collection_names, prompt_version, schema_version):
+        payload = json.dumps([normalize_question(question),
+                              sorted(collection_names),
+                              prompt_version, schema_version])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and self.ttl
+                    and time.time() - entry['created_at'] > self.ttl):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            entry['hits'] += 1
+            self._counters['hits'] += 1
+            return entry['aql']
+
+    def set(self, key, aql):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['aql'] == aql:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = {
+                'aql': aql,
+                'created_at': time.time(),
+                'hits': 0,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Counters, hit rate, and the hits and age of each entry.
+
+        Entries are listed by the start of their hashed key: questions and
+        queries are left out, since /metrics is not authenticated.
+        """
+        now = time.time()
+        with self._lock:
+            hits = self._counters['hits']
+            lookups = hits + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'entries': {
+                    key[:12]: {'hits': entry['hits'],
+                               'age': now - entry['created_at']}
+                    for key, entry in self._entries.items()
+                },
+            }
@@ -2,12 +2,14 @@ AQL_EXAMPLES = """
     # Tell me about gene SAMD11
     FOR gene IN genes
     FILTER gene.name == "SAMD11"
+    LIMIT 5
     RETURN gene
 
     # show me all the vairants that is in chromosome 1, position at 10000000?
     WITH variants
     FOR v IN variants
     FILTER v.chr == "chr1" AND v.pos == 10000000
+    LIMIT 5
     RETURN v
 
     # Can you tell me the variant with SPDI of NC_000012.12:102855312:C:T is associated with what diseases?
@@ -15,6 +17,7 @@ AQL_EXAMPLES = """
     FOR variant IN variants
     FILTER variant.spdi == 'NC_000012.12:102855312:C:T'
     FOR disease IN OUTBOUND variant variants_diseases
+    LIMIT 5
     RETURN disease
 
     # Show me all variants associated with cardiomyopathy
@@ -27,6 +30,7 @@ AQL_EXAMPLES = """
         RETURN o._id
         )
     RETURN d._from)
+    LIMIT 5
     RETURN v
 
     # What are the transcripts from the protein PARI_HUMAN?
@@ -34,6 +38,7 @@ AQL_EXAMPLES = """
         FILTER 'PARI_HUMAN' in p.names
         FOR t IN transcripts_proteins
             FILTER t._to == p._id
+            LIMIT 5
             RETURN DOCUMENT(t._from)
 
     # what genomic elements overlap rs1047055?
@@ -44,6 +49,7 @@ AQL_EXAMPLES = """
     )
     FOR g IN genomic_elements OPTIONS { indexHint: "idx_zkd_start_end", forceIndexHint: true }
         FILTER g.chr == variant.chr AND g.start <= variant.pos AND g.end > variant.pos
+        LIMIT 5
         RETURN DISTINCT g
 
     # For eQTL data, what variants are active in tissue that is part of heart.
@@ -68,6 +74,7 @@ AQL_EXAMPLES = """
         FILTER gene._to == "genes/ENSG00000187642" AND gene.score > 0.85
         FOR element IN genomic_elements
             FILTER element._id == gene._from
+            LIMIT 5
             RETURN element
 
     # Find the top 5 eQTLs in ontology term named amygdala, sorted by p_value.
@@ -97,6 +104,7 @@ AQL_EXAMPLES = """
     )
     FOR g IN genomic_elements OPTIONS { indexHint: "idx_zkd_start_end", forceIndexHint: true }
         FILTER g.chr == variant.chr AND g.start <= variant.pos AND g.end > variant.pos
+        LIMIT 5
         RETURN g
 
     # Find the top 5 genes that are co-expressed with gene ENSG00000261221, sorted by z_score.
@@ -116,6 +124,7 @@ AQL_EXAMPLES = """
         FILTER vg._from == variant._id
         FOR gene IN genes
             FILTER gene._id == vg._to
+            LIMIT 5
             RETURN distinct gene
 
     # Is variant with rsID rs875741 a caQTL?
@@ -123,6 +132,7 @@ AQL_EXAMPLES = """
         FILTER "rs875741" in v.rsid
     FOR vg IN variants_genomic_elements
         FILTER vg._from == v._id
+        LIMIT 5
         return vg
 
     # find 5 variants linked to gene ENSG00000188290.
@@ -140,5 +150,6 @@ AQL_EXAMPLES = """
         FILTER edge._to == gene._id
         FOR disease IN ontology_terms
         FILTER disease._id == edge._from
+        LIMIT 5
         RETURN disease
     """
@@ -0,0 +1,218 @@
+import threading
+from collections import Counter
+
+from arango import AQLQueryExplainError
+
+from aql_rewriter import Token, tokenize
+from aql_validator import AqlValidationError
+from metrics import metrics
+
+
+# Index hints added to loops over a collection that filter on all of the
+# listed attributes, e.g. interval queries over genomic elements
+INDEX_HINTS = {
+    'genomic_elements': ('idx_zkd_start_end', ('start', 'end')),
+}
+_OPENING = {'(', '[', '{'}
+_CLOSING = {')', ']', '}'}
+# Keywords that start a high-level operation, ending the one before
+_OPERATIONS = {'collect', 'filter', 'for', 'insert', 'let', 'limit', 'prune',
+               'remove', 'replace', 'return', 'search', 'sort', 'update',
+               'upsert', 'window', 'with'}
+
+
+class AqlGuardError(AqlValidationError):
+    """The query plan of a generated query exceeded the guard's limits."""
+
+
+class AqlGuard:
+    """Keeps generated queries from scanning the catalog.
+
+    `rewrite` adds a LIMIT to the outermost loop when the query has none and
+    index hints for known query shapes; they are counted unless `count` is
+    off, so a query estimated before it runs is counted once. `check` asks
+    ArangoDB to explain the query and rejects plans whose estimated cost is
+    above `max_cost`, or that scan every document of a collection larger
+    than `max_full_scan`; zero disables either check. Rejected queries
+    raise AqlGuardError, which the chain feeds to the fix prompt like any
+    other error. `execute_options` are the cursor limits queries run with.
+    `acheck` explains through `async_db`, an AsyncArangoDatabase.
+    """
+
+    def __init__(self, db, limit=5, max_cost=10_000_000,
+                 max_full_scan=1_000_000, max_runtime=30, memory_limit=0,
+                 index_hints=INDEX_HINTS, async_db=None):
+        self.db = db
+        self.async_db = async_db
+        self.limit = limit
+        self.max_cost = max_cost
+        self.max_full_scan = max_full_scan
+        self.max_runtime = max_runtime
+        self.memory_limit = memory_limit
+        self.index_hints = index_hints
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def rewrite(self, aql, limit=None, count=True):
+        """`aql` with a LIMIT on its outermost loop and known index hints."""
+        added = Counter()
+        tokens = tokenize(aql)
+        tokens = self._add_index_hints(tokens, added)
+        tokens = self._add_limit(tokens, limit or self.limit, added)
+        if count:
+            with self._lock:
+                self._counters.update(added)
+        return ''.join(token.text for token in tokens)
+
+    def check(self, aql, bind_vars=None):
+        """Estimated cost of `aql`.
+
+        Raises AqlGuardError unless its plan is within the limits.
+        """
+        try:
+            plan = self.db.aql.explain(aql, bind_vars=bind_vars)
+        except AQLQueryExplainError as e:
+            self._count('rejected')
+            raise AqlGuardError([e.error_message])
+        return self._evaluate(plan)
+
+    async def acheck(self, aql, bind_vars=None):
+        try:
+            plan = await self.async_db.explain(aql, bind_vars=bind_vars)
+        except AQLQueryExplainError as e:
+            self._count('rejected')
+            raise AqlGuardError([e.error_message])
+        return self._evaluate(plan)
+
+    def _evaluate(self, plan):
+        self._count('explained')
+        cost = plan.get('estimatedCost', 0)
+        metrics.observe('aql.estimated_cost', cost)
+        errors = []
+        if self.max_cost and cost > self.max_cost:
+            errors.append(
+                f'The query is too expensive (estimated cost {cost:.0f}, '
+                f'limit {self.max_cost:.0f}). Filter on indexed attributes '
+                'such as _key, _id, _from or _to and add LIMIT 5.')
+        for node in plan.get('nodes', []):
+            if (node.get('type') != 'EnumerateCollectionNode'
+                    or node.get('random')):
+                continue
+            documents = node.get('estimatedNrItems', 0)
+            if self.max_full_scan and documents > self.max_full_scan:
+                errors.append(
+                    f'The query scans all {documents} documents of '
+                    f"collection '{node.get('collection')}'. Filter it on an "
+                    'indexed attribute or start from a document looked up '
+                    'by _id.')
+        if errors:
+            self._count('rejected')
+            raise AqlGuardError(errors)
+        return cost
+
+    def execute_options(self):
+        options = {}
+        if self.max_runtime:
+            options['max_runtime'] = self.max_runtime
+        if self.memory_limit:
+            options['memory_limit'] = self.memory_limit
+        return options
+
+    def stats(self):
+        with self._lock:
+            return {name: self._counters[name] for name in
+                    ('explained', 'rejected', 'limits_added', 'hints_added')}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _add_limit(self, tokens, limit, added):
+        depth = 0
+        loops = False
+        last_return = None
+        previous = None
+        for position, token in enumerate(tokens):
+            if token.kind in ('space', 'comment'):
+                continue
+            if token.text in _OPENING:
+                depth += 1
+            elif token.text in _CLOSING:
+                depth -= 1
+            elif depth == 0 and token.kind == 'name' and (
+                    previous is None or previous.text != '.'):
+                keyword = token.text.lower()
+                if keyword == 'limit':
+                    return tokens
+                if keyword == 'for':
+                    loops = True
+                elif keyword == 'return':
+                    last_return = position
+            previous = token
+        if not loops or last_return is None:
+            return tokens
+
+        # Keep the line layout: `LIMIT n` goes on its own line when RETURN
+        # does.
+        before = tokens[last_return - 1] if last_return else None
+        on_own_line = (before is not None and before.kind == 'space'
+                       and '\n' in before.text)
+        separator = before.text if on_own_line else ' '
+        added['limits_added'] += 1
+        return (tokens[:last_return]
+                + [Token('name', 'LIMIT'), Token('space', ' '),
+                   Token('number', str(limit)), Token('space', separator)]
+                + tokens[last_return:])
+
+    @staticmethod
+    def _filtered_attributes(code):
+        # Attributes of each variable read in FILTER operations; ones only
+        # sorted on or returned say nothing about the index to use.
+        attributes = {}
+        operation = None
+        previous = None
+        for (_, variable), (_, dot), (_, attribute) in zip(
+                code, code[1:], code[2:]):
+            if (variable.kind == 'name'
+                    and variable.text.lower() in _OPERATIONS
+                    and (previous is None or previous.text != '.')):
+                operation = variable.text.lower()
+            elif (operation == 'filter' and dot.text == '.'
+                    and attribute.kind == 'name'):
+                attributes.setdefault(variable.text, set()).add(attribute.text)
+            previous = variable
+        return attributes
+
+    def _add_index_hints(self, tokens, added):
+        code = [(position, token) for position, token in enumerate(tokens)
+                if token.kind not in ('space', 'comment')]
+        attributes = self._filtered_attributes(code)
+
+        hints = {}
+        for index in range(len(code) - 3):
+            keyword, variable, in_keyword, collection = [
+                t for _, t in code[index:index + 4]]
+            following = ''
+            if index + 4 < len(code):
+                following = code[index + 4][1].text.lower()
+            if (keyword.text.lower() != 'for'
+                    or in_keyword.text.lower() != 'in'
+                    or collection.text not in self.index_hints
+                    or following == 'options'):
+                continue
+            name, filtered = self.index_hints[collection.text]
+            if set(filtered) <= attributes.get(variable.text, set()):
+                hints[code[index + 3][0]] = name
+        if not hints:
+            return tokens
+
+        rewritten = []
+        for position, token in enumerate(tokens):
+            rewritten.append(token)
+            if position in hints:
+                added['hints_added'] += 1
+                # Not forced: the repair prompt never sees the hint, so a
+                # plan the index cannot serve must not fail the query
+                rewritten.extend(tokenize(
+                    f' OPTIONS {{ indexHint: "{hints[position]}" }}'))
+        return rewritten
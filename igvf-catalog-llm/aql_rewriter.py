@@ -0,0 +1,165 @@
+import hashlib
+import re
+from collections import namedtuple
+
+
+Token = namedtuple('Token', ['kind', 'text'])
+
+# A generated query with its literals lifted into bind variables. `shape` is
+# the canonical text of `aql` and `fingerprint` a short hash of it, shared by
+# every query that differs only in its literal values.
+ParameterizedAql = namedtuple(
+    'ParameterizedAql', ['aql', 'bind_vars', 'shape', 'fingerprint'])
+
+_TOKEN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<space>\s+)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<quoted>`[^`]*`|´[^´]*´)
+  | (?P<bind>@@?[A-Za-z0-9_]+)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+  | (?P<name>[A-Za-z_$][A-Za-z0-9_]*)
+  | (?P<op>\.\.|==|!=|<=|>=|&&|\|\||=~|!~|::|\[\*+\]|[^\s])
+''', re.VERBOSE | re.DOTALL)
+
+KEYWORDS = frozenset({
+    'aggregate', 'all', 'and', 'any', 'asc', 'at', 'collect', 'count', 'desc',
+    'distinct', 'false', 'filter', 'for', 'graph', 'in', 'inbound', 'insert',
+    'into', 'k_paths', 'k_shortest_paths', 'keep', 'least', 'let', 'like',
+    'limit', 'none', 'not', 'null', 'options', 'or', 'outbound', 'prune',
+    'remove', 'replace', 'return', 'search', 'shortest_path', 'sort', 'true',
+    'update', 'upsert', 'window', 'with',
+})
+WRITE_KEYWORDS = frozenset({'insert', 'update', 'replace', 'remove', 'upsert'})
+
+_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|.)', re.DOTALL)
+_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t', 'b': '\b', 'f': '\f'}
+
+
+def tokenize(aql):
+    """Split AQL into tokens; whitespace and comments are kept as tokens."""
+    return [Token(match.lastgroup, match.group(0))
+            for match in _TOKEN.finditer(aql)]
+
+
+def _code(tokens):
+    return [token for token in tokens
+            if token.kind not in ('space', 'comment')]
+
+
+def _is_attribute(code, position):
+    # `doc.update` names an attribute, not an UPDATE operation
+    return position > 0 and code[position - 1].text == '.'
+
+
+def keywords(aql):
+    """Lower case keywords used by the query, ignoring attribute names."""
+    code = _code(tokenize(aql))
+    return [token.text.lower() for position, token in enumerate(code)
+            if token.kind == 'name' and token.text.lower() in KEYWORDS
+            and not _is_attribute(code, position)]
+
+
+def is_read_only(aql):
+    """True when the query has no data-modification operation."""
+    return WRITE_KEYWORDS.isdisjoint(keywords(aql))
+
+
+def _render(tokens):
+    parts = []
+    for token in tokens:
+        if token.kind in ('space', 'comment'):
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        elif token.kind == 'name' and token.text.lower() in KEYWORDS:
+            parts.append(token.text.upper())
+        else:
+            parts.append(token.text)
+    return ''.join(parts).strip()
+
+
+def canonical_aql(aql):
+    """Query text without comments, with single spaces and upper keywords."""
+    return _render(tokenize(aql))
+
+
+def unquote(literal):
+    """Python value of an AQL string literal."""
+    def replace(match):
+        escape = match.group(1)
+        if escape.startswith('u') and len(escape) == 5:
+            return chr(int(escape[1:], 16))
+        return _ESCAPES.get(escape, escape)
+    return _ESCAPE.sub(replace, literal[1:-1])
+
+
+def _number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _liftable(code, position):
+    """Whether the literal at `code[position]` can become a bind variable."""
+    token = code[position]
+    before = code[position - 1].text if position > 0 else ''
+    after = code[position + 1].text if position + 1 < len(code) else ''
+    if token.kind == 'string' and after == ':':
+        return False  # object key
+    if token.kind == 'number' and ('..' in (before, after)
+                                   or (before == '[' and after == ']')):
+        return False  # traversal depth or array index
+    return True
+
+
+def parameterize(aql, prefix='lit'):
+    """Lift string and number literals into bind variables.
+
+    Literals in OPTIONS objects, object keys, traversal depths and array
+    indexes stay in the query text. Returns a ParameterizedAql whose `aql`
+    runs with `bind_vars` exactly like the original query.
+    """
+    tokens = tokenize(aql)
+    code = _code(tokens)
+    position = -1
+    existing = {token.text.lstrip('@') for token in tokens
+                if token.kind == 'bind'}
+
+    rewritten = []
+    bind_vars = {}
+    options_depth = 0
+    pending_options = False
+    for token in tokens:
+        if token.kind not in ('space', 'comment'):
+            position += 1
+        if token.kind == 'name' and token.text.lower() == 'options':
+            pending_options = True
+        elif token.text == '{' and (pending_options or options_depth):
+            options_depth += 1
+            pending_options = False
+        elif token.text == '}' and options_depth:
+            options_depth -= 1
+        elif token.kind not in ('space', 'comment'):
+            pending_options = False
+
+        if (token.kind in ('string', 'number') and not options_depth
+                and _liftable(code, position)):
+            name = f'{prefix}{len(bind_vars)}'
+            while name in existing:
+                name = '_' + name
+            bind_vars[name] = unquote(token.text) if token.kind == 'string' \
+                else _number(token.text)
+            rewritten.append(Token('bind', '@' + name))
+        else:
+            rewritten.append(token)
+
+    shape = _render(rewritten)
+    return ParameterizedAql(
+        ''.join(token.text for token in rewritten), bind_vars, shape,
+        hashlib.sha1(shape.encode('utf-8')).hexdigest()[:16])
+
+
+def aql_fingerprint(aql):
+    """Hash of a query's shape, ignoring literals, case and whitespace."""
+    return parameterize(aql).fingerprint
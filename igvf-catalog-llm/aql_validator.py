@@ -0,0 +1,170 @@
+import threading
+from collections import Counter, defaultdict
+
+from aql_rewriter import KEYWORDS, is_read_only, keywords, tokenize
+from example_selector import referenced_collections
+
+
+SYSTEM_ATTRIBUTES = {
+    'document': {'_key', '_id', '_rev'},
+    'edge': {'_key', '_id', '_rev', '_from', '_to'},
+}
+_CLOSING = {'(': ')', '[': ']', '{': '}'}
+
+# Longest list of attributes quoted back in an error message
+MAX_LISTED_ATTRIBUTES = 40
+
+
+def code_tokens(aql):
+    """Tokens of `aql` without whitespace and comments."""
+    return [t for t in tokenize(aql) if t.kind not in ('space', 'comment')]
+
+
+class AqlValidationError(ValueError):
+    """A generated query failed validation; `errors` lists each problem."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        # Same attribute as arango's AQLQueryExecuteError, so both kinds of
+        # failure feed the fix prompt the same way.
+        self.error_message = '\n'.join(self.errors)
+        super().__init__(self.error_message)
+
+
+class AqlValidator:
+    """Checks generated AQL against the catalog schema before it is executed.
+
+    Looks for syntax problems that can be seen without a parser (unbalanced
+    brackets, unterminated strings, no RETURN), collections missing from the
+    schema, data-modification operations and, optionally, a missing LIMIT.
+
+    Attributes missing from the schema are only warnings: the schema is
+    sampled from a few documents, so sparse attributes can be valid anyway.
+    """
+
+    def __init__(self, collection_schema, require_limit=True):
+        self.require_limit = require_limit
+        self._attributes = {}
+        for collection in collection_schema or []:
+            collection_type = collection.get('collection_type')
+            properties = collection.get(f'{collection_type}_properties') or []
+            self._attributes[collection['collection_name']] = (
+                {p['name'] for p in properties}
+                | SYSTEM_ATTRIBUTES.get(collection_type, set()))
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def errors(self, aql):
+        """Problems found in `aql`, as messages for the fix prompt."""
+        tokens = code_tokens(aql)
+        errors = self._syntax_errors(tokens)
+        if errors:
+            return errors
+
+        used_keywords = set(keywords(aql))
+        if not is_read_only(aql):
+            errors.append('The query modifies data. Only read-only queries '
+                          '(no INSERT, UPDATE, REPLACE, REMOVE or UPSERT) '
+                          'are allowed.')
+        if (self.require_limit and 'for' in used_keywords
+                and 'limit' not in used_keywords):
+            errors.append('The query has no LIMIT. Add LIMIT 5 before the '
+                          'final RETURN.')
+
+        unknown = [name for name in referenced_collections(aql)
+                   if name not in self._attributes]
+        known = ', '.join(sorted(self._attributes))
+        for name in unknown:
+            errors.append(f"Collection '{name}' does not exist. Known "
+                          f'collections: {known}.')
+        return errors
+
+    def warnings(self, aql):
+        """Attributes of `aql` missing from their collection's sample."""
+        tokens = code_tokens(aql)
+        if self._syntax_errors(tokens):
+            return []
+        return self._attribute_warnings(tokens)
+
+    def validate(self, aql):
+        """Raise AqlValidationError unless `aql` passes every check.
+
+        Returns the warnings of a query that passes.
+        """
+        errors = self.errors(aql)
+        warnings = [] if errors else self.warnings(aql)
+        with self._lock:
+            self._counters['checked'] += 1
+            if errors:
+                self._counters['rejected'] += 1
+            elif warnings:
+                self._counters['warned'] += 1
+        if errors:
+            raise AqlValidationError(errors)
+        return warnings
+
+    def stats(self):
+        with self._lock:
+            return {'checked': self._counters['checked'],
+                    'rejected': self._counters['rejected'],
+                    'warned': self._counters['warned']}
+
+    @staticmethod
+    def _syntax_errors(tokens):
+        errors = []
+        stack = []
+        for token in tokens:
+            if token.kind == 'op' and token.text in ('"', "'"):
+                errors.append('Unterminated string literal.')
+                break
+            if token.text in _CLOSING:
+                stack.append(token.text)
+            elif token.text in _CLOSING.values():
+                if not stack or _CLOSING[stack.pop()] != token.text:
+                    errors.append(f"Unbalanced '{token.text}'.")
+                    break
+        else:
+            if stack:
+                errors.append(f"Unclosed '{stack[-1]}'.")
+        names = {t.text.lower() for t in tokens if t.kind == 'name'}
+        if not errors and 'return' not in names:
+            errors.append('The query has no RETURN.')
+        return errors
+
+    def _attribute_warnings(self, tokens):
+        # Loop variables over a collection, e.g. `FOR g IN genes`
+        sources = defaultdict(set)
+        for position, token in enumerate(tokens[:-3]):
+            if token.kind != 'name' or token.text.lower() != 'for':
+                continue
+            variable, keyword, source = tokens[position + 1:position + 4]
+            following = ''
+            if position + 4 < len(tokens):
+                following = tokens[position + 4].text
+            if (keyword.text.lower() == 'in'
+                    and source.text in self._attributes
+                    and following not in ('.', '[', '(')):
+                sources[variable.text].add(source.text)
+
+        warnings = []
+        for position, token in enumerate(tokens[:-2]):
+            if (token.kind != 'name' or token.text not in sources
+                    or (position and tokens[position - 1].text == '.')
+                    or tokens[position + 1].text != '.'):
+                continue
+            attribute = tokens[position + 2]
+            if attribute.kind != 'name' or attribute.text.lower() in KEYWORDS:
+                continue
+            collections = sources[token.text]
+            if any(attribute.text in self._attributes[c] for c in collections):
+                continue
+            for collection in sorted(collections):
+                available = sorted(self._attributes[collection])
+                listed = ', '.join(available[:MAX_LISTED_ATTRIBUTES])
+                message = (f"Attribute '{attribute.text}' "
+                           f'(in {token.text}.{attribute.text}) was not seen '
+                           'in the sampled documents of collection '
+                           f"'{collection}'. Known attributes: {listed}.")
+                if message not in warnings:
+                    warnings.append(message)
+        return warnings
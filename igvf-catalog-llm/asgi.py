@@ -0,0 +1,163 @@
+import asyncio
+import json
+import threading
+import time
+
+import app
+from catalog_chain import FULL
+from metrics import metrics
+
+
+class RateLimiter:
+    """Fixed window request counts per client, like the Flask app's limiter."""
+
+    def __init__(self, limit=10, window=60):
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def allow(self, key):
+        window = int(time.time() // self.window)
+        with self._lock:
+            start, count = self._windows.get(key, (window, 0))
+            if start != window:
+                # Forget clients whose windows have passed
+                self._windows = {k: v for k, v in self._windows.items()
+                                 if v[0] == window}
+                count = 0
+            if count >= self.limit:
+                return False
+            self._windows[key] = (window, count + 1)
+            return True
+
+
+limiter = RateLimiter(limit=10, window=60)
+
+
+async def application(scope, receive, send):
+    """ASGI entry point serving the same endpoints as the Flask app.
+
+    Questions go through `app.aask_llm`, so a worker answers many of them
+    at once on one event loop while they wait on OpenAI and ArangoDB.
+    """
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    route = (scope['method'], scope['path'])
+    if route == ('GET', '/health'):
+        await send_json(send, *app.health_status())
+    elif route == ('GET', '/metrics'):
+        await send_json(send, app.metrics_body(), 200)
+    elif route in (('POST', '/query'), ('POST', '/query/stream')):
+        client = (scope.get('client') or ('unknown',))[0]
+        if not limiter.allow(client):
+            await send_json(
+                send, {'error': '429 Too Many Requests: 10 per 1 minute'}, 429)
+            return
+        user_query, mode, error = app.check_query_request(
+            await read_json(receive))
+        if error is not None:
+            await send_json(send, *error)
+        elif scope['path'] == '/query':
+            await query(send, user_query, mode)
+        else:
+            await query_stream(send, user_query, mode)
+    else:
+        await send_json(send, {'error': 'not found'}, 404)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if app.async_db is not None:
+                await app.async_db.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def query(send, user_query, mode=FULL):
+    try:
+        started = time.time()
+        response = await app.coalesced_aask_llm(user_query, mode)
+        metrics.observe(f'query.{mode}.seconds', time.time() - started)
+        await send_json(send, app.build_response(response, mode), 200)
+    except Exception as e:
+        await send_json(send, *app.error_response(user_query, e, mode))
+
+
+async def query_stream(send, user_query, mode=FULL):
+    """Server-sent events for each stage of aask_llm, then the response."""
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def on_event(event, data):
+        # Stages that run in a thread report from there
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    async def run():
+        started = time.time()
+        try:
+            response = await app.aask_llm(user_query, mode, on_event=on_event)
+            metrics.observe(f'query.{mode}.seconds', time.time() - started)
+            on_event('answer', app.build_response(response, mode))
+        except Exception as e:
+            body, status = app.error_response(user_query, e, mode)
+            on_event('answer' if status == 200 else 'error', body)
+        finally:
+            loop.call_soon_threadsafe(events.put_nowait, None)
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            # Proxies must pass events through as they are written
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    task = asyncio.ensure_future(run())
+    try:
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            await send({'type': 'http.response.body',
+                        'body': app.format_event(*item).encode(),
+                        'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        task.cancel()
+
+
+async def read_json(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def send_json(send, body, status):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body',
+                'body': json.dumps(body, default=str).encode()})
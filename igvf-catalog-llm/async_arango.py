@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+
+import httpx
+from arango.exceptions import (AQLQueryExecuteError, AQLQueryExplainError,
+                               CursorNextError)
+from arango.request import Request
+from arango.response import Response
+
+from http_clients import connection_stats
+
+
+class AsyncArangoDatabase:
+    """Minimal asyncio client for the AQL endpoints the pipeline uses.
+
+    Speaks the same HTTP API as python-arango and raises its exceptions, so
+    callers handle failures the same way whichever client ran the query.
+    Only the cursor and explain endpoints are covered; everything else
+    stays on the synchronous client.
+
+    Without a `client`, one is created on first use in each process, like
+    OpenAIConnectionPool, so workers forked from a preloading gunicorn
+    master never share its connections.
+    """
+
+    def __init__(self, url, db_name, username, password, client=None,
+                 timeout=60, max_connections=10):
+        self.base_url = f'{url.rstrip("/")}/_db/{db_name}'
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.auth = (username, password)
+        self._lock = threading.Lock()
+        self._client = client
+        self._pid = os.getpid() if client is not None else None
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                limits = httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections)
+                self._client = httpx.AsyncClient(timeout=self.timeout,
+                                                 limits=limits)
+                self._pid = os.getpid()
+            return self._client
+
+    async def execute(self, query, bind_vars=None, batch_size=None,
+                      top_k=None, count=False, cache=None, max_runtime=None,
+                      memory_limit=0):
+        """Rows of `query`, at most `top_k` of them when given.
+
+        Cursors left open after `top_k` rows are deleted instead of drained.
+        """
+        data = {'query': query, 'count': count}
+        if bind_vars:
+            data['bindVars'] = bind_vars
+        if batch_size or top_k:
+            data['batchSize'] = batch_size or top_k
+        if cache is not None:
+            data['cache'] = cache
+        if memory_limit:
+            data['memoryLimit'] = memory_limit
+        if max_runtime:
+            data['options'] = {'maxRuntime': max_runtime}
+
+        request = Request(method='post', endpoint='/_api/cursor', data=data)
+        body = await self._send(request, AQLQueryExecuteError)
+        rows = list(body.get('result', []))
+        while body.get('hasMore') and (top_k is None or len(rows) < top_k):
+            request = Request(method='put',
+                              endpoint=f'/_api/cursor/{body["id"]}')
+            body = await self._send(request, CursorNextError)
+            rows.extend(body.get('result', []))
+        if body.get('hasMore'):
+            await self.client.delete(
+                f'{self.base_url}/_api/cursor/{body["id"]}', auth=self.auth)
+        return rows if top_k is None else rows[:top_k]
+
+    async def explain(self, query, bind_vars=None):
+        data = {'query': query, 'options': {'allPlans': False}}
+        if bind_vars is not None:
+            data['bindVars'] = bind_vars
+        request = Request(method='post', endpoint='/_api/explain', data=data)
+        return (await self._send(request, AQLQueryExplainError))['plan']
+
+    def stats(self):
+        """Connections of this process's client, None before it has one."""
+        with self._lock:
+            client = self._client if self._pid == os.getpid() else None
+        if client is None:
+            return None
+        return connection_stats(client, self.max_connections)
+
+    async def aclose(self):
+        with self._lock:
+            client = self._client if self._pid == os.getpid() else None
+        if client is not None:
+            await client.aclose()
+
+    async def _send(self, request, error_class):
+        http_response = await self.client.request(
+            request.method, self.base_url + request.endpoint,
+            json=request.data, auth=self.auth)
+        response = Response(request.method, str(http_response.url),
+                            http_response.headers, http_response.status_code,
+                            http_response.reason_phrase, http_response.text)
+        try:
+            response.body = (json.loads(response.raw_body)
+                             if response.raw_body else None)
+        except ValueError:
+            response.body = response.raw_body
+        if isinstance(response.body, dict):
+            response.error_code = response.body.get('errorNum')
+            response.error_message = response.body.get('errorMessage')
+        response.is_success = (200 <= response.status_code < 300
+                               and response.error_code is None)
+        if not response.is_success:
+            raise error_class(response, request)
+        return response.body
@@ -0,0 +1,528 @@
+import asyncio
+import concurrent.futures
+import re
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Any, List
+
+from arango import AQLQueryExecuteError
+from aql_validator import AqlValidationError
+from example_selector import referenced_collections
+from langchain.chains import ArangoGraphQAChain
+from langchain_community.callbacks.openai_info import OpenAICallbackHandler
+from langchain_core.callbacks import (AsyncCallbackManagerForChainRun,
+                                      CallbackManager,
+                                      CallbackManagerForChainRun)
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from metrics import metrics
+from pydantic import Field
+
+
+AQL_BLOCK = re.compile(r'```(?i:aql)?(.*?)```', re.DOTALL)
+
+# How far a request goes: generate and check the query, also run it, or
+# also answer from its result
+AQL_ONLY = 'aql_only'
+RAW = 'raw'
+FULL = 'full'
+MODES = (AQL_ONLY, RAW, FULL)
+
+# A model or database call of the chain, as its blocking and asyncio versions
+Step = namedtuple('Step', ['run', 'arun', 'args'])
+
+
+def describe_error(error):
+    """Message of an execution or validation error, with ArangoDB's code."""
+    error_code = getattr(error, 'error_code', None)
+    if error_code:
+        return f'ArangoDB error {error_code}: {error.error_message}'
+    return error.error_message
+
+
+class CatalogGraphQAChain(ArangoGraphQAChain):
+    """ArangoGraphQAChain with the catalog's additions to AQL generation.
+
+    Runs the same generate -> execute -> fix -> summarize loop as the parent
+    chain, split into steps that can be overridden, and passes the entities
+    resolved from the question to the generation prompt. With an `aql_cache`
+    and `aql_cache_key`, previously generated AQL is executed without
+    calling the model, and newly generated AQL is cached once it executes.
+    With a `validator`, queries are checked against the schema first and
+    rejected ones go to the fix prompt without reaching the database; its
+    attribute warnings are added to the error of a query that failed.
+
+    Failed queries are repaired from the query, the error and the schema of
+    the collections the query reads rather than the whole view; each request
+    gets `max_aql_generation_attempts` queries in total. Attempts, repair
+    outcomes and tokens per attempt are recorded in `metrics`.
+
+    With `candidates` above 1, the first query is picked from that many
+    generated concurrently at `candidate_temperatures`: each is validated
+    and explained as it arrives, and once one passes, the others get
+    `candidate_grace` seconds to arrive before the cheapest valid one runs.
+
+    With a `renderer`, empty and small, regular results are answered from
+    templates instead of the summarization prompt.
+
+    `mode` stops the chain early: AQL_ONLY returns the query once it passes
+    the validator and guard without running it, RAW returns the rows without
+    an answer. Fields a mode does not produce are None.
+
+    `on_event(event, data)` is told about each stage as it finishes: `aql`
+    once a query is accepted, `rows` once it ran, and a `token` for each
+    piece of the answer as the summarization call streams it.
+
+    `ainvoke` runs the same steps with asyncio: model calls use the async
+    OpenAI client, and queries go through the graph's `aquery` when it has
+    one.
+    """
+
+    # Resolved entity `_id`s for the generation prompt, one per line
+    entities: str = ''
+    aql_cache: Any = Field(default=None, exclude=True)
+    aql_cache_key: str = ''
+    validator: Any = Field(default=None, exclude=True)
+    candidates: int = 1
+    candidate_temperatures: List[float] = [0.0, 0.4, 0.8]
+    candidate_grace: float = 1.0
+    renderer: Any = Field(default=None, exclude=True)
+    mode: str = FULL
+    on_event: Any = Field(default=None, exclude=True)
+
+    def _generation_inputs(self, user_input):
+        return {
+            'adb_schema': self.graph.schema,
+            'aql_examples': self.aql_examples,
+            'entities': self.entities,
+            'user_input': user_input,
+        }
+
+    def _candidate_runnable(self, temperature):
+        llm_chain = self.aql_generation_chain
+        return (llm_chain.prompt | llm_chain.llm.bind(temperature=temperature)
+                | StrOutputParser())
+
+    def generate_aql(self, user_input, callbacks=None, temperature=None):
+        inputs = self._generation_inputs(user_input)
+        if temperature is None:
+            return self._run(self.aql_generation_chain, inputs, callbacks)
+        return self._candidate_runnable(temperature).invoke(
+            inputs, config={'callbacks': callbacks})
+
+    async def agenerate_aql(self, user_input, callbacks=None,
+                            temperature=None):
+        inputs = self._generation_inputs(user_input)
+        if temperature is None:
+            return await self._arun(
+                self.aql_generation_chain, inputs, callbacks)
+        return await self._candidate_runnable(temperature).ainvoke(
+            inputs, config={'callbacks': callbacks})
+
+    def _fix_inputs(self, aql_query, aql_error):
+        if self.validator is not None:
+            # Attributes the sampled schema lacks may be why the query failed
+            warnings = self.validator.warnings(aql_query)
+            aql_error = '\n'.join([aql_error, *warnings])
+        return {
+            'adb_schema': self.repair_schema(aql_query),
+            'aql_query': aql_query,
+            'aql_error': aql_error,
+        }
+
+    def fix_aql(self, aql_query, aql_error, callbacks=None):
+        inputs = self._fix_inputs(aql_query, aql_error)
+        return self._run(self.aql_fix_chain, inputs, callbacks)
+
+    async def afix_aql(self, aql_query, aql_error, callbacks=None):
+        inputs = self._fix_inputs(aql_query, aql_error)
+        return await self._arun(self.aql_fix_chain, inputs, callbacks)
+
+    def repair_schema(self, aql_query):
+        """Schema of the selected collections `aql_query` reads.
+
+        Falls back to the whole view when the query reads none of them, e.g.
+        when it names a collection that does not exist.
+        """
+        schema = self.graph.schema
+        if not hasattr(schema, 'subset'):
+            return schema
+        fragment = schema.subset(referenced_collections(aql_query))
+        return fragment if fragment.collection_names else schema
+
+    def check_aql(self, aql_query):
+        """Estimated cost of `aql_query`.
+
+        Raises what `execute_aql` would, without running the query.
+        """
+        if self.validator is not None:
+            self.validator.validate(aql_query)
+        estimate = getattr(self.graph, 'estimate', None)
+        return estimate(aql_query, self.top_k) if estimate is not None else 0
+
+    async def acheck_aql(self, aql_query):
+        if not hasattr(self.graph, 'aestimate'):
+            return await asyncio.to_thread(self.check_aql, aql_query)
+        if self.validator is not None:
+            self.validator.validate(aql_query)
+        return await self.graph.aestimate(aql_query, self.top_k)
+
+    def execute_aql(self, aql_query, check=True):
+        if not check:
+            # Already accepted by check_aql
+            return self.graph.query(aql_query, self.top_k, check=False)
+        if self.validator is not None:
+            self.validator.validate(aql_query)
+        return self.graph.query(aql_query, self.top_k)
+
+    async def aexecute_aql(self, aql_query, check=True):
+        if not hasattr(self.graph, 'aquery'):
+            return await asyncio.to_thread(self.execute_aql, aql_query, check)
+        if check and self.validator is not None:
+            self.validator.validate(aql_query)
+        return await self.graph.aquery(aql_query, self.top_k, check=check)
+
+    def _summary_inputs(self, user_input, aql_query, aql_result):
+        return {
+            'adb_schema': self.graph.schema,
+            'user_input': user_input,
+            'aql_query': aql_query,
+            'aql_result': aql_result,
+        }
+
+    def summarize(self, user_input, aql_query, aql_result, callbacks=None):
+        inputs = self._summary_inputs(user_input, aql_query, aql_result)
+        if self.on_event is None:
+            return self._run(self.qa_chain, inputs, callbacks)
+        runnable = self.qa_chain.prompt | self.qa_chain.llm | StrOutputParser()
+        parts = []
+        for part in runnable.stream(inputs, config={'callbacks': callbacks}):
+            parts.append(part)
+            self._emit('token', text=part)
+        return ''.join(parts)
+
+    async def asummarize(self, user_input, aql_query, aql_result,
+                         callbacks=None):
+        inputs = self._summary_inputs(user_input, aql_query, aql_result)
+        if self.on_event is None:
+            return await self._arun(self.qa_chain, inputs, callbacks)
+        runnable = self.qa_chain.prompt | self.qa_chain.llm | StrOutputParser()
+        parts = []
+        config = {'callbacks': callbacks}
+        async for part in runnable.astream(inputs, config=config):
+            parts.append(part)
+            self._emit('token', text=part)
+        return ''.join(parts)
+
+    def _emit(self, event, **data):
+        if self.on_event is not None:
+            self.on_event(event, data)
+
+    @staticmethod
+    def _run(llm_chain, inputs, callbacks):
+        output = llm_chain.invoke(inputs, config={'callbacks': callbacks})
+        return output[llm_chain.output_key]
+
+    @staticmethod
+    async def _arun(llm_chain, inputs, callbacks):
+        output = await llm_chain.ainvoke(
+            inputs, config={'callbacks': callbacks})
+        return output[llm_chain.output_key]
+
+    @contextmanager
+    def _count_tokens(self, stage, callbacks):
+        # A handler of its own, so tokens are counted per attempt without
+        # taking over the caller's get_openai_callback().
+        usage = OpenAICallbackHandler()
+        if callbacks is None:
+            callbacks = CallbackManager([])
+        manager = callbacks.copy()
+        manager.add_handler(usage)
+        yield manager
+        metrics.observe(f'aql.{stage}.tokens', usage.total_tokens)
+
+    def _call(self, inputs, run_manager=None):
+        if run_manager is None:
+            run_manager = CallbackManagerForChainRun.get_noop_manager()
+        steps = self._steps(inputs[self.input_key], run_manager,
+                            run_manager.get_child())
+        value, error = None, None
+        while True:
+            try:
+                if error is None:
+                    step = steps.send(value)
+                else:
+                    step = steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = step.run(*step.args), None
+            except Exception as e:
+                value, error = None, e
+
+    async def _acall(self, inputs, run_manager=None):
+        if run_manager is None:
+            run_manager = AsyncCallbackManagerForChainRun.get_noop_manager()
+        # Verbose output is written from the steps' control flow, which is
+        # shared with _call and so reports through the blocking manager.
+        steps = self._steps(inputs[self.input_key], run_manager.get_sync(),
+                            run_manager.get_child())
+        value, error = None, None
+        while True:
+            try:
+                if error is None:
+                    step = steps.send(value)
+                else:
+                    step = steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = await step.arun(*step.args), None
+            except Exception as e:
+                value, error = None, e
+
+    def _steps(self, user_input, run_manager, callbacks):
+        """The chain as a generator of Steps, shared by `_call` and `_acall`.
+
+        Each model or database call is yielded as a Step; the caller runs it
+        and sends back its result or throws in its exception. The generator
+        returns the chain's outputs.
+        """
+        aql_query, aql_result = yield from self._execute_cached(run_manager)
+        if aql_query is None:
+            aql_query, aql_result = yield from self._generate_and_execute(
+                user_input, run_manager, callbacks)
+            # Only queries that ran are cached
+            if (self.mode != AQL_ONLY and self.aql_cache is not None
+                    and self.aql_cache_key):
+                self.aql_cache.set(self.aql_cache_key, aql_query)
+
+        self._emit('aql', aql_query=aql_query)
+        if self.mode != AQL_ONLY:
+            self._emit('rows', aql_result=aql_result)
+            run_manager.on_text('AQL Result:', end='\n', verbose=self.verbose)
+            run_manager.on_text(str(aql_result), color='green', end='\n',
+                                verbose=self.verbose)
+
+        answer = None
+        if self.mode == FULL and self.renderer is not None:
+            answer = self.renderer.render(aql_query, aql_result)
+        if self.mode == FULL and answer is None:
+            answer = yield Step(self.summarize, self.asummarize,
+                                (user_input, aql_query, aql_result, callbacks))
+        result = {self.output_key: answer}
+        if self.return_aql_query:
+            result['aql_query'] = aql_query
+        if self.return_aql_result:
+            result['aql_result'] = aql_result
+        return result
+
+    def _execute_cached(self, run_manager):
+        if self.aql_cache is None or not self.aql_cache_key:
+            return None, None
+        aql_query = self.aql_cache.get(self.aql_cache_key)
+        if aql_query is None:
+            return None, None
+        run_manager.on_text('Cached AQL Query:', verbose=self.verbose)
+        run_manager.on_text(aql_query, color='green', end='\n',
+                            verbose=self.verbose)
+        try:
+            if self.mode == AQL_ONLY:
+                yield Step(self.check_aql, self.acheck_aql, (aql_query,))
+                return aql_query, None
+            aql_result = yield Step(
+                self.execute_aql, self.aexecute_aql, (aql_query,))
+            return aql_query, aql_result
+        except (AQLQueryExecuteError, AqlValidationError) as e:
+            # The catalog changed under the query; generate a new one.
+            run_manager.on_text(f'Cached AQL Query failed: {e.error_message}',
+                                end='\n', verbose=self.verbose)
+            self.aql_cache.evict(self.aql_cache_key)
+            return None, None
+
+    def _candidate(self, user_input, temperature, callbacks):
+        with self._count_tokens('generation', callbacks) as counted:
+            output = self.generate_aql(
+                user_input, counted, temperature=temperature)
+        matches = AQL_BLOCK.findall(output)
+        if not matches:
+            return output, None, None
+        try:
+            return output, matches[0], self.check_aql(matches[0])
+        except AqlValidationError:
+            return output, matches[0], None
+
+    async def _acandidate(self, user_input, temperature, callbacks):
+        with self._count_tokens('generation', callbacks) as counted:
+            output = await self.agenerate_aql(
+                user_input, counted, temperature=temperature)
+        matches = AQL_BLOCK.findall(output)
+        if not matches:
+            return output, None, None
+        try:
+            return output, matches[0], await self.acheck_aql(matches[0])
+        except AqlValidationError:
+            return output, matches[0], None
+
+    def _temperatures(self):
+        temperatures = self.candidate_temperatures
+        return [temperatures[i % len(temperatures)]
+                for i in range(self.candidates)]
+
+    def _generate_candidates(self, user_input, run_manager, callbacks):
+        """Output of the cheapest valid candidate and its checked query.
+
+        Without a valid candidate, the first output that arrived is returned
+        with no checked query, and goes through the repair loop as usual.
+        """
+        executor = ContextThreadPoolExecutor(max_workers=self.candidates)
+        pending = {executor.submit(self._candidate, user_input, temperature,
+                                   callbacks)
+                   for temperature in self._temperatures()}
+        race = _CandidateRace(self.candidate_grace)
+        try:
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=race.timeout(),
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                if not done:
+                    break
+                race.collect(done)
+        finally:
+            # Candidates still being generated are no longer needed.
+            executor.shutdown(wait=False, cancel_futures=True)
+        return race.winner(run_manager, self.verbose)
+
+    async def _agenerate_candidates(self, user_input, run_manager, callbacks):
+        candidates = [self._acandidate(user_input, temperature, callbacks)
+                      for temperature in self._temperatures()]
+        pending = {asyncio.ensure_future(candidate)
+                   for candidate in candidates}
+        race = _CandidateRace(self.candidate_grace)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=race.timeout(),
+                    return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                race.collect(done)
+        finally:
+            for task in pending:
+                task.cancel()
+        return race.winner(run_manager, self.verbose)
+
+    def _generate_and_execute(self, user_input, run_manager, callbacks):
+        checked_query = None
+        if self.candidates > 1:
+            aql_generation_output, checked_query = yield Step(
+                self._generate_candidates, self._agenerate_candidates,
+                (user_input, run_manager, callbacks))
+        else:
+            with self._count_tokens('generation', callbacks) as counted:
+                aql_generation_output = yield Step(
+                    self.generate_aql, self.agenerate_aql,
+                    (user_input, counted))
+
+        aql_query = ''
+        aql_error = ''
+        aql_result = None
+        accepted = False
+        aql_generation_attempt = 1
+
+        max_attempts = self.max_aql_generation_attempts
+        while not accepted and aql_generation_attempt <= max_attempts:
+            matches = AQL_BLOCK.findall(aql_generation_output)
+            if not matches:
+                run_manager.on_text('Invalid Response: ', end='\n',
+                                    verbose=self.verbose)
+                run_manager.on_text(aql_generation_output, color='red',
+                                    end='\n', verbose=self.verbose)
+                raise ValueError(
+                    f'Response is Invalid: {aql_generation_output}')
+            aql_query = matches[0]
+
+            run_manager.on_text(f'AQL Query ({aql_generation_attempt}):',
+                                verbose=self.verbose)
+            run_manager.on_text(aql_query, color='green', end='\n',
+                                verbose=self.verbose)
+
+            try:
+                if self.mode == AQL_ONLY:
+                    if aql_query != checked_query:
+                        yield Step(self.check_aql, self.acheck_aql,
+                                   (aql_query,))
+                else:
+                    aql_result = yield Step(
+                        self.execute_aql, self.aexecute_aql,
+                        (aql_query, aql_query != checked_query))
+                accepted = True
+            except (AQLQueryExecuteError, AqlValidationError) as e:
+                aql_error = describe_error(e)
+                run_manager.on_text('AQL Query Execution Error: ', end='\n',
+                                    verbose=self.verbose)
+                run_manager.on_text(aql_error, color='yellow', end='\n\n',
+                                    verbose=self.verbose)
+                if aql_generation_attempt < max_attempts:
+                    with self._count_tokens('repair', callbacks) as counted:
+                        aql_generation_output = yield Step(
+                            self.fix_aql, self.afix_aql,
+                            (aql_query, aql_error, counted))
+
+            aql_generation_attempt += 1
+
+        attempts = aql_generation_attempt - 1
+        metrics.observe('aql.attempts', attempts)
+        if attempts > 1:
+            metrics.increment('aql.repair.requests')
+            if accepted:
+                metrics.increment('aql.repair.succeeded')
+        if not accepted:
+            raise ValueError(
+                'Maximum amount of AQL Query Generation attempts reached. '
+                'Unable to execute the AQL Query due to the following error: '
+                f'{aql_error}')
+        return aql_query, aql_result
+
+
+class _CandidateRace:
+    """Candidates collected so far, and which of them wins."""
+
+    def __init__(self, grace):
+        self.grace = grace
+        self.deadline = None
+        self.outputs = []
+        self.valid = []
+        self.failures = []
+
+    def timeout(self):
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - time.time())
+
+    def collect(self, done):
+        for future in done:
+            try:
+                output, aql_query, cost = future.result()
+            except Exception as e:
+                self.failures.append(e)
+                continue
+            self.outputs.append(output)
+            if cost is not None:
+                self.valid.append((cost, len(self.valid), output, aql_query))
+                if self.deadline is None:
+                    self.deadline = time.time() + self.grace
+
+    def winner(self, run_manager, verbose):
+        metrics.increment('aql.candidates.generated', len(self.outputs))
+        metrics.increment('aql.candidates.valid', len(self.valid))
+        run_manager.on_text(
+            f'AQL Candidates: {len(self.valid)} valid of {len(self.outputs)}',
+            end='\n', verbose=verbose)
+        if self.valid:
+            _, _, output, aql_query = min(self.valid)
+            return output, aql_query
+        if not self.outputs:
+            raise self.failures[0]
+        return self.outputs[0], None
@@ -0,0 +1,323 @@
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+
+from text_index import HashedTfidfIndex, ngrams, tokenize
+
+
+# Identifier shapes that pin a question to a collection on their own.
+# Chromosome names are left out: genes, transcripts, variants and genomic
+# elements all have a chr.
+IDENTIFIER_PATTERNS = [
+    (re.compile(r'\bNC_\d+\.\d+:\d+:[ACGTN]*:[ACGTN]*\b', re.IGNORECASE),
+     'variants'),
+    (re.compile(r'\brs\d+\b', re.IGNORECASE), 'variants'),
+    (re.compile(r'\bENSG\d+', re.IGNORECASE), 'genes'),
+    (re.compile(r'\bENST\d+', re.IGNORECASE), 'transcripts'),
+    (re.compile(r'\bENSP\d+', re.IGNORECASE), 'proteins'),
+    (re.compile(r'\b[A-Z0-9]{2,10}_(?:HUMAN|MOUSE)\b'), 'proteins'),
+    (re.compile(r'\b(?:EFO|UBERON|CL|MONDO|HP|GO|ORPHANET)[_:]\d+\b',
+                re.IGNORECASE),
+     'ontology_terms'),
+]
+
+# Domain vocabulary that the collection names alone do not cover. Aliases
+# pointing at collections missing from the schema are dropped.
+KEYWORD_ALIASES = {
+    'disease': ['ontology_terms'],
+    'diseases': ['ontology_terms'],
+    'phenotype': ['ontology_terms'],
+    'tissue': ['ontology_terms'],
+    'cell': ['ontology_terms'],
+    'ontology': ['ontology_terms'],
+    'term': ['ontology_terms'],
+    'spdi': ['variants'],
+    'rsid': ['variants'],
+    'snp': ['variants'],
+    'allele': ['variants'],
+    'enhancer': ['genomic_elements'],
+    'enhancers': ['genomic_elements'],
+    'promoter': ['genomic_elements'],
+    'regulatory region': ['genomic_elements'],
+    'regulatory regions': ['genomic_elements'],
+    'element': ['genomic_elements'],
+    'elements': ['genomic_elements'],
+    'eqtl': ['variants_genes'],
+    'eqtls': ['variants_genes'],
+    'sqtl': ['variants_genes'],
+    'caqtl': ['variants_genomic_elements'],
+    'interact': ['proteins_proteins'],
+    'interacts': ['proteins_proteins'],
+    'interaction': ['proteins_proteins'],
+    'interactions': ['proteins_proteins'],
+    'coexpressed': ['genes_genes'],
+    'co': ['genes_genes'],
+}
+
+# Edge collection names use these shorthands for their endpoints.
+ENDPOINT_ALIASES = {
+    'diseases': 'ontology_terms',
+    'terms': 'ontology_terms',
+}
+
+# Words that signal a question about a relationship rather than a lookup.
+RELATION_WORDS = {
+    'associated', 'association', 'linked', 'link', 'related', 'affect',
+    'affects', 'affected', 'regulate', 'regulates', 'regulated', 'target',
+    'targets', 'similar', 'overlap', 'overlaps', 'connected', 'bind', 'binds',
+    'expression', 'causal', 'effect',
+}
+
+# Property names that show up in most collections say nothing about intent.
+GENERIC_PROPERTIES = {'name', 'names', 'source', 'source_url', 'label', 'type'}
+
+HIGH_CONFIDENCE = 0.9
+LOW_CONFIDENCE = 0.3
+
+
+def _singular(word):
+    return word[:-1] if word.endswith('s') and len(word) > 3 else word
+
+
+class CollectionClassifier:
+    """Local first-stage collection selector.
+
+    Combines identifier regexes, keyword/alias tables derived from the
+    collection schema and a nearest-neighbour vote over logged
+    (question, collections) pairs. `select` only calls the LLM selector when
+    neither signal is confident enough.
+    """
+
+    def __init__(self, collection_schema, threshold=0.75, log_path=None,
+                 neighbour_threshold=0.8):
+        self.threshold = threshold
+        self.neighbour_threshold = neighbour_threshold
+        self.log_path = log_path
+        self.collection_names = [c['collection_name']
+                                 for c in collection_schema or []]
+        self._types = {c['collection_name']: c.get('collection_type')
+                       for c in collection_schema or []}
+        self._aliases = self._build_aliases(collection_schema or [])
+        self._edges = self._build_edges()
+        self._index = HashedTfidfIndex()
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'local': 0, 'fallback': 0}
+        self._load_log()
+
+    def classify(self, question, entity_collections=()):
+        """Return (collection names, confidence) without calling the LLM.
+
+        `entity_collections` are collections of entities already resolved
+        from the question, which count like identifier matches.
+        """
+        rules = self._classify_rules(question, entity_collections)
+        neighbours = self._classify_neighbours(question)
+        return max(rules, neighbours, key=lambda result: result[1])
+
+    def select(self, question, collection_names, fallback,
+               entity_collections=()):
+        selected = self._select_local(
+            question, collection_names, entity_collections)
+        if selected is not None:
+            return selected
+        return self._recorded(question, fallback(question, collection_names))
+
+    async def aselect(self, question, collection_names, fallback,
+                      entity_collections=()):
+        """`select` with an async `fallback`."""
+        selected = self._select_local(
+            question, collection_names, entity_collections)
+        if selected is not None:
+            return selected
+        selected = await fallback(question, collection_names)
+        return self._recorded(question, selected)
+
+    def _select_local(self, question, collection_names, entity_collections):
+        """Collections classified locally, or None to leave it to fallback."""
+        selected, confidence = self.classify(question, entity_collections)
+        with self._lock:
+            self._counters['requests'] += 1
+            if selected and confidence >= self.threshold:
+                self._counters['local'] += 1
+                return [name for name in selected if name in collection_names]
+            self._counters['fallback'] += 1
+        return None
+
+    def _recorded(self, question, selected):
+        if isinstance(selected, list):
+            self.record(question, selected)
+        return selected
+
+    def record(self, question, collections):
+        collections = [c for c in collections if c in self._types]
+        if not collections:
+            return
+        self._index.add(question, collections)
+        if self.log_path:
+            with self._lock, open(self.log_path, 'a') as log:
+                log.write(json.dumps(
+                    {'question': question, 'collections': collections}) + '\n')
+
+    def stats(self):
+        with self._lock:
+            requests = self._counters['requests']
+            return {
+                **self._counters,
+                'fallback_rate': (self._counters['fallback'] / requests
+                                  if requests else 0.0),
+                'logged_examples': len(self._index),
+            }
+
+    def _classify_rules(self, question, entity_collections=()):
+        nodes = set(entity_collections)
+        edges = set()
+        for pattern, collection in IDENTIFIER_PATTERNS:
+            if pattern.search(question):
+                nodes.add(collection)
+        tokens = tokenize(question)
+        # Nodes matched by domain keywords, with the keywords that matched
+        keyword_nodes = defaultdict(set)
+        named = set(nodes)
+        ambiguous = False
+        for gram in ngrams(tokens):
+            collections = self._aliases.get(gram, ())
+            ambiguous = ambiguous or len(collections) > 1
+            for collection in collections:
+                if collection in self._edges:
+                    edges.add(collection)
+                elif gram in KEYWORD_ALIASES:
+                    keyword_nodes[collection].add(_singular(gram))
+                else:
+                    named.add(collection)
+        nodes = (named | set(keyword_nodes)) & set(self._types)
+        if not nodes and not edges:
+            return [], 0.0
+
+        for edge in edges:
+            nodes.update(self._edges[edge])
+        inferred = {edge for edge, endpoints in self._edges.items()
+                    if len(set(endpoints)) > 1 and set(endpoints) <= nodes
+                    and edge not in edges}
+
+        # Several entity types, or relationship wording, with nothing linking
+        # them means we are missing the relationship the question is about.
+        relational = len(nodes) > 1 or not RELATION_WORDS.isdisjoint(tokens)
+        unlinked = relational and not edges and not inferred
+        confident = not (unlinked or ambiguous
+                         or self._competing(inferred)
+                         or any(self._guessed(edge, keyword_nodes, named)
+                                for edge in inferred))
+        confidence = HIGH_CONFIDENCE if confident else LOW_CONFIDENCE
+        return self._ordered(nodes | edges | inferred), confidence
+
+    def _competing(self, inferred):
+        # Edges sharing two endpoints are alternative readings of the same
+        # relationship, such as variants_genes and variants_genes_terms.
+        endpoints = [set(self._edges[edge]) for edge in sorted(inferred)]
+        return any(len(first & second) > 1
+                   for i, first in enumerate(endpoints)
+                   for second in endpoints[i + 1:])
+
+    @staticmethod
+    def _guessed(edge, keyword_nodes, named):
+        # Edges naming an endpoint by a shorthand cover only part of it:
+        # 'tissue' matches ontology_terms, but not variants_diseases.
+        words = {_singular(word) for word in edge.split('_')}
+        for word in edge.split('_'):
+            node = ENDPOINT_ALIASES.get(word)
+            if (node in keyword_nodes and node not in named
+                    and keyword_nodes[node].isdisjoint(words)):
+                return True
+        return False
+
+    def _classify_neighbours(self, question):
+        matches = self._index.search(question, k=5)
+        if not matches or matches[0][0] < self.neighbour_threshold:
+            return [], 0.0
+        votes = defaultdict(float)
+        total = 0.0
+        for score, collections in matches:
+            total += score
+            for collection in collections:
+                votes[collection] += score
+        selected = {c for c, vote in votes.items() if vote >= total / 2}
+        return self._ordered(selected), matches[0][0]
+
+    def _ordered(self, collections):
+        return [name for name in self.collection_names if name in collections]
+
+    def _build_aliases(self, collection_schema):
+        aliases = defaultdict(set)
+        for name in self.collection_names:
+            if self._types.get(name) == 'document':
+                for part in (name, name.replace('_', ' ')):
+                    aliases[part].add(name)
+                    aliases[_singular(part)].add(name)
+                for word in name.split('_'):
+                    aliases[word].add(name)
+                    aliases[_singular(word)].add(name)
+
+        property_owners = defaultdict(set)
+        for collection in collection_schema:
+            collection_type = collection.get('collection_type')
+            for prop in collection.get(f'{collection_type}_properties') or []:
+                if not prop['name'].startswith('_'):
+                    property_owners[prop['name'].lower()].add(
+                        collection['collection_name'])
+        for prop, owners in property_owners.items():
+            if prop not in GENERIC_PROPERTIES and len(owners) == 1:
+                aliases[prop].update(owners)
+
+        for keyword, collections in KEYWORD_ALIASES.items():
+            aliases[keyword].update(
+                c for c in collections if c in self._types)
+        return {k: sorted(v) for k, v in aliases.items() if v}
+
+    def _build_edges(self):
+        nodes = [n for n in self.collection_names
+                 if self._types.get(n) == 'document']
+        known = {**{n: n for n in nodes}, **{
+            alias: target for alias, target in ENDPOINT_ALIASES.items()
+            if target in nodes}}
+        edges = {}
+        for name in self.collection_names:
+            if self._types.get(name) != 'edge':
+                continue
+            endpoints = self._split_edge_name(name, known)
+            if endpoints:
+                edges[name] = endpoints
+        return edges
+
+    @staticmethod
+    def _split_edge_name(name, known):
+        # Greedily match the longest known node name at each position, so
+        # 'genomic_elements_genes' splits into genomic_elements and genes.
+        parts = name.split('_')
+        endpoints = []
+        start = 0
+        while start < len(parts):
+            for end in range(len(parts), start, -1):
+                candidate = '_'.join(parts[start:end])
+                if candidate in known:
+                    endpoints.append(known[candidate])
+                    start = end
+                    break
+            else:
+                return None
+        return endpoints
+
+    def _load_log(self):
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        with open(self.log_path) as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                collections = [c for c in entry.get('collections', [])
+                               if c in self._types]
+                if collections:
+                    self._index.add(entry['question'], collections)
@@ -0,0 +1,337 @@
+"""Local lookup of catalog identifiers mentioned in questions.
+
+Gene symbols and aliases, rsIDs, UniProt names and ontology term names map
+to document `_id`s. Each kind is stored as sorted names and their ids, each
+packed into one byte blob with an array of offsets so no entry is padded to
+the longest one. The files are memory-mapped when loaded so workers share
+the pages. Build the index from the live catalog with:
+
+    python entity_index.py --output entity_index
+"""
+import argparse
+import bisect
+import heapq
+import os
+import re
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+
+
+Entity = namedtuple('Entity', ['kind', 'mention', 'ids'])
+
+# kind -> (collection, query returning [_id, [names]] per document)
+SOURCES = {
+    'gene': ('genes',
+             'FOR g IN genes RETURN [g._id, APPEND([g.name], g.alias || [])]'),
+    'variant': ('variants',
+                'FOR v IN variants FILTER v.rsid != null '
+                'RETURN [v._id, v.rsid]'),
+    'protein': ('proteins',
+                'FOR p IN proteins RETURN [p._id, p.names || []]'),
+    'ontology_term': ('ontology_terms',
+                      'FOR o IN ontology_terms RETURN [o._id, [o.name]]'),
+}
+
+_RSID = re.compile(r'\brs\d+\b', re.IGNORECASE)
+_UNIPROT = re.compile(r'\b[A-Z0-9]{2,10}_(?:HUMAN|MOUSE)\b')
+_SYMBOL = re.compile(r'\b[A-Za-z0-9][A-Za-z0-9-]*[A-Za-z0-9]\b')
+_WORD = re.compile(r'[a-z0-9][a-z0-9\'-]*')
+
+# Longest ontology term name, in words, looked up in a question
+MAX_TERM_WORDS = 4
+
+# Words that are also ontology term names or gene aliases but are almost
+# always used in their everyday sense in questions.
+STOPWORDS = frozenset({
+    'a', 'all', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'by', 'can',
+    'do', 'does', 'for', 'from', 'gene', 'genes', 'has', 'have', 'how', 'i',
+    'in', 'is', 'it', 'me', 'of', 'on', 'or', 'show', 'that', 'the', 'this',
+    'to', 'variant', 'variants', 'protein', 'proteins', 'transcript',
+    'transcripts', 'what', 'which', 'with', 'element', 'elements', 'data',
+    'term', 'terms', 'tell', 'about', 'find', 'list', 'top', 'sorted',
+})
+
+
+def normalize(name):
+    return ' '.join(str(name).casefold().split())
+
+
+class PackedStrings:
+    """Byte strings stored back to back in `blob`, string i spanning
+    `offsets[i]:offsets[i + 1]`."""
+
+    def __init__(self, blob, offsets):
+        # Memoryviews slice and index far faster than numpy (memmap) arrays
+        self._blob = memoryview(np.asarray(blob, dtype=np.uint8))
+        self._offsets = memoryview(np.asarray(offsets, dtype='<i8'))
+
+    @classmethod
+    def from_strings(cls, strings):
+        lengths = [len(string) for string in strings]
+        offsets = np.zeros(len(strings) + 1, dtype='<i8')
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(np.frombuffer(b''.join(strings), dtype=np.uint8), offsets)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(_read_array(path, np.uint8, mmap),
+                   _read_array(f'{path}.offsets', '<i8', mmap))
+
+    def save(self, path):
+        np.asarray(self._blob).tofile(path)
+        np.asarray(self._offsets, dtype='<i8').tofile(f'{path}.offsets')
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+
+class _PackedWriter:
+    """Appends byte strings to a `PackedStrings` file pair."""
+
+    def __init__(self, path, chunk_size=65536):
+        self._blob = open(path, 'wb')
+        self._offsets = open(f'{path}.offsets', 'wb')
+        self._chunk = [0]
+        self._chunk_size = chunk_size
+        self._end = 0
+
+    def write(self, string):
+        self._blob.write(string)
+        self._end += len(string)
+        self._chunk.append(self._end)
+        if len(self._chunk) >= self._chunk_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._blob.close()
+        self._offsets.close()
+
+    def _flush(self):
+        np.asarray(self._chunk, dtype='<i8').tofile(self._offsets)
+        self._chunk = []
+
+
+def _read_array(path, dtype, mmap):
+    # np.memmap cannot map an empty file
+    if not mmap or os.path.getsize(path) == 0:
+        return np.fromfile(path, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+class EntityIndex:
+    """Sorted name -> `_id` tables per entity kind, searched with bisection."""
+
+    def __init__(self, tables=None):
+        # kind -> (sorted keys, ids), both PackedStrings
+        self._tables = dict(tables or {})
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Build in memory from {kind: iterable of (name, _id)}."""
+        tables = {}
+        for kind, pairs in entries.items():
+            pairs = sorted(set(_encoded(pairs)))
+            tables[kind] = (
+                PackedStrings.from_strings([key for key, _ in pairs]),
+                PackedStrings.from_strings([_id for _, _id in pairs]))
+        return cls(tables)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load a saved index; returns an empty index if there is none."""
+        if not directory or not os.path.isdir(directory):
+            return cls()
+        tables = {}
+        for kind in SOURCES:
+            paths = [os.path.join(directory, f'{kind}.{part}')
+                     for part in ('keys', 'ids')]
+            if all(os.path.exists(path) and os.path.exists(f'{path}.offsets')
+                   for path in paths):
+                tables[kind] = tuple(PackedStrings.load(path, mmap)
+                                     for path in paths)
+        return cls(tables)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for kind, (keys, ids) in self._tables.items():
+            keys.save(os.path.join(directory, f'{kind}.keys'))
+            ids.save(os.path.join(directory, f'{kind}.ids'))
+
+    def __len__(self):
+        return sum(len(keys) for keys, _ in self._tables.values())
+
+    def lookup(self, kind, name, limit=None):
+        """`_id`s of documents of `kind` named `name`, case-insensitively."""
+        if kind not in self._tables:
+            return ()
+        keys, ids = self._tables[kind]
+        key = normalize(name).encode('utf-8')
+        start = bisect.bisect_left(keys, key)
+        end = bisect.bisect_right(keys, key, lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return tuple(ids[i].decode('utf-8') for i in range(start, end))
+
+    def resolve(self, question, max_ids=3):
+        """Entities mentioned in `question`, in order of appearance."""
+        if not self._tables:
+            return []
+        found = []
+        claimed = []
+
+        def add(kind, mention, span):
+            ids = self.lookup(kind, mention, max_ids)
+            if ids:
+                found.append((span[0], Entity(kind, mention, ids)))
+                claimed.append(span)
+            return bool(ids)
+
+        def free(span):
+            return all(span[1] <= start or span[0] >= end
+                       for start, end in claimed)
+
+        for match in _RSID.finditer(question):
+            add('variant', match.group(0).lower(), match.span())
+        for match in _UNIPROT.finditer(question):
+            add('protein', match.group(0), match.span())
+        for match in _SYMBOL.finditer(question):
+            symbol = match.group(0)
+            # Symbols are written in capitals; lower case words are far more
+            # often English than gene aliases.
+            if (free(match.span()) and symbol == symbol.upper()
+                    and not symbol.isdigit()
+                    and normalize(symbol) not in STOPWORDS):
+                add('gene', symbol, match.span())
+
+        words = [(m.group(0), m.span())
+                 for m in _WORD.finditer(question.casefold())]
+        for size in range(MAX_TERM_WORDS, 0, -1):
+            for start in range(len(words) - size + 1):
+                gram = words[start:start + size]
+                span = (gram[0][1][0], gram[-1][1][1])
+                text = ' '.join(word for word, _ in gram)
+                if (not free(span)
+                        or all(word in STOPWORDS for word, _ in gram)
+                        or (size == 1 and len(text) < 4)):
+                    continue
+                add('ontology_term', text, span)
+
+        found.sort(key=lambda item: item[0])
+        return [entity for _, entity in found]
+
+
+def entity_collections(entities):
+    return list(dict.fromkeys(SOURCES[entity.kind][0] for entity in entities))
+
+
+def format_entities(entities):
+    """Prompt lines pairing each mention with the `_id`s it resolved to."""
+    return '\n'.join(
+        f'{entity.mention} ({entity.kind.replace("_", " ")}): '
+        + ', '.join(entity.ids)
+        for entity in entities)
+
+
+def build_entries(db, batch_size=10000):
+    """{kind: iterator of (name, _id)}, each streamed from the catalog as it
+    is consumed."""
+    return {kind: _names(db, query, batch_size)
+            for kind, (collection, query) in SOURCES.items()
+            if db.has_collection(collection)}
+
+
+def _names(db, query, batch_size):
+    cursor = db.aql.execute(query, batch_size=batch_size, stream=True,
+                            ttl=3600)
+    for _id, names in cursor:
+        for name in names or ():
+            if isinstance(name, str):
+                yield name, _id
+
+
+def _encoded(pairs):
+    for name, _id in pairs:
+        if name:
+            yield normalize(name).encode('utf-8'), _id.encode('utf-8')
+
+
+def write_index(directory, entries, run_size=1_000_000):
+    """Save {kind: iterable of (name, _id)} as an index in `directory`.
+
+    Pairs are sorted in runs of `run_size` spilled to temporary files and
+    merged, so the catalog is never held in memory at once. Normalized
+    names hold no tabs or newlines, and `_id`s no whitespace, so runs are
+    written one tab-separated pair per line.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for kind, pairs in entries.items():
+        with tempfile.TemporaryDirectory(dir=directory) as scratch:
+            runs = []
+            batch = []
+            for pair in _encoded(pairs):
+                batch.append(pair)
+                if len(batch) >= run_size:
+                    runs.append(_spill(scratch, len(runs), batch))
+                    batch = []
+            batch.sort()
+            files = [open(path, 'rb') for path in runs]
+            keys = _PackedWriter(os.path.join(directory, f'{kind}.keys'))
+            ids = _PackedWriter(os.path.join(directory, f'{kind}.ids'))
+            try:
+                previous = None
+                for pair in heapq.merge(*map(_read_run, files), batch):
+                    if pair != previous:
+                        keys.write(pair[0])
+                        ids.write(pair[1])
+                        previous = pair
+            finally:
+                keys.close()
+                ids.close()
+                for run in files:
+                    run.close()
+
+
+def _spill(directory, number, batch):
+    path = os.path.join(directory, f'run{number}')
+    batch.sort()
+    with open(path, 'wb') as run:
+        run.writelines(b'%s\t%s\n' % pair for pair in batch)
+    return path
+
+
+def _read_run(run):
+    for line in run:
+        key, _id = line.rstrip(b'\n').split(b'\t')
+        yield key, _id
+
+
+def main(argv=None):
+    from arango import ArangoClient
+
+    parser = argparse.ArgumentParser(
+        description='Build the entity index from the catalog.')
+    parser.add_argument('--output', default='entity_index')
+    parser.add_argument('--backend-url', default=os.environ.get(
+        'BACKEND_URL', 'https://db-dev.catalog.igvf.org/'))
+    parser.add_argument('--db-name', default='igvf')
+    args = parser.parse_args(argv)
+
+    client = ArangoClient(hosts=args.backend_url)
+    db = client.db(args.db_name, username=os.environ['CATALOG_USERNAME'],
+                   password=os.environ['CATALOG_PASSWORD'])
+    started = time.time()
+    write_index(args.output, build_entries(db))
+    index = EntityIndex.load(args.output)
+    print(f'Wrote {len(index)} names to {args.output} in '
+          f'{time.time() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
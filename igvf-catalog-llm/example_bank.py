@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+
+from aql_rewriter import aql_fingerprint
+from example_selector import AqlExample, referenced_collections
+from text_index import HashedTfidfIndex
+
+
+class ExampleBank:
+    """Generated queries that executed and returned rows, kept as examples.
+
+    Queries are deduplicated by fingerprint so the bank holds one example
+    per query shape, and are retrieved by question similarity.
+    """
+
+    def __init__(self, path=None, max_examples=5000, min_score=0.3, known=()):
+        self.path = path
+        self.max_examples = max_examples
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._index = HashedTfidfIndex()
+        # Shapes already covered elsewhere, e.g. the hand-written examples
+        self._known = {aql_fingerprint(aql) for aql in known}
+        self._fingerprints = set()
+        self._load()
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def record(self, question, aql):
+        """Add a successful generation; returns False for known shapes."""
+        aql = aql.strip()
+        fingerprint = aql_fingerprint(aql)
+        with self._lock:
+            if (fingerprint in self._fingerprints
+                    or fingerprint in self._known
+                    or len(self._fingerprints) >= self.max_examples):
+                return False
+            self._fingerprints.add(fingerprint)
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'question': question, 'aql': aql})
+                            + '\n')
+        self._add(question, aql)
+        return True
+
+    def nearest(self, question, k=2):
+        if k <= 0:
+            return []
+        return [example for score, example in self._index.search(question, k)
+                if score >= self.min_score]
+
+    def stats(self):
+        return {'examples': len(self), 'max_examples': self.max_examples}
+
+    def _add(self, question, aql):
+        self._index.add(question, AqlExample(
+            question, aql, tuple(referenced_collections(aql))))
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                fingerprint = aql_fingerprint(entry['aql'])
+                if (fingerprint not in self._fingerprints
+                        and fingerprint not in self._known):
+                    self._fingerprints.add(fingerprint)
+                    self._add(entry['question'], entry['aql'])
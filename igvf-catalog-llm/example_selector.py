@@ -0,0 +1,124 @@
+import re
+import textwrap
+from collections import namedtuple
+
+from text_index import HashedTfidfIndex
+
+
+AqlExample = namedtuple('AqlExample', ['question', 'aql', 'collections'])
+
+_IDENTIFIER = r'[A-Za-z_][A-Za-z0-9_]*'
+_WITH = re.compile(
+    rf'^\s*WITH\s+({_IDENTIFIER}(?:\s*,\s*{_IDENTIFIER})*)', re.IGNORECASE)
+_LOOP_SOURCE = re.compile(
+    rf'\bIN\s+({_IDENTIFIER})\b(?!\s*[.\[(])', re.IGNORECASE)
+_TRAVERSAL = re.compile(
+    rf'\b(?:OUTBOUND|INBOUND|ANY)\s+\S+\s+({_IDENTIFIER})\b', re.IGNORECASE)
+# Document ids only name a collection that is read inside DOCUMENT(...);
+# other strings with a slash are just values.
+_DOCUMENT_ID = re.compile(
+    r'\bDOCUMENT\s*\(\s*\[?\s*[\'"]([a-z][a-z0-9_]*)/[^\'"]+[\'"]',
+    re.IGNORECASE)
+_KEYWORDS = {'outbound', 'inbound', 'any', 'all', 'none', 'not', 'null',
+             'true', 'false', 'graph'}
+# Variables declared by LET, FOR, COLLECT and AGGREGATE assignments, and
+# by INTO, which loops can read like collections.
+_VARIABLE = re.compile(
+    rf'\b(?:LET\s+({_IDENTIFIER})\s*='
+    rf'|FOR\s+({_IDENTIFIER})(?:\s*,\s*({_IDENTIFIER}))*\s+IN\b'
+    rf'|(?:COLLECT|AGGREGATE)\s+({_IDENTIFIER})\s*=(?!=)'
+    rf'|INTO\s+({_IDENTIFIER})'
+    rf'|,\s*({_IDENTIFIER})\s*=(?!=))',
+    re.IGNORECASE)
+
+
+def referenced_collections(aql):
+    """Collection names an AQL query reads, in order of first appearance."""
+    variables = {name.lower() for match in _VARIABLE.findall(aql)
+                 for name in match if name}
+    names = []
+    with_clause = _WITH.match(aql)
+    if with_clause:
+        names.extend(n.strip() for n in with_clause.group(1).split(','))
+    for pattern in (_LOOP_SOURCE, _TRAVERSAL, _DOCUMENT_ID):
+        names.extend(pattern.findall(aql))
+    return [name for name in dict.fromkeys(names)
+            if name.lower() not in variables and name.lower() not in _KEYWORDS]
+
+
+def parse_examples(text):
+    """Split an AQL_EXAMPLES style string into AqlExample records.
+
+    Each example is a `# question` comment line followed by its query.
+    """
+    examples = []
+    question = None
+    lines = []
+
+    def flush():
+        if question is not None and any(line.strip() for line in lines):
+            aql = textwrap.dedent('\n'.join(lines)).strip()
+            examples.append(AqlExample(
+                question, aql, tuple(referenced_collections(aql))))
+
+    for line in text.splitlines():
+        if line.strip().startswith('#'):
+            flush()
+            question = line.strip().lstrip('#').strip()
+            lines = []
+        else:
+            lines.append(line)
+    flush()
+    return examples
+
+
+def format_examples(examples):
+    return '\n\n'.join(f'# {example.question}\n{example.aql}'
+                       for example in examples)
+
+
+class ExampleSelector:
+    """Pick the few-shot AQL examples most relevant to one request.
+
+    Examples are ranked by how much their collections overlap with the
+    selected collections and by TF-IDF similarity of their questions. When
+    an example bank is given, its nearest learned examples are appended.
+    """
+
+    COLLECTION_WEIGHT = 0.6
+    QUESTION_WEIGHT = 0.4
+
+    def __init__(self, examples, k=4, bank=None, bank_k=2):
+        self.examples = list(examples)
+        self.k = k
+        self.bank = bank
+        self.bank_k = bank_k
+        self._index = HashedTfidfIndex()
+        for position, example in enumerate(self.examples):
+            self._index.add(example.question, position)
+
+    def rank(self, question, collection_names, k=None):
+        k = self.k if k is None else k
+        selected = set(collection_names)
+        similarity = {position: score for score, position in
+                      self._index.search(question, k=len(self.examples))}
+
+        scored = []
+        for position, example in enumerate(self.examples):
+            collections = set(example.collections)
+            union = collections | selected
+            overlap = len(collections & selected) / \
+                len(union) if union else 0.0
+            score = (self.COLLECTION_WEIGHT * overlap +
+                     self.QUESTION_WEIGHT * similarity.get(position, 0.0))
+            if score > 0:
+                scored.append((score, position))
+        # Ties keep the hand-written order of the examples
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        ranked = [self.examples[position] for _, position in scored[:k]]
+        if self.bank is not None:
+            ranked.extend(self.bank.nearest(question, self.bank_k))
+        return ranked
+
+    def select(self, question, collection_names, k=None):
+        return format_examples(self.rank(question, collection_names, k))
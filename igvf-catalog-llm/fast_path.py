@@ -0,0 +1,198 @@
+import itertools
+import json
+import re
+import threading
+from collections import Counter, namedtuple
+
+from result_renderer import ResultRenderer
+
+
+# A question shape answered with a fixed, parameterized query. `pattern`
+# captures named groups that become bind variables after `prepare`, and
+# `summary` is formatted with the bind variables and the row count. Every
+# query ends in `LIMIT @limit`, bound to the fast path's `top_k`.
+FastPathRule = namedtuple(
+    'FastPathRule', ['name', 'pattern', 'aql', 'prepare', 'summary'])
+
+FastPathMatch = namedtuple('FastPathMatch', ['rule', 'bind_vars'])
+
+_SPDI = r'(?P<spdi>NC_\d+\.\d+:\d+:[ACGTN]*:[ACGTN]*)'
+_RSID = r'(?P<rsid>rs\d+)'
+_END = r'\s*[?.!]*\s*$'
+
+
+def _identity(groups):
+    return dict(groups)
+
+
+def _gene_names(groups):
+    # Symbols such as C1orf112 are not all upper case, so the name is
+    # matched as written and in capitals.
+    name = groups['name']
+    return {'names': list(dict.fromkeys([name, name.upper()]))}
+
+
+RULES = (
+    FastPathRule(
+        'gene_about',
+        re.compile(
+            r'^(?:tell me about|what is|describe|show me)\s+(?:the\s+)?gene\s+'
+            r'(?P<name>[A-Za-z][A-Za-z0-9-]*)' + _END, re.IGNORECASE),
+        'FOR gene IN genes\n'
+        '    FILTER gene.name IN @names\n'
+        '    LIMIT @limit\n'
+        '    RETURN gene',
+        _gene_names,
+        'Found {count} gene(s) named {names[0]}',
+    ),
+    FastPathRule(
+        'variant_diseases',
+        re.compile(
+            r'^.*\bvariant\b.*\bspdi\b(?:\s+of)?\s+' + _SPDI
+            + r'.*\bassociated with\s+(?:what|which)\s+diseases?' + _END,
+            re.IGNORECASE),
+        'FOR variant IN variants\n'
+        '    FILTER variant.spdi == @spdi\n'
+        '    FOR disease IN OUTBOUND variant variants_diseases\n'
+        '        LIMIT @limit\n'
+        '        RETURN DISTINCT disease',
+        _identity,
+        'Found {count} disease(s) associated with variant {spdi}',
+    ),
+    FastPathRule(
+        'variant_spdi',
+        re.compile(
+            r'^(?:tell me about|what is|show me|describe)\s+(?:the\s+)?'
+            r'variant\s+(?:with\s+)?(?:spdi\s+)?(?:of\s+)?' + _SPDI + _END,
+            re.IGNORECASE),
+        'FOR variant IN variants\n'
+        '    FILTER variant.spdi == @spdi\n'
+        '    LIMIT @limit\n'
+        '    RETURN variant',
+        _identity,
+        'Found {count} variant(s) with SPDI {spdi}',
+    ),
+    FastPathRule(
+        'rsid_genomic_elements',
+        re.compile(
+            r'^(?:what|which)\s+genomic elements?\s+overlaps?\s+'
+            r'(?:the\s+)?(?:variant\s+)?' + _RSID + _END,
+            re.IGNORECASE),
+        'LET variant = FIRST(\n'
+        '    FOR v IN variants\n'
+        '        FILTER @rsid IN v.rsid\n'
+        '        RETURN { chr: v.chr, pos: v.pos }\n'
+        ')\n'
+        'FOR g IN genomic_elements\n'
+        '    OPTIONS {indexHint: "idx_zkd_start_end", forceIndexHint: true}\n'
+        '    FILTER g.chr == variant.chr\n'
+        '        AND g.start <= variant.pos AND g.end > variant.pos\n'
+        '    LIMIT @limit\n'
+        '    RETURN DISTINCT g',
+        _identity,
+        'Found {count} genomic element(s) overlapping {rsid}',
+    ),
+    FastPathRule(
+        'variant_genes',
+        re.compile(
+            r'^(?:what|which|show me)?\s*(?:the\s+)?genes?\s+(?:are\s+|is\s+)?'
+            r'(?:linked|associated|related)\s+(?:to|with)\s+(?:the\s+)?'
+            r'(?:variant\s+)?' + _RSID + _END,
+            re.IGNORECASE),
+        'FOR v IN variants\n'
+        '    FILTER @rsid IN v.rsid\n'
+        '    FOR gene IN OUTBOUND v variants_genes\n'
+        '        LIMIT @limit\n'
+        '        RETURN DISTINCT gene',
+        _identity,
+        'Found {count} gene(s) linked to variant {rsid}',
+    ),
+)
+
+
+def inline_bind_vars(aql, bind_vars):
+    """The query with bind variables written out, for display only."""
+    return re.sub(r'@(\w+)', lambda m: json.dumps(bind_vars[m.group(1)])
+                  if m.group(1) in bind_vars else m.group(0), aql)
+
+
+class FastPath:
+    """Answer common question shapes with templated AQL and no LLM calls.
+
+    Questions matching one of `rules` are run as bind-variable queries and
+    answered in the same shape as the LLM chain, with rows written out by
+    `renderer` or, when they are too irregular for it, the rule's summary.
+    Questions that match no rule, or whose query finds nothing, are left to
+    the chain.
+    """
+
+    def __init__(self, db, rules=RULES, top_k=5, max_runtime=10,
+                 renderer=None):
+        self.db = db
+        self.rules = rules
+        self.top_k = top_k
+        self.max_runtime = max_runtime
+        # Catalog documents have more attributes than the chain renders
+        self.renderer = renderer or ResultRenderer(max_rows=top_k,
+                                                   max_fields=16)
+        self._lock = threading.Lock()
+        self._answered = Counter()
+        self._fallbacks = 0
+
+    def match(self, question):
+        question = ' '.join(question.split())
+        for rule in self.rules:
+            found = rule.pattern.match(question)
+            if found:
+                return FastPathMatch(rule, rule.prepare(found.groupdict()))
+        return None
+
+    def answer(self, question, execute=True):
+        """Return a chain-shaped response, or None to fall back to the LLM.
+
+        Without `execute`, only the query is returned, without running it.
+        """
+        match = self.match(question)
+        if match is None or self.db is None:
+            return None
+        rule, bind_vars = match
+        bind_vars = {**bind_vars, 'limit': self.top_k}
+        if not execute:
+            with self._lock:
+                self._answered[rule.name] += 1
+            return {
+                'query': question,
+                'user_input': question,
+                'aql_query': inline_bind_vars(rule.aql, bind_vars),
+            }
+        try:
+            cursor = self.db.aql.execute(
+                rule.aql, bind_vars=bind_vars, count=False,
+                batch_size=self.top_k, max_runtime=self.max_runtime)
+            rows = list(itertools.islice(cursor, self.top_k))
+        except Exception as e:
+            print(f'Fast path {rule.name} failed: {e}')
+            rows = []
+        with self._lock:
+            if rows:
+                self._answered[rule.name] += 1
+            else:
+                self._fallbacks += 1
+        if not rows:
+            return None
+        aql_query = inline_bind_vars(rule.aql, bind_vars)
+        result = self.renderer.render(aql_query, rows)
+        if result is None:
+            result = rule.summary.format(count=len(rows), **bind_vars) + '.'
+        return {
+            'query': question,
+            'user_input': question,
+            'aql_query': aql_query,
+            'aql_result': rows,
+            'result': result,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {'answered': dict(self._answered),
+                    'fallbacks': self._fallbacks}
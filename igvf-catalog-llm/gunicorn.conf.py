@@ -0,0 +1,55 @@
+import os
+
+
+# Fargate task size, passed in by the CDK Frontend construct from FrontendProps
+TASK_CPU_UNITS = int(os.environ.get('TASK_CPU_UNITS', 1024))
+TASK_MEMORY_MIB = int(os.environ.get('TASK_MEMORY_MIB', 2048))
+# Memory kept for nginx and the gunicorn master, and needed by each worker
+# on top of what it shares with the preloaded master
+RESERVED_MEMORY_MIB = int(os.environ.get('GUNICORN_RESERVED_MEMORY_MIB', 256))
+WORKER_MEMORY_MIB = int(os.environ.get('GUNICORN_WORKER_MEMORY_MIB', 384))
+
+
+def worker_count(cpu_units, memory_mib, reserved_mib=RESERVED_MEMORY_MIB,
+                 worker_mib=WORKER_MEMORY_MIB):
+    """Workers for a task: 2 per vCPU plus one, as many as fit in memory."""
+    by_cpu = 2 * max(1, cpu_units // 1024) + 1
+    by_memory = (memory_mib - reserved_mib) // worker_mib
+    return max(1, min(by_cpu, by_memory))
+
+
+def thread_count(cpu_units):
+    """Threads per gthread worker; they mostly wait on OpenAI and Arango."""
+    return max(4, 8 * cpu_units // 1024)
+
+
+# `gthread` serves the Flask app with `threads` requests per worker. An
+# ASGI worker such as `uvicorn_worker.UvicornWorker`, from the uvicorn-worker
+# package, serves the asyncio app in asgi.py instead.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+wsgi_app = ('asgi:application' if worker_class.startswith('uvicorn')
+            else 'app:app')
+
+bind = '0.0.0.0:5000'
+workers = int(os.environ.get('GUNICORN_WORKERS')
+              or worker_count(TASK_CPU_UNITS, TASK_MEMORY_MIB))
+threads = int(os.environ.get('GUNICORN_THREADS')
+              or thread_count(TASK_CPU_UNITS))
+
+# The schema, entity index and clients are built once in the master and
+# shared with workers copy-on-write.
+preload_app = True
+
+# Questions that need several generation and repair calls run well past
+# gunicorn's 30 second default; matches nginx's proxy_read_timeout.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 60))
+# Longer than nginx's upstream keepalive_timeout, so nginx closes idle
+# connections first
+keepalive = 75
+
+
+def post_fork(server, worker):
+    # Connections opened while preloading belong to the master
+    import app
+    app.after_fork()
@@ -0,0 +1,179 @@
+import os
+import threading
+
+import httpx
+import openai
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from arango.http import DefaultHTTPClient
+
+
+# Connections to OpenAI kept per worker, shared by collection selection and
+# the chain's model
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 20))
+OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 60))
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 120))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 5))
+# Multiplex OpenAI requests over HTTP/2; needs the `h2` package
+OPENAI_HTTP2 = os.environ.get(
+    'OPENAI_HTTP2', 'false').lower() in ('1', 'true', 'yes')
+
+
+class PooledArangoHTTPClient(DefaultHTTPClient):
+    """python-arango HTTP client with an explicitly sized connection pool.
+
+    The default requests adapter keeps at most 10 connections per host,
+    which caps how many threads can talk to Arango at once.
+    """
+
+    def __init__(self, pool_maxsize=10, request_timeout=60):
+        self.pool_maxsize = pool_maxsize
+        self.REQUEST_TIMEOUT = request_timeout
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._peak = 0
+        self._requests = 0
+
+    def send_request(self, *args, **kwargs):
+        with self._lock:
+            self._in_use += 1
+            self._requests += 1
+            self._peak = max(self._peak, self._in_use)
+        try:
+            return super().send_request(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_connections': self.pool_maxsize,
+                'in_use': self._in_use,
+                'peak': self._peak,
+                'requests': self._requests,
+                'utilization': self._in_use / self.pool_maxsize,
+            }
+
+    def create_session(self, host):
+        retry_strategy = Retry(
+            total=self.RETRY_ATTEMPTS,
+            backoff_factor=self.BACKOFF_FACTOR,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['HEAD', 'GET', 'OPTIONS'],
+        )
+        http_adapter = HTTPAdapter(
+            max_retries=retry_strategy,
+            pool_connections=1,
+            pool_maxsize=self.pool_maxsize,
+        )
+
+        session = Session()
+        session.mount('https://', http_adapter)
+        session.mount('http://', http_adapter)
+        return session
+
+
+def connection_stats(client, max_connections):
+    """Open and busy connections of an httpx client's pool."""
+    connections = client._transport._pool.connections
+    in_use = sum(1 for connection in connections if not connection.is_idle())
+    return {
+        'max_connections': max_connections,
+        'open': len(connections),
+        'in_use': in_use,
+        'utilization': in_use / max_connections,
+    }
+
+
+def http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class OpenAIConnectionPool:
+    """Keep-alive connections to OpenAI shared by every client in a worker.
+
+    Clients are created on first use in each process, so workers forked from
+    a preloading gunicorn master never share its pools. `http2` falls back to
+    HTTP/1.1 when the `h2` package is missing; `stats` reports which is used.
+    """
+
+    def __init__(self, max_connections=20, keepalive_expiry=60, timeout=120,
+                 connect_timeout=5, http2=False):
+        self.max_connections = max_connections
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and http2_available()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._clients = None
+
+    def _get(self, name, create):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._clients = {}
+                self._pid = os.getpid()
+            if name not in self._clients:
+                self._clients[name] = create()
+            return self._clients[name]
+
+    def _options(self):
+        return {'limits': self.limits, 'timeout': self.timeout,
+                'http2': self.http2}
+
+    @property
+    def http_client(self):
+        return self._get('http_client',
+                         lambda: httpx.Client(**self._options()))
+
+    @property
+    def async_http_client(self):
+        return self._get('async_http_client',
+                         lambda: httpx.AsyncClient(**self._options()))
+
+    @property
+    def client(self):
+        # The timeout is also given to the OpenAI clients, which would
+        # otherwise send their own with every request.
+        http_client = self.http_client
+        return self._get('client', lambda: openai.OpenAI(
+            http_client=http_client, timeout=self.timeout))
+
+    @property
+    def async_client(self):
+        async_http_client = self.async_http_client
+        return self._get('async_client', lambda: openai.AsyncOpenAI(
+            http_client=async_http_client, timeout=self.timeout))
+
+    def stats(self):
+        with self._lock:
+            clients = self._clients if self._pid == os.getpid() else {}
+
+        def pool_stats(name):
+            client = clients.get(name)
+            if client is None:
+                return None
+            return connection_stats(client, self.max_connections)
+
+        return {
+            'http2': self.http2,
+            'sync': pool_stats('http_client'),
+            'async': pool_stats('async_http_client'),
+        }
+
+
+openai_pool = OpenAIConnectionPool(
+    max_connections=OPENAI_MAX_CONNECTIONS,
+    keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    timeout=OPENAI_TIMEOUT,
+    connect_timeout=OPENAI_CONNECT_TIMEOUT,
+    http2=OPENAI_HTTP2,
+)
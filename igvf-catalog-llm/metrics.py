@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict, defaultdict
+
+
+class Metrics:
+    """Process-local counters and timings exposed on /metrics.
+
+    Every gunicorn worker keeps its own copy, so numbers are per worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._timings = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, value):
+        with self._lock:
+            timing = self._timings.setdefault(
+                name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['total'] += value
+            timing['max'] = max(timing['max'], value)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        with self._lock:
+            timings = {
+                name: {**timing, 'mean': timing['total'] / timing['count']}
+                for name, timing in self._timings.items()
+            }
+            return {'counters': dict(self._counters), 'timings': timings}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+class ShapeTimings:
+    """Timings per query shape for the `max_size` most recently run shapes.
+
+    Shapes are query fingerprints, which are as varied as generated queries,
+    so the least recently run shape is dropped once the table is full.
+    """
+
+    def __init__(self, max_size=100):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._timings = OrderedDict()
+        self._dropped = 0
+
+    def observe(self, fingerprint, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            timing = self._timings.setdefault(
+                fingerprint, {'count': 0, 'total': 0.0, 'max': 0.0})
+            self._timings.move_to_end(fingerprint)
+            timing['count'] += 1
+            timing['total'] += value
+            timing['max'] = max(timing['max'], value)
+            while len(self._timings) > self.max_size:
+                self._timings.popitem(last=False)
+                self._dropped += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'dropped': self._dropped,
+                'shapes': {
+                    fingerprint: {**timing,
+                                  'mean': timing['total'] / timing['count']}
+                    for fingerprint, timing in self._timings.items()
+                },
+            }
+
+
+def _as_count(value):
+    # Usage fields are missing or None for some models and responses
+    return value if isinstance(value, int) else 0
+
+
+def record_token_usage(stage, prompt_tokens, cached_tokens, completion_tokens):
+    metrics.increment(f'tokens.{stage}.prompt', _as_count(prompt_tokens))
+    metrics.increment(f'tokens.{stage}.cached', _as_count(cached_tokens))
+    metrics.increment(f'tokens.{stage}.completion',
+                      _as_count(completion_tokens))
+
+
+def record_schema_report(report):
+    """Record one request's schema prompt size and collection detail levels."""
+    metrics.observe('schema.tokens', report['tokens'])
+    for level in report['levels'].values():
+        metrics.increment(f'schema.collections.{level}')
+
+
+def prompt_cache_hit_rates():
+    """Share of prompt tokens served from the provider's prefix cache."""
+    counters = metrics.snapshot()['counters']
+    rates = {}
+    for name, prompt_tokens in counters.items():
+        if (name.startswith('tokens.') and name.endswith('.prompt')
+                and prompt_tokens):
+            stage = name[len('tokens.'):-len('.prompt')]
+            cached_tokens = counters.get(f'tokens.{stage}.cached', 0)
+            rates[stage] = cached_tokens / prompt_tokens
+    return rates
+
+
+def repair_success_rate():
+    """Share of requests whose first query failed that a repair fixed."""
+    requests = metrics.counter('aql.repair.requests')
+    if not requests:
+        return None
+    return metrics.counter('aql.repair.succeeded') / requests
+
+
+metrics = Metrics()
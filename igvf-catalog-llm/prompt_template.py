@@ -1,5 +1,9 @@
 from langchain_core.prompts import PromptTemplate
 
+# Bump whenever a prompt changes so cached answers built from the old prompt
+# are not served.
+PROMPT_VERSION = '7'
+
 AQL_GENERATION_TEMPLATE = """Task: Generate an ArangoDB Query Language (AQL) query from a User Input.
 
 You are an ArangoDB Query Language (AQL) expert responsible for translating a `User Input` into an ArangoDB Query Language (AQL) query.
@@ -17,6 +21,7 @@ Things you should do:
 - Always add 'LIMIT 5' before return for every query, ensuring that no more than 5 results are returned.
 - Return the `AQL Query` wrapped in 3 backticks (```).
 - Learn from `AQL Query Examples` queries.
+- If `Resolved Entities` are provided, look those documents up by their `_id` with `DOCUMENT()` or by `_key` instead of filtering on names, symbols or rsIDs.
 - Only answer to requests related to generating an AQL Query.
 - If a request is unrelated to generating AQL Query, say that you cannot help the user.
 
@@ -28,17 +33,52 @@ Things you should not do:
 
 Under no circumstance should you generate an AQL Query that deletes any data whatsoever.
 
+ArangoDB Schema:
+{adb_schema}
 
 AQL Query Examples (Optional):
 {aql_examples}
 
+Resolved Entities (Optional):
+{entities}
+
 User Input:
 {user_input}
 
 AQL Query:
 """
 
+# Everything above the schema is the same for every request and forms the
+# prefix OpenAI caches. The parts below it are ordered from least to most
+# variable: the schema (stable for a collection selection), the examples
+# picked for the question, the entities resolved from it, then the question
+# itself.
 AQL_GENERATION_PROMPT = PromptTemplate(
-    input_variables=['aql_examples', 'user_input'],
+    input_variables=['adb_schema', 'aql_examples', 'entities', 'user_input'],
     template=AQL_GENERATION_TEMPLATE,
 )
+
+# Sent when a generated query fails, instead of generating from scratch:
+# only the failing query, the error and the schema of the collections the
+# query reads, so a repair costs a fraction of a generation.
+AQL_REPAIR_TEMPLATE = """Task: Fix an ArangoDB Query Language (AQL) query that failed.
+
+Correct the `AQL Query` so it no longer causes the `AQL Error`, using only the collections and properties in the `ArangoDB Schema`. Errors may give a position as line:column. Keep 'LIMIT 5' and never remove or modify data.
+Return only the corrected query wrapped in 3 backticks (```).
+
+ArangoDB Schema:
+{adb_schema}
+
+AQL Query:
+{aql_query}
+
+AQL Error:
+{aql_error}
+
+Corrected AQL Query:
+"""
+
+AQL_REPAIR_PROMPT = PromptTemplate(
+    input_variables=['adb_schema', 'aql_query', 'aql_error'],
+    template=AQL_REPAIR_TEMPLATE,
+)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from aql_rewriter import canonical_aql
+from example_selector import referenced_collections
+
+
+class ResultCache:
+    """Size-bounded LRU of AQL results, invalidated per collection.
+
+    Entries are keyed on the canonical query text, bind variables and row
+    limit, and remember the collections the query reads. `marker` returns a
+    version for a collection, e.g. the data release and the collection's
+    revision; at most every `check_interval` seconds the markers of a
+    collection are compared and the entries reading it dropped on change.
+    """
+
+    def __init__(self, max_size=512, marker=None, check_interval=60):
+        self.max_size = max_size
+        self.marker = marker
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._markers = {}
+        self._checked_at = {}
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    @staticmethod
+    def make_key(aql, bind_vars=None, top_k=None):
+        payload = json.dumps([canonical_aql(aql), bind_vars or {}, top_k],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            for collection in entry['collections']:
+                self._check(collection)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry['rows']
+
+    def set(self, key, aql, rows):
+        if not self.enabled:
+            return
+        collections = tuple(referenced_collections(aql))
+        for collection in collections:
+            self._check(collection)
+        with self._lock:
+            self._entries[key] = {'rows': rows, 'collections': collections}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection):
+        """Drop every entry that reads `collection`."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if collection in entry['collections']]
+            for key in stale:
+                del self._entries[key]
+            self._counters['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'size': len(self._entries),
+                    'max_size': self.max_size}
+
+    def _check(self, collection):
+        if self.marker is None:
+            return
+        now = time.time()
+        with self._lock:
+            checked_at = self._checked_at.get(collection, float('-inf'))
+            if now - checked_at < self.check_interval:
+                return
+            self._checked_at[collection] = now
+        try:
+            marker = self.marker(collection)
+        except Exception as e:
+            print(f'Could not read the version of {collection}: {e}')
+            return
+        with self._lock:
+            previous = self._markers.get(collection)
+            self._markers[collection] = marker
+        if previous is not None and previous != marker:
+            self.invalidate(collection)
@@ -0,0 +1,103 @@
+import json
+import threading
+from collections import Counter
+
+
+# Attributes left out of rendered documents; `_id` already names the document
+HIDDEN_ATTRIBUTES = {'_key', '_rev'}
+
+NO_RECORDS = ('No records were found in the IGVF Catalog for this question. '
+              'The query that was run:\n{aql_query}')
+
+
+class ResultRenderer:
+    """Answers empty and small, regular query results without the LLM.
+
+    An empty result gets a fixed answer that quotes the query. Scalars, and
+    up to `max_rows` documents that share the same attributes, at most
+    `max_fields` of them with values of at most `max_value_chars`, are
+    rendered with templates. `render` returns None for anything else, which
+    is left to the summarization prompt.
+    """
+
+    def __init__(self, max_rows=5, max_fields=8, max_value_chars=120):
+        self.max_rows = max_rows
+        self.max_fields = max_fields
+        self.max_value_chars = max_value_chars
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def render(self, aql_query, aql_result):
+        """The answer for `aql_result`, or None when it needs the LLM."""
+        rows = [row for row in aql_result or [] if row not in (None, [], {})]
+        if not rows:
+            answer = NO_RECORDS.format(aql_query=aql_query.strip())
+            kind = 'empty'
+        elif len(rows) > self.max_rows:
+            answer, kind = None, 'summarized'
+        elif all(not isinstance(row, (dict, list)) for row in rows):
+            answer, kind = self._render_values(rows), 'rendered'
+        elif all(isinstance(row, dict) for row in rows):
+            answer = self._render_documents(rows)
+            kind = 'rendered' if answer is not None else 'summarized'
+        else:
+            answer, kind = None, 'summarized'
+        with self._lock:
+            self._counters[kind] += 1
+        return answer
+
+    def stats(self):
+        with self._lock:
+            return {kind: self._counters[kind]
+                    for kind in ('empty', 'rendered', 'summarized')}
+
+    def _format_value(self, value):
+        if isinstance(value, list):
+            if any(isinstance(item, (dict, list)) for item in value):
+                return None
+            # Items too long to write out leave the list to the LLM
+            items = [self._format_value(item) for item in value]
+            if any(item is None for item in items):
+                return None
+            text = ', '.join(items)
+        elif isinstance(value, dict):
+            return None
+        elif isinstance(value, str):
+            text = value
+        else:
+            text = json.dumps(value)
+        return text if len(text) <= self.max_value_chars else None
+
+    def _render_values(self, rows):
+        values = [self._format_value(row) for row in rows]
+        if any(value is None for value in values):
+            return None
+        if len(values) == 1:
+            return f'The answer is {values[0]}.'
+        return f'Found {len(values)} results: {"; ".join(values)}.'
+
+    def _render_documents(self, rows):
+        documents = [{name: value for name, value in row.items()
+                      if name not in HIDDEN_ATTRIBUTES} for row in rows]
+        fields = list(documents[0])
+        if (not fields or len(fields) > self.max_fields
+                or any(set(document) != set(fields)
+                       for document in documents)):
+            return None
+
+        lines = []
+        for document in documents:
+            parts = []
+            for name in fields:
+                value = self._format_value(document[name])
+                if value is None:
+                    return None
+                parts.append(f'{name}: {value}')
+            lines.append('- ' + '; '.join(parts))
+        collections = {str(document.get('_id', '')).split('/')[0]
+                       for document in documents}
+        source = ''
+        if len(collections) == 1 and '' not in collections:
+            source = f' in {collections.pop()}'
+        noun = 'record' if len(documents) == 1 else 'records'
+        return f'Found {len(documents)} {noun}{source}:\n' + '\n'.join(lines)
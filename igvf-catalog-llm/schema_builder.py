@@ -0,0 +1,82 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+SAMPLE_QUERY = 'FOR doc IN @@collection LIMIT @sample_size RETURN doc'
+
+
+def sample_collection(db, collection_name, collection_type, sample_size=1,
+                      timeout=30):
+    """Return the schema entry ArangoGraph builds for one collection.
+
+    Returns None for empty collections, which ArangoGraph skips as well.
+    """
+    if db.collection(collection_name).count() == 0:
+        return None
+
+    cursor = db.aql.execute(
+        SAMPLE_QUERY,
+        bind_vars={'@collection': collection_name, 'sample_size': sample_size},
+        max_runtime=timeout,
+    )
+    properties = []
+    seen = set()
+    doc = None
+    for doc in cursor:
+        for key, value in doc.items():
+            # With more than one sampled document ArangoGraph would repeat
+            # every property; keep the first occurrence only.
+            if key not in seen:
+                seen.add(key)
+                properties.append({'name': key, 'type': type(value).__name__})
+
+    return {
+        'collection_name': collection_name,
+        'collection_type': collection_type,
+        f'{collection_type}_properties': properties,
+        f'example_{collection_type}': doc,
+    }
+
+
+def build_schema(db, sample_size=1, timeout=30, max_workers=8):
+    """Sample every collection concurrently into ArangoGraph's schema shape.
+
+    Collections that fail or do not finish within `timeout` seconds are left
+    out of the schema, so one slow collection cannot hold up start up.
+    """
+    graph_schema = [
+        {'graph_name': g['name'], 'edge_definitions': g['edge_definitions']}
+        for g in db.graphs()
+    ]
+    collections = [c for c in db.collections() if not c['system']]
+
+    started = time.time()
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    futures = [
+        pool.submit(sample_collection, db, c['name'],
+                    c['type'], sample_size, timeout)
+        for c in collections
+    ]
+    # Workers are sized to the pool, so every collection starts within
+    # (collections / workers) batches; bound the whole wait accordingly.
+    batches = -(-len(futures) // max_workers) if futures else 0
+    wait(futures, timeout=timeout * batches)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    collection_schema = []
+    for collection, future in zip(collections, futures):
+        if not future.done():
+            print(f'Schema sampling timed out for {collection["name"]}')
+            continue
+        try:
+            entry = future.result()
+        except Exception as e:
+            print(f'Schema sampling failed for {collection["name"]}: {e}')
+            continue
+        if entry is not None:
+            collection_schema.append(entry)
+
+    print(f'Sampled {len(collection_schema)} collections in '
+          f'{time.time() - started:.1f}s')
+    return {'Graph Schema': graph_schema,
+            'Collection Schema': collection_schema}
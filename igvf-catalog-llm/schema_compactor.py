@@ -0,0 +1,114 @@
+import threading
+
+
+# Properties that cost tokens without helping the model write queries
+DROPPED_PROPERTIES = frozenset({'_rev', 'source_url'})
+
+# Detail levels a collection can be rendered at, from most to least verbose
+COMPACT = 'compact'
+FIELDS = 'fields'
+DROPPED = 'dropped'
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text):
+    """Token count for the gpt-4o/gpt-4.1 tokenizer.
+
+    Falls back to the usual four-characters-per-token estimate when the
+    tiktoken encoding cannot be loaded (it is downloaded on first use).
+    """
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding('o200k_base')
+            except Exception:
+                _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return -(-len(text) // 4)
+
+
+def truncate_value(value, max_chars=80, max_items=3, depth=2):
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars] + '...'
+    if isinstance(value, (list, tuple)):
+        items = [truncate_value(v, max_chars, max_items, depth - 1)
+                 for v in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f'... {len(value) - max_items} more')
+        return items
+    if isinstance(value, dict):
+        if depth <= 0:
+            return '{...}'
+        return {k: truncate_value(v, max_chars, max_items, depth - 1)
+                for k, v in value.items()}
+    return value
+
+
+def compact_collection(collection, level=COMPACT, max_chars=80, max_items=3,
+                       dropped_properties=DROPPED_PROPERTIES):
+    """Smaller rendering of one ArangoGraph collection schema entry.
+
+    Properties become a name -> type mapping; the example document is kept
+    with truncated values at the compact level and left out at the fields
+    level.
+    """
+    collection_type = collection.get('collection_type')
+    properties = {
+        p['name']: p['type']
+        for p in collection.get(f'{collection_type}_properties') or []
+        if p['name'] not in dropped_properties
+    }
+    compacted = {
+        'collection_name': collection['collection_name'],
+        'collection_type': collection_type,
+        f'{collection_type}_properties': properties,
+    }
+    example = collection.get(f'example_{collection_type}')
+    if level == COMPACT and example is not None:
+        compacted[f'example_{collection_type}'] = {
+            k: truncate_value(v, max_chars, max_items)
+            for k, v in example.items() if k not in dropped_properties
+        }
+    return compacted
+
+
+def compact_graph_schema(graph_schema, collection_names):
+    """Graph schema with only the edges between selected collections."""
+    selected = set(collection_names)
+    compacted = []
+    for graph in graph_schema:
+        definitions = [d for d in graph.get('edge_definitions') or []
+                       if d.get('edge_collection') in selected]
+        if definitions:
+            compacted.append({'graph_name': graph.get('graph_name'),
+                              'edge_definitions': definitions})
+    return compacted
+
+
+def pack(token_counts, token_budget):
+    """Pick a detail level per collection so the total fits the budget.
+
+    `token_counts` maps collection name to {level: tokens}. The largest
+    collections are downgraded first, to field lists and then out of the
+    prompt entirely, until the total is within `token_budget`.
+    """
+    levels = {name: COMPACT for name in token_counts}
+    if token_budget is None:
+        return levels
+
+    def total():
+        return sum(token_counts[name][level]
+                   for name, level in levels.items() if level != DROPPED)
+
+    for downgrade in (FIELDS, DROPPED):
+        by_size = sorted(levels, key=lambda n: (-token_counts[n][COMPACT], n))
+        for name in by_size:
+            if total() <= token_budget:
+                return levels
+            levels[name] = downgrade
+    return levels
@@ -0,0 +1,306 @@
+import asyncio
+import itertools
+import time
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from langchain_community.graphs import ArangoGraph
+
+from aql_rewriter import is_read_only, parameterize
+from schema_compactor import (COMPACT, DROPPED, FIELDS, compact_collection,
+                              compact_graph_schema, count_tokens, pack)
+
+
+def freeze(value):
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+class SchemaRegistry:
+    """Read-only index of an ArangoGraph schema, built once at startup.
+
+    Each collection is frozen and serialized up front so that per-request
+    views only pick references out of a dict instead of scanning and
+    copying the full schema.
+
+    With `compact` set, collections are stored in their compacted forms
+    (see `schema_compactor`) with token counts for each, and views pack
+    the selection under `token_budget` tokens.
+    """
+
+    def __init__(self, schema, compact=False, token_budget=None,
+                 count_tokens=count_tokens):
+        schema = schema or {}
+        graph_schema = schema.get('Graph Schema') or []
+        collection_schema = schema.get('Collection Schema') or []
+
+        self.compact = compact
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self.collection_names = tuple(
+            c['collection_name'] for c in collection_schema)
+        self.graph_schema = freeze(graph_schema)
+        self.graph_fragment = repr(graph_schema)
+
+        if compact:
+            levels = {
+                level: [compact_collection(c, level)
+                        for c in collection_schema]
+                for level in (COMPACT, FIELDS)
+            }
+        else:
+            levels = {COMPACT: collection_schema}
+        self._collections = {
+            level: MappingProxyType(
+                {c['collection_name']: freeze(c) for c in collections})
+            for level, collections in levels.items()}
+        # repr() of the original dicts is exactly what str() of the schema
+        # dict produced when it was formatted into the prompt.
+        self._fragments = {
+            level: MappingProxyType(
+                {c['collection_name']: repr(c) for c in collections})
+            for level, collections in levels.items()}
+        self.token_counts = MappingProxyType({
+            name: MappingProxyType({
+                level: count_tokens(fragments[name])
+                for level, fragments in self._fragments.items()})
+            for name in self.collection_names} if compact else {})
+
+    def __contains__(self, collection_name):
+        return collection_name in self._collections[COMPACT]
+
+    def __len__(self):
+        return len(self._collections[COMPACT])
+
+    def collection(self, collection_name, level=COMPACT):
+        return self._collections[level][collection_name]
+
+    def fragment(self, collection_name, level=COMPACT):
+        return self._fragments[level][collection_name]
+
+    def view(self, collection_names, token_budget=None):
+        # Views always list collections in registry order, so the same
+        # selection serializes to the same bytes however it was requested.
+        requested = set(collection_names)
+        selected = tuple(
+            name for name in self.collection_names if name in requested)
+        if not self.compact:
+            return SchemaView(self, selected)
+
+        budget = self.token_budget if token_budget is None else token_budget
+        levels = pack({name: self.token_counts[name] for name in selected},
+                      budget)
+        kept = tuple(name for name in selected if levels[name] != DROPPED)
+        graph_schema = compact_graph_schema(thaw(self.graph_schema), kept)
+        return SchemaView(self, kept, levels=levels,
+                          graph_schema=freeze(graph_schema),
+                          graph_fragment=repr(graph_schema))
+
+
+class SchemaView(Mapping):
+    """The subset of a registry selected for one request.
+
+    Behaves like the `graph.schema` dict ArangoGraph exposes, and formats
+    into prompts from the registry's pre-serialized fragments.
+    """
+
+    KEYS = ('Graph Schema', 'Collection Schema')
+
+    def __init__(self, registry, collection_names, levels=None,
+                 graph_schema=None, graph_fragment=None):
+        self._registry = registry
+        self.collection_names = collection_names
+        # Detail level per requested collection, including dropped ones
+        self.levels = levels or {name: COMPACT for name in collection_names}
+        self._graph_schema = (registry.graph_schema if graph_schema is None
+                              else graph_schema)
+        self._graph_fragment = (registry.graph_fragment
+                                if graph_fragment is None else graph_fragment)
+
+    def __getitem__(self, key):
+        if key == 'Graph Schema':
+            return self._graph_schema
+        if key == 'Collection Schema':
+            return tuple(self._registry.collection(name, self.levels[name])
+                         for name in self.collection_names)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __str__(self):
+        collections = ', '.join(
+            self._registry.fragment(name, self.levels[name])
+            for name in self.collection_names)
+        return (f"{{'Graph Schema': {self._graph_fragment}, "
+                f"'Collection Schema': [{collections}]}}")
+
+    __repr__ = __str__
+
+    def to_dict(self):
+        return thaw(dict(self))
+
+    def subset(self, collection_names):
+        """A view of just the given collections of this view, for repairs."""
+        return self._registry.view([name for name in self.collection_names
+                                    if name in collection_names])
+
+    def report(self):
+        """Prompt size of this view and the level each collection got."""
+        return {
+            'tokens': self._registry.count_tokens(str(self)),
+            'token_budget': self._registry.token_budget,
+            'levels': dict(self.levels),
+        }
+
+
+class GraphView(ArangoGraph):
+    """ArangoGraph that serves a schema view over a shared connection.
+
+    Creating one never samples the database, so it is cheap enough to build
+    per request and nothing on it is shared between requests. Results can be
+    served from a shared `ResultCache`, and read-only queries can ask
+    ArangoDB for its own query result cache with `server_cache`.
+
+    With `parameterize`, literals are lifted into bind variables before
+    execution, so queries that differ only in identifiers share ArangoDB
+    query plans, result cache entries and `shape_timings`. With an
+    `AqlGuard`, queries are rewritten, explained and rejected when their plan
+    is too expensive before they run, and run with its cursor limits.
+    `aquery` and `aestimate` do the same through `async_db`, an
+    AsyncArangoDatabase, or in a thread without one.
+    """
+
+    def __init__(self, db, schema, result_cache=None, server_cache=False,
+                 parameterize=False, guard=None, async_db=None,
+                 shape_timings=None):
+        self._db = db
+        self._async_db = async_db
+        self._schema = schema
+        self._result_cache = result_cache
+        self._server_cache = server_cache
+        self._parameterize = parameterize
+        self._guard = guard
+        self._shape_timings = shape_timings
+
+    @property
+    def db(self):
+        return self._db
+
+    @property
+    def schema(self):
+        return self._schema
+
+    def set_schema(self, schema=None):
+        raise TypeError('GraphView schemas are read-only')
+
+    def _prepare(self, query, top_k, kwargs, count=True):
+        """The query to run, its fingerprint and the query it was made from.
+
+        Collections are read from the last one: parameterizing turns
+        `DOCUMENT("genes/...")` ids into bind variables.
+        """
+        if self._guard is not None:
+            query = self._guard.rewrite(query, top_k, count=count)
+        source, fingerprint = query, None
+        if self._parameterize:
+            parameterized = parameterize(query)
+            query = parameterized.aql
+            fingerprint = parameterized.fingerprint
+            kwargs['bind_vars'] = {**parameterized.bind_vars,
+                                   **(kwargs.get('bind_vars') or {})}
+        return query, fingerprint, source
+
+    def _cached(self, query, top_k, kwargs):
+        """Result cache key and cached rows; rows are None on a miss."""
+        if self._result_cache is None:
+            return None, None
+        key = self._result_cache.make_key(
+            query, kwargs.get('bind_vars'), top_k)
+        rows = self._result_cache.get(key)
+        return key, None if rows is None else list(rows)
+
+    def _execute_options(self, query, kwargs):
+        if self._server_cache and is_read_only(query):
+            kwargs.setdefault('cache', True)
+        if self._guard is not None:
+            kwargs = {**self._guard.execute_options(), **kwargs}
+        return kwargs
+
+    def _store(self, source, fingerprint, key, rows, started):
+        if fingerprint is not None and self._shape_timings is not None:
+            self._shape_timings.observe(fingerprint, time.time() - started)
+        if key is not None:
+            self._result_cache.set(key, source, rows)
+
+    def estimate(self, query, top_k=None, **kwargs):
+        """Estimated cost of running `query`, 0 without a guard.
+
+        Raises AqlGuardError when the guard would reject the query.
+        """
+        if self._guard is None:
+            return 0
+        query, _, _ = self._prepare(query, top_k, kwargs, count=False)
+        return self._guard.check(query, kwargs.get('bind_vars'))
+
+    async def aestimate(self, query, top_k=None, **kwargs):
+        if self._guard is None:
+            return 0
+        if self._async_db is None:
+            return await asyncio.to_thread(
+                self.estimate, query, top_k, **kwargs)
+        query, _, _ = self._prepare(query, top_k, kwargs, count=False)
+        return await self._guard.acheck(query, kwargs.get('bind_vars'))
+
+    def query(self, query, top_k=None, check=True, **kwargs):
+        # `check=False` skips the guard's explain for a query `estimate`
+        # already accepted.
+        query, fingerprint, source = self._prepare(query, top_k, kwargs)
+        key, rows = self._cached(query, top_k, kwargs)
+        if rows is not None:
+            return rows
+        if self._guard is not None and check:
+            self._guard.check(query, kwargs.get('bind_vars'))
+
+        started = time.time()
+        options = self._execute_options(query, kwargs)
+        cursor = self._db.aql.execute(query, **options)
+        rows = [doc for doc in itertools.islice(cursor, top_k)]
+        self._store(source, fingerprint, key, rows, started)
+        return rows
+
+    async def aquery(self, query, top_k=None, check=True, **kwargs):
+        """`query` run through `async_db`, with the same caching and guard."""
+        if self._async_db is None:
+            return await asyncio.to_thread(
+                self.query, query, top_k, check, **kwargs)
+        query, fingerprint, source = self._prepare(query, top_k, kwargs)
+        # The result cache reads collection revisions with python-arango,
+        # which would block the event loop.
+        key, rows = await asyncio.to_thread(
+            self._cached, query, top_k, kwargs)
+        if rows is not None:
+            return rows
+        if self._guard is not None and check:
+            await self._guard.acheck(query, kwargs.get('bind_vars'))
+
+        started = time.time()
+        rows = await self._async_db.execute(
+            query, top_k=top_k, **self._execute_options(query, kwargs))
+        await asyncio.to_thread(
+            self._store, source, fingerprint, key, rows, started)
+        return rows
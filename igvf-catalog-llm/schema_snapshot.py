@@ -0,0 +1,121 @@
+"""Persisted copy of the ArangoGraph schema for fast worker start up.
+
+Write a snapshot from the live catalog with:
+
+    python schema_snapshot.py --output schema_snapshot.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from langchain_community.graphs import ArangoGraph
+
+from answer_cache import catalog_version
+from http_clients import PooledArangoHTTPClient
+from schema_builder import build_schema
+
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class SnapshotArangoGraph(ArangoGraph):
+    """ArangoGraph built around an existing schema instead of sampling it.
+
+    The schema comes from a snapshot file or from `schema_builder`.
+    """
+
+    def __init__(self, db, schema):
+        self._snapshot_schema = schema
+        super().__init__(db)
+
+    def generate_schema(self, sample_ratio=0):
+        return self._snapshot_schema
+
+
+def build_snapshot(schema, backend_url, db_name, data_release=None):
+    collection_schema = schema['Collection Schema']
+    return {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'created_at': time.time(),
+        'backend_url': backend_url,
+        'db_name': db_name,
+        'data_release': data_release,
+        'schema_version': catalog_version(collection_schema, data_release),
+        'collection_names': [c['collection_name'] for c in collection_schema],
+        'schema': schema,
+    }
+
+
+def write_snapshot(path, snapshot):
+    # Write next to the target and rename so readers never see a partial file.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f, default=str)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_snapshot(path, max_age=None, backend_url=None, data_release=None):
+    """Return the snapshot at `path`, or None if it is missing or stale."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if snapshot.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    if backend_url is not None and snapshot.get('backend_url') != backend_url:
+        return None
+    if (data_release is not None
+            and snapshot.get('data_release') != data_release):
+        return None
+    if (max_age is not None
+            and time.time() - snapshot.get('created_at', 0) > max_age):
+        return None
+    return snapshot
+
+
+def main(argv=None):
+    from arango import ArangoClient
+
+    parser = argparse.ArgumentParser(
+        description='Sample the catalog schema and write a snapshot file.')
+    parser.add_argument('--output', default='schema_snapshot.json')
+    parser.add_argument('--backend-url', default=os.environ.get(
+        'BACKEND_URL', 'https://db-dev.catalog.igvf.org/'))
+    parser.add_argument('--db-name', default='igvf')
+    parser.add_argument('--data-release',
+                        default=os.environ.get('CATALOG_DATA_RELEASE'))
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--sample-size', type=int, default=1)
+    parser.add_argument('--timeout', type=int, default=30,
+                        help='seconds allowed per collection')
+    args = parser.parse_args(argv)
+
+    client = ArangoClient(
+        hosts=args.backend_url,
+        http_client=PooledArangoHTTPClient(pool_maxsize=args.workers),
+    )
+    db = client.db(args.db_name, username=os.environ['CATALOG_USERNAME'],
+                   password=os.environ['CATALOG_PASSWORD'])
+    started = time.time()
+    schema = build_schema(db, sample_size=args.sample_size,
+                          timeout=args.timeout, max_workers=args.workers)
+    snapshot = build_snapshot(
+        schema, args.backend_url, args.db_name, args.data_release)
+    write_snapshot(args.output, snapshot)
+    print(f'Wrote {len(snapshot["collection_names"])} collections to '
+          f'{args.output} in {time.time() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,18 @@
-import openai
 import ast
 
+from http_clients import openai_pool
+from metrics import record_token_usage
+
+SELECT_COLLECTIONS_MODEL = 'gpt-4o'
+
 
 def create_prompt(input_text, categories):
+    # The instructions, examples and category list are identical for every
+    # request, so they come first and form a prefix OpenAI can cache. Only
+    # the input at the very end varies.
     category_list = '\n'.join([f'- {cat}' for cat in categories])
     return f"""
-    Please categorize the following input into one or more of the predefined categories. Only return the category names and return the answer in json format. for example: {{"category_names": ["category1", "category2"]}}.
-
-    Input: {input_text}
-
-    Categories:
-    {category_list}
+    Please categorize the input at the end into one or more of the predefined categories. Only return the category names and return the answer in json format. for example: {{"category_names": ["category1", "category2"]}}.
 
     Here is the examples you can learn from:
     ###
@@ -30,22 +32,52 @@ def create_prompt(input_text, categories):
     answer: ["proteins", "proteins_proteins"]
     ###
 
+    Categories:
+    {category_list}
 
+    Input: {input_text}
     """
 
 
-def select_collections(query, collection_names):
-    RESPONSE_FORMAT = {'type': 'json_object'}
-
-    content = create_prompt(query, collection_names)
-    response = openai.chat.completions.create(
-        response_format=RESPONSE_FORMAT,
-        model='gpt-4o',
-        temperature=0,
-        messages=[
-            {'role': 'user', 'content': content},
-        ]
+def record_response_usage(response):
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    details = getattr(usage, 'prompt_tokens_details', None)
+    record_token_usage(
+        'select_collections',
+        usage.prompt_tokens,
+        getattr(details, 'cached_tokens', 0),
+        usage.completion_tokens,
     )
+
+
+def select_collections(query, collection_names):
+    response = openai_pool.client.chat.completions.create(
+        **request_arguments(query, collection_names))
+    return parse_response(response)
+
+
+async def aselect_collections(query, collection_names):
+    response = await openai_pool.async_client.chat.completions.create(
+        **request_arguments(query, collection_names))
+    return parse_response(response)
+
+
+def request_arguments(query, collection_names):
+    return {
+        'response_format': {'type': 'json_object'},
+        'model': SELECT_COLLECTIONS_MODEL,
+        'temperature': 0,
+        'messages': [
+            {'role': 'user',
+             'content': create_prompt(query, collection_names)},
+        ],
+    }
+
+
+def parse_response(response):
+    record_response_usage(response)
     output = response.choices[0].message.content
     try:
         json_obj = ast.literal_eval(output)
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from collections import Counter
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers arriving meanwhile share it.
+
+    `do` coalesces calls from threads of one worker, `ado` coalesces
+    coroutines on one event loop. The first caller for a key runs the
+    function; the others wait for its result, or its exception, instead of
+    running their own. Nothing is kept once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self._counters = Counter()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._counters['leaders' if leader else 'coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, fn, *args, **kwargs):
+        with self._lock:
+            task = self._tasks.get(key)
+            leader = task is None
+            if leader:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                self._tasks[key] = task
+                task.add_done_callback(lambda _: self._forget(key, task))
+            self._counters['leaders' if leader else 'coalesced'] += 1
+        # A caller that goes away does not cancel the call the others wait on
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+    def stats(self):
+        with self._lock:
+            leaders = self._counters['leaders']
+            coalesced = self._counters['coalesced']
+            calls = leaders + coalesced
+            return {
+                'leaders': leaders,
+                'coalesced': coalesced,
+                'coalesced_rate': coalesced / calls if calls else 0.0,
+                'in_flight': len(self._calls) + len(self._tasks),
+            }
@@ -21,6 +21,27 @@ os.environ['BACKEND_URL'] = 'https://test-db.example.com/'
 os.environ['OPENAI_API_KEY'] = 'test_key'
 
 
+FIXTURES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+@pytest.fixture
+def schema_snapshot():
+    """An offline schema snapshot covering the collections used in AQL_EXAMPLES."""
+    from schema_snapshot import load_snapshot
+    return load_snapshot(os.path.join(FIXTURES_DIR, 'schema_snapshot.json'))
+
+
+@pytest.fixture
+def catalog_schema(schema_snapshot):
+    return schema_snapshot['schema']
+
+
+@pytest.fixture
+def collection_schema(catalog_schema):
+    return catalog_schema['Collection Schema']
+
+
 @pytest.fixture(scope='session', autouse=True)
 def setup_test_environment():
     """Restore original environment variables after all tests complete."""
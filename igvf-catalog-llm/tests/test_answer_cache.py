@@ -0,0 +1,116 @@
+import pytest
+from unittest.mock import patch
+from answer_cache import AnswerCache, catalog_version, normalize_question
+
+
+def test_normalize_question_folds_case_whitespace_and_punctuation():
+    """Test that trivially different phrasings normalize to the same text."""
+    assert normalize_question('Tell me about gene PAH?') == \
+        normalize_question('  tell me   about gene pah ')
+
+
+def test_normalize_question_keeps_identifiers_distinct():
+    """Test that punctuation inside identifiers does not merge tokens."""
+    assert normalize_question('score 1.5') != normalize_question('score 15')
+
+
+def test_make_key_includes_extra_parts():
+    """Test that model names and prompt version are part of the key."""
+    cache = AnswerCache()
+    key = cache.make_key('q', 'gpt-4o', '1')
+    assert key == cache.make_key('Q?', 'gpt-4o', '1')
+    assert key != cache.make_key('q', 'gpt-4o', '2')
+
+
+def test_get_and_set_memory_tier():
+    """Test a memory tier round trip and the hit/miss counters."""
+    cache = AnswerCache(max_size=2)
+    assert cache.get('a') is None
+    cache.set('a', {'result': 'x'})
+    assert cache.get('a') == {'result': 'x'}
+
+    stats = cache.stats()
+    assert stats['memory_hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['size'] == 1
+
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted first."""
+    cache = AnswerCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_ttl_expiry():
+    """Test that entries expire after the TTL."""
+    cache = AnswerCache(ttl=10)
+    with patch('answer_cache.time.time', return_value=1000):
+        cache.set('a', 1)
+    with patch('answer_cache.time.time', return_value=1005):
+        assert cache.get('a') == 1
+    with patch('answer_cache.time.time', return_value=1011):
+        assert cache.get('a') is None
+
+
+def test_disabled_cache():
+    """Test that a zero sized cache stores nothing."""
+    cache = AnswerCache(max_size=0)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['enabled'] is False
+
+
+def test_disk_tier_shared_between_instances(tmp_path):
+    """Test that a second cache on the same file sees the first one's entries."""
+    path = str(tmp_path / 'answers.sqlite')
+    first = AnswerCache(path=path, version='v1')
+    second = AnswerCache(path=path, version='v1')
+
+    first.set('a', {'result': 'x'})
+
+    assert second.get('a') == {'result': 'x'}
+    assert second.stats()['disk_hits'] == 1
+    # The disk hit is promoted into the memory tier
+    assert second.get('a') == {'result': 'x'}
+    assert second.stats()['memory_hits'] == 1
+
+
+def test_disk_tier_ignores_other_versions(tmp_path):
+    """Test that entries written for another catalog version are not served."""
+    path = str(tmp_path / 'answers.sqlite')
+    AnswerCache(path=path, version='v1').set('a', 1)
+
+    assert AnswerCache(path=path, version='v2').get('a') is None
+
+
+def test_set_version_invalidates_memory_tier():
+    """Test that changing the catalog version drops cached answers."""
+    cache = AnswerCache(version='v1')
+    cache.set('a', 1)
+    cache.set_version('v2')
+
+    assert cache.get('a') is None
+    assert cache.stats()['version'] == 'v2'
+
+
+def test_catalog_version_ignores_example_documents():
+    """Test that only schema structure and data release affect the version."""
+    schema = [{
+        'collection_name': 'genes',
+        'collection_type': 'document',
+        'document_properties': [{'name': 'name', 'type': 'str'}],
+        'example_document': {'name': 'PAH'},
+    }]
+    resampled = [{**schema[0], 'example_document': {'name': 'SAMD11'}}]
+    changed = [{**schema[0], 'document_properties': []}]
+
+    assert catalog_version(schema) == catalog_version(resampled)
+    assert catalog_version(schema) != catalog_version(changed)
+    assert catalog_version(schema, 'v1') != catalog_version(schema, 'v2')
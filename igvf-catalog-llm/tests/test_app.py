@@ -1,8 +1,20 @@
+import asyncio
 import pytest
 import os
 import json
-from unittest.mock import Mock, patch, MagicMock
-from app import app, initialize_arango_graph, initialize_collection_names, build_response, ask_llm, get_updated_graph
+import threading
+import time
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
+from app import app, initialize_arango_graph, initialize_collection_names, build_response, ask_llm, aask_llm, after_fork, coalesced_ask_llm, get_updated_graph
+from answer_cache import AnswerCache
+from collection_classifier import CollectionClassifier
+from example_bank import ExampleBank
+from entity_index import EntityIndex
+from fast_path import FastPath
+from metrics import metrics
+from prompt_template import AQL_REPAIR_PROMPT
+from schema_registry import SchemaRegistry
+from single_flight import SingleFlight
 
 
 @pytest.fixture
@@ -50,6 +62,19 @@ def test_build_response():
     assert result['title'] == 'IGVF Catalog LLM Query'
 
 
+def test_build_response_drops_fields_per_mode():
+    """Test that each mode only returns the fields it produces."""
+    block = {'query': 'q', 'aql_query': 'RETURN 1',
+             'aql_result': [1], 'result': 'one'}
+
+    assert set(build_response(block, 'aql_only')) == {
+        'query', 'aql_query', 'title'}
+    assert set(build_response(block, 'raw')) == {
+        'query', 'aql_query', 'aql_result', 'title'}
+    assert set(build_response(block, 'full')) == {
+        'query', 'aql_query', 'aql_result', 'result', 'title'}
+
+
 def test_get_updated_graph():
     """Test graph update function."""
     mock_graph = Mock()
@@ -64,12 +89,15 @@ def test_get_updated_graph():
     selected_collection_names = ['genes', 'diseases']
 
     result = get_updated_graph(
-        mock_graph, collection_schema, selected_collection_names)
+        mock_graph, SchemaRegistry({'Collection Schema': collection_schema}),
+        selected_collection_names)
 
-    assert result == mock_graph
+    assert result.db == mock_graph.db
     assert len(result.schema['Collection Schema']) == 2
     assert result.schema['Collection Schema'][0]['collection_name'] == 'genes'
     assert result.schema['Collection Schema'][1]['collection_name'] == 'diseases'
+    # The shared graph is left untouched
+    assert mock_graph.schema == {'Collection Schema': []}
 
 
 def test_get_updated_graph_empty_selection():
@@ -84,9 +112,10 @@ def test_get_updated_graph_empty_selection():
     selected_collection_names = []
 
     result = get_updated_graph(
-        mock_graph, collection_schema, selected_collection_names)
+        mock_graph, SchemaRegistry({'Collection Schema': collection_schema}),
+        selected_collection_names)
 
-    assert result == mock_graph
+    assert result.db == mock_graph.db
     assert len(result.schema['Collection Schema']) == 0
 
 
@@ -102,17 +131,34 @@ def test_get_updated_graph_nonexistent_collection():
     selected_collection_names = ['nonexistent']
 
     result = get_updated_graph(
-        mock_graph, collection_schema, selected_collection_names)
+        mock_graph, SchemaRegistry({'Collection Schema': collection_schema}),
+        selected_collection_names)
 
-    assert result == mock_graph
+    assert result.db == mock_graph.db
     assert len(result.schema['Collection Schema']) == 0
 
 
+def test_get_updated_graph_requests_are_isolated():
+    """Test that two requests get independent schema views."""
+    mock_graph = Mock()
+    registry = SchemaRegistry({'Collection Schema': [
+        {'collection_name': 'genes'}, {'collection_name': 'variants'}]})
+
+    first = get_updated_graph(mock_graph, registry, ['genes'])
+    second = get_updated_graph(mock_graph, registry, ['variants'])
+
+    assert [c['collection_name']
+            for c in first.schema['Collection Schema']] == ['genes']
+    assert [c['collection_name']
+            for c in second.schema['Collection Schema']] == ['variants']
+
+
+@patch('app.record_schema_report')
 @patch('app.select_collections')
 @patch('app.get_updated_graph')
-@patch('app.ArangoGraphQAChain')
+@patch('app.CatalogGraphQAChain')
 @patch('app.get_openai_callback')
-def test_ask_llm_success(mock_callback, mock_chain_class, mock_get_graph, mock_select_collections):
+def test_ask_llm_success(mock_callback, mock_chain_class, mock_get_graph, mock_select_collections, mock_schema_report):
     """Test successful LLM query."""
     # Mock dependencies
     mock_select_collections.return_value = ['genes']
@@ -136,7 +182,8 @@ def test_ask_llm_success(mock_callback, mock_chain_class, mock_get_graph, mock_s
             patch('app.collection_schema', [{'collection_name': 'genes'}]), \
             patch('app.model', Mock()), \
             patch('app.AQL_GENERATION_PROMPT', 'test prompt'), \
-            patch('app.AQL_EXAMPLES', 'test examples'):
+            patch('app.example_selector') as mock_example_selector:
+        mock_example_selector.select.return_value = 'test examples'
 
         result = ask_llm('test question')
 
@@ -144,6 +191,7 @@ def test_ask_llm_success(mock_callback, mock_chain_class, mock_get_graph, mock_s
         mock_chain_class.from_llm.assert_called_once()
         call_args = mock_chain_class.from_llm.call_args
         assert call_args[1]['aql_generation_prompt'] == 'test prompt'
+        assert call_args[1]['aql_fix_prompt'] is AQL_REPAIR_PROMPT
         assert call_args[1]['graph'] == mock_graph
         assert call_args[1]['verbose'] == True
         assert call_args[1]['allow_dangerous_requests'] == True
@@ -151,9 +199,18 @@ def test_ask_llm_success(mock_callback, mock_chain_class, mock_get_graph, mock_s
         # Verify chain properties
         assert mock_chain.top_k == 5
         assert mock_chain.max_aql_generation_attempts == 5
+        assert mock_chain.candidates == 1
+        assert mock_chain.renderer is not None
         assert mock_chain.return_aql_query == True
         assert mock_chain.return_aql_result == True
         assert mock_chain.aql_examples == 'test examples'
+        assert mock_chain.entities == ''
+        assert mock_chain.aql_cache_key
+        assert mock_chain.validator is not None
+        mock_example_selector.select.assert_called_once_with(
+            'test question', ['genes'])
+        mock_schema_report.assert_called_once_with(
+            mock_graph.schema.report.return_value)
 
         # Verify chain invocation
         mock_chain.invoke.assert_called_once_with({
@@ -167,6 +224,184 @@ def test_ask_llm_success(mock_callback, mock_chain_class, mock_get_graph, mock_s
         }
 
 
+@patch('app.record_schema_report')
+@patch('app.aselect_collections')
+@patch('app.get_updated_graph')
+@patch('app.CatalogGraphQAChain')
+def test_aask_llm_awaits_selection_and_chain(mock_chain_class, mock_get_graph, mock_aselect_collections,
+                                             mock_schema_report):
+    """Test that aask_llm builds the same chain and awaits selection and the chain."""
+    mock_aselect_collections.return_value = ['genes']
+    mock_chain = Mock()
+    mock_chain.ainvoke = AsyncMock(return_value={'result': 'test result'})
+    mock_chain_class.from_llm.return_value = mock_chain
+
+    with patch('app.answer_cache', AnswerCache(max_size=0)), \
+            patch('app.collection_classifier', CollectionClassifier(None)), \
+            patch('app.collection_names', ['genes']), \
+            patch('app.graph', Mock()), \
+            patch('app.model', Mock()):
+        result = asyncio.run(aask_llm('test question', 'raw'))
+
+    assert result == {'result': 'test result'}
+    mock_aselect_collections.assert_awaited_once_with(
+        'test question', ['genes'])
+    mock_chain.ainvoke.assert_awaited_once_with(
+        {'user_input': 'test question', 'query': 'test question'})
+    mock_chain.invoke.assert_not_called()
+    assert mock_chain.mode == 'raw'
+    assert mock_chain.max_aql_generation_attempts == 5
+
+
+@patch('app.record_schema_report')
+@patch('app.select_collections')
+@patch('app.get_updated_graph')
+@patch('app.CatalogGraphQAChain')
+@patch('app.get_openai_callback')
+def test_ask_llm_uses_answer_cache(mock_callback, mock_chain_class, mock_get_graph, mock_select_collections, mock_schema_report):
+    """Test that repeated questions are answered from the answer cache."""
+    mock_select_collections.return_value = ['genes']
+    mock_chain = Mock()
+    mock_chain_class.from_llm.return_value = mock_chain
+    mock_chain.invoke.return_value = {
+        'query': 'Tell me about gene PAH?',
+        'result': 'test result',
+    }
+
+    with patch('app.answer_cache', AnswerCache()), \
+            patch('app.collection_names', ['genes']), \
+            patch('app.graph', Mock()), \
+            patch('app.collection_schema', [{'collection_name': 'genes'}]), \
+            patch('app.model', Mock()):
+
+        first = ask_llm('Tell me about gene PAH?')
+        second = ask_llm('tell me about gene pah')
+
+    assert mock_chain.invoke.call_count == 1
+    assert first['result'] == second['result'] == 'test result'
+    assert second['query'] == 'tell me about gene pah'
+
+
+@patch('app.record_schema_report')
+@patch('app.select_collections')
+@patch('app.get_updated_graph')
+@patch('app.CatalogGraphQAChain')
+@patch('app.get_openai_callback')
+def test_ask_llm_skips_llm_selection_when_classifier_is_confident(
+        mock_callback, mock_chain_class, mock_get_graph, mock_select_collections, mock_schema_report, collection_schema):
+    """Test that confident local classification avoids the selection LLM call."""
+    mock_chain_class.from_llm.return_value.invoke.return_value = {
+        'result': 'ok'}
+    names = [c['collection_name'] for c in collection_schema]
+
+    with patch('app.answer_cache', AnswerCache(max_size=0)), \
+            patch('app.collection_classifier', CollectionClassifier(collection_schema)), \
+            patch('app.collection_names', names), \
+            patch('app.graph', Mock()), \
+            patch('app.collection_schema', collection_schema), \
+            patch('app.model', Mock()):
+        ask_llm('Tell me about gene PAH?')
+
+    mock_select_collections.assert_not_called()
+    assert mock_get_graph.call_args[0][2] == ['genes']
+
+
+@patch('app.record_schema_report')
+@patch('app.select_collections')
+@patch('app.get_updated_graph')
+@patch('app.CatalogGraphQAChain')
+@patch('app.get_openai_callback')
+def test_ask_llm_records_successful_generation(mock_callback, mock_chain_class, mock_get_graph, mock_select_collections, mock_schema_report):
+    """Test that AQL returning rows is added to the example bank."""
+    mock_select_collections.return_value = ['genes']
+    mock_chain_class.from_llm.return_value.invoke.side_effect = [
+        {'result': 'ok', 'aql_query': 'FOR g IN genes RETURN g',
+            'aql_result': [{'name': 'PAH'}]},
+        {'result': 'none', 'aql_query': 'FOR p IN proteins RETURN p', 'aql_result': []},
+    ]
+    bank = ExampleBank()
+
+    with patch('app.answer_cache', AnswerCache(max_size=0)), \
+            patch('app.example_bank', bank), \
+            patch('app.graph', Mock()), \
+            patch('app.model', Mock()):
+        ask_llm('which genes are there?')
+        ask_llm('which proteins are there?')
+
+    assert len(bank) == 1
+    nearest = bank.nearest('which genes are there?')
+    assert nearest[0].aql == 'FOR g IN genes RETURN g'
+
+
+@patch('app.record_schema_report')
+@patch('app.select_collections')
+@patch('app.get_updated_graph')
+@patch('app.CatalogGraphQAChain')
+@patch('app.get_openai_callback')
+def test_ask_llm_resolves_entities(mock_callback, mock_chain_class, mock_get_graph, mock_select_collections,
+                                   mock_schema_report, collection_schema):
+    """Test that resolved entities reach the prompt and collection selection."""
+    mock_chain = mock_chain_class.from_llm.return_value
+    mock_chain.invoke.return_value = {'result': 'ok'}
+    names = [c['collection_name'] for c in collection_schema]
+    index = EntityIndex.from_entries(
+        {'ontology_term': [('cardiomyopathy', 'ontology_terms/MONDO_0004994')]})
+
+    with patch('app.answer_cache', AnswerCache(max_size=0)), \
+            patch('app.entity_index', index), \
+            patch('app.collection_classifier', CollectionClassifier(collection_schema)), \
+            patch('app.collection_names', names), \
+            patch('app.graph', Mock()), \
+            patch('app.model', Mock()):
+        ask_llm('Which variants are associated with cardiomyopathy?')
+
+    mock_select_collections.assert_not_called()
+    assert mock_get_graph.call_args[0][2] == [
+        'variants', 'ontology_terms', 'variants_diseases']
+    assert mock_chain.entities == 'cardiomyopathy (ontology term): ontology_terms/MONDO_0004994'
+
+
+@patch('app.select_collections')
+@patch('app.CatalogGraphQAChain')
+def test_ask_llm_answers_common_shapes_without_llm(mock_chain_class, mock_select_collections):
+    """Test that fast path questions skip collection selection and AQL generation."""
+    db = Mock()
+    db.aql.execute.return_value = iter(
+        [{'_id': 'genes/ENSG00000171759', 'name': 'PAH'}])
+
+    with patch('app.fast_path', FastPath(db)):
+        result = ask_llm('Tell me about gene PAH')
+
+    mock_select_collections.assert_not_called()
+    mock_chain_class.from_llm.assert_not_called()
+    assert result['aql_result'] == [
+        {'_id': 'genes/ENSG00000171759', 'name': 'PAH'}]
+    assert set(build_response(result)) == {
+        'query', 'aql_query', 'aql_result', 'result', 'title'}
+
+    with patch('app.fast_path', FastPath(db)):
+        result = ask_llm('Tell me about gene PAH', 'aql_only')
+
+    assert db.aql.execute.call_count == 1
+    assert result['aql_query'] == (
+        'FOR gene IN genes\n    FILTER gene.name IN ["PAH"]\n'
+        '    LIMIT 5\n    RETURN gene')
+
+
+def test_metrics_reports_answer_cache(client):
+    """Test that the metrics endpoint exposes answer cache counters."""
+    with patch('app.answer_cache', AnswerCache()), \
+            patch('app.collection_classifier', CollectionClassifier(None)):
+        response = client.get('/metrics')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['answer_cache']['misses'] == 0
+    assert data['answer_cache']['enabled'] is True
+    assert data['collection_classifier']['fallback_rate'] == 0.0
+    assert data['aql_cache']['entries'] == {}
+    assert data['http_pools']['arango']['max_connections'] == 16
+
+
 def test_health_check_success(client):
     """Test successful health check."""
     with patch('app.arango_healthy', True), \
@@ -247,6 +482,73 @@ def test_query_correct_password(client):
         assert data['title'] == 'IGVF Catalog LLM Query'
 
 
+def test_query_modes(client):
+    """Test that the mode reaches ask_llm, trims the response and is timed separately."""
+    with patch('app.model', Mock()), \
+            patch('app.graph', Mock()), \
+            patch('app.collection_schema', Mock()), \
+            patch('app.ask_llm') as mock_ask_llm:
+        mock_ask_llm.return_value = {
+            'aql_query': 'RETURN 1', 'aql_result': None, 'result': None}
+
+        response = client.post('/query', json={
+            'password': 'test_password', 'query': 'test query', 'mode': 'aql_only'})
+        invalid = client.post('/query', json={
+            'password': 'test_password', 'query': 'test query', 'mode': 'everything'})
+
+    assert response.status_code == 200
+    assert set(json.loads(response.data)) == {'aql_query', 'title'}
+    mock_ask_llm.assert_called_once_with('test query', 'aql_only')
+    timings = metrics.snapshot()['timings']
+    assert timings['query.aql_only.seconds']['count'] >= 1
+    assert invalid.status_code == 400
+
+
+def test_query_stream_sends_stage_events(client):
+    """Test that the streaming endpoint sends each stage and then the response."""
+    def fake_ask_llm(question, mode, on_event=None):
+        on_event('collections', {'collections': ['genes']})
+        on_event('aql', {'aql_query': 'RETURN 1'})
+        return {'query': question, 'aql_query': 'RETURN 1', 'aql_result': [1], 'result': 'one'}
+
+    with patch('app.model', Mock()), \
+            patch('app.graph', Mock()), \
+            patch('app.collection_schema', Mock()), \
+            patch('app.ask_llm', side_effect=fake_ask_llm):
+        response = client.post('/query/stream', json={
+            'password': 'test_password', 'query': 'test query', 'mode': 'raw'})
+        body = response.get_data(as_text=True)
+
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+    events = [block.split('\n') for block in body.strip().split('\n\n')]
+    assert [lines[0] for lines in events] == [
+        'event: collections', 'event: aql', 'event: answer']
+    answer = json.loads(events[-1][1][len('data: '):])
+    assert answer == {'query': 'test query', 'aql_query': 'RETURN 1', 'aql_result': [1],
+                      'title': 'IGVF Catalog LLM Query'}
+
+
+def test_query_stream_reports_errors(client):
+    """Test that failures end the stream with an error event."""
+    with patch('app.model', Mock()), \
+            patch('app.graph', Mock()), \
+            patch('app.collection_schema', Mock()), \
+            patch('app.ask_llm', side_effect=Exception('boom')):
+        response = client.post('/query/stream', json={
+            'password': 'test_password', 'query': 'test query'})
+        body = response.get_data(as_text=True)
+
+    assert body == 'event: error\ndata: {"query": "test query", "error": "boom"}\n\n'
+
+
+def test_query_stream_checks_the_password(client):
+    """Test that the streaming endpoint rejects a wrong password before streaming."""
+    response = client.post(
+        '/query/stream', json={'password': 'nope', 'query': 'q'})
+    assert response.status_code == 403
+
+
 def test_query_service_unavailable(client):
     """Test query endpoint when services are not available."""
     with patch('app.model', None), \
@@ -327,3 +629,59 @@ def test_query_value_error_returns_422(client):
         assert 'error' in data
         assert data['error'] == 'validation failed'
         assert data['query'] == 'test query'
+
+
+def test_after_fork_connects_with_a_new_client():
+    """Test that workers stop using the ArangoDB client opened before forking."""
+    import app as app_module
+    inherited_client = app_module.arango_http_client
+    mock_graph, mock_guard, mock_fast_path = Mock(), Mock(), Mock()
+    with patch('app.graph', mock_graph), patch('app.aql_guard', mock_guard), \
+            patch('app.fast_path', mock_fast_path), patch('app.model', Mock()), \
+            patch('app.arango_http_client', inherited_client), \
+            patch('app.connect_arango_db') as mock_connect, \
+            patch('app.initialize_llm') as mock_initialize_llm:
+        after_fork()
+        worker_client = app_module.arango_http_client
+
+    assert worker_client is not inherited_client
+    mock_connect.assert_called_once_with(worker_client)
+    db = mock_connect.return_value
+    mock_graph.set_db.assert_called_once_with(db)
+    assert mock_guard.db is db
+    assert mock_fast_path.db is db
+    mock_initialize_llm.assert_called_once()
+
+
+def test_coalesced_ask_llm_shares_the_answer_of_identical_questions():
+    """Test that a question asked while an identical one is answered waits for it."""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_ask_llm(question, mode):
+        started.set()
+        release.wait(5)
+        return {'query': question, 'user_input': question, 'result': 'PAH is a gene.'}
+
+    with patch('app.single_flight', flight), \
+            patch('app.ask_llm', side_effect=slow_ask_llm) as mock_ask_llm:
+        responses = []
+        leader = threading.Thread(
+            target=lambda: responses.append(coalesced_ask_llm('Tell me about PAH?', 'full')))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(
+            target=lambda: responses.append(coalesced_ask_llm('tell me about pah', 'full')))
+        follower.start()
+        while flight.stats()['coalesced'] < 1:
+            time.sleep(0.01)
+        release.set()
+        leader.join()
+        follower.join()
+
+    mock_ask_llm.assert_called_once_with('Tell me about PAH?', 'full')
+    assert sorted(response['query'] for response in responses) == [
+        'Tell me about PAH?', 'tell me about pah']
+    assert all(response['result'] == 'PAH is a gene.'
+               for response in responses)
@@ -0,0 +1,73 @@
+import time
+from aql_cache import AqlCache
+
+
+def test_key_ignores_case_punctuation_and_collection_order():
+    """Test that equivalent requests share a key and versions separate them."""
+    key = AqlCache.make_key('Tell me about gene PAH?',
+                            ['genes', 'variants'], '5', 'v1')
+    question = 'tell me about gene pah'
+
+    assert key == AqlCache.make_key(
+        question, ['variants', 'genes'], '5', 'v1')
+    assert key != AqlCache.make_key(question, ['genes'], '5', 'v1')
+    assert key != AqlCache.make_key(
+        question, ['genes', 'variants'], '6', 'v1')
+    assert key != AqlCache.make_key(
+        question, ['genes', 'variants'], '5', 'v2')
+
+
+def test_get_set_and_hit_counts():
+    """Test that hits are counted per entry and overall."""
+    cache = AqlCache()
+    cache.set('k', 'FOR g IN genes RETURN g')
+
+    assert cache.get('k') == 'FOR g IN genes RETURN g'
+    assert cache.get('k') == 'FOR g IN genes RETURN g'
+    assert cache.get('other') is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == 2 / 3
+    assert list(stats['entries']) == ['k']
+    assert stats['entries']['k']['hits'] == 2
+    assert stats['entries']['k']['age'] >= 0
+    assert 'Which genes?' not in str(stats) and 'FOR g' not in str(stats)
+
+
+def test_lru_eviction_and_evict():
+    """Test that the least recently used entry goes first and evict removes entries."""
+    cache = AqlCache(max_size=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    cache.get('a')
+    cache.set('c', 'C')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+
+    cache.evict('a')
+    cache.evict('missing')
+    assert cache.get('a') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_expires_entries(monkeypatch):
+    """Test that entries older than the TTL are not served."""
+    cache = AqlCache(ttl=10)
+    cache.set('k', 'A')
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+
+    assert cache.get('k') is None
+    assert len(cache) == 0
+
+
+def test_disabled_cache():
+    """Test that a zero-sized cache stores nothing."""
+    cache = AqlCache(max_size=0)
+    cache.set('k', 'A')
+
+    assert cache.get('k') is None
+    assert cache.enabled is False
@@ -0,0 +1,126 @@
+import pytest
+from unittest.mock import Mock
+from arango import AQLQueryExplainError
+from aql_guard import AqlGuard, AqlGuardError
+from aql_validator import AqlValidationError
+
+
+def explain_plan(cost=10, nodes=()):
+    return {'estimatedCost': cost, 'nodes': list(nodes)}
+
+
+def test_rewrite_adds_limit_to_outermost_loop():
+    """Test that a LIMIT goes before the final RETURN of the outermost loop."""
+    guard = AqlGuard(Mock())
+    aql = ('FOR v IN variants\n'
+           '    FILTER v._id IN (FOR d IN variants_diseases RETURN d._from)\n'
+           '    RETURN v')
+
+    assert guard.rewrite(aql) == (
+        'FOR v IN variants\n'
+        '    FILTER v._id IN (FOR d IN variants_diseases RETURN d._from)\n'
+        '    LIMIT 5\n'
+        '    RETURN v')
+    assert (guard.rewrite('FOR g IN genes RETURN g', 3)
+            == 'FOR g IN genes LIMIT 3 RETURN g')
+    assert guard.stats()['limits_added'] == 2
+
+
+@pytest.mark.parametrize('aql', [
+    'FOR g IN genes LIMIT 10 RETURN g',
+    'RETURN DOCUMENT("genes/ENSG00000171759")',
+    'LET genes = (FOR g IN genes RETURN g) RETURN LENGTH(genes)',
+    'FOR g IN genes FILTER g.limit == 1 SORT g.name LIMIT 2, 5 RETURN g',
+])
+def test_rewrite_leaves_limited_queries_alone(aql):
+    """Test that queries with a top-level LIMIT or no outer loop are unchanged."""
+    assert AqlGuard(Mock()).rewrite(aql) == aql
+
+
+def test_rewrite_adds_index_hints_to_interval_queries():
+    """Test that interval filters over genomic elements get the zkd index hint."""
+    guard = AqlGuard(Mock())
+    aql = ('FOR g IN genomic_elements\n'
+           '    FILTER g.chr == "chr1" AND g.start <= 100 AND g.end > 100\n'
+           '    LIMIT 5\n'
+           '    RETURN g')
+
+    assert guard.rewrite(aql).startswith(
+        'FOR g IN genomic_elements '
+        'OPTIONS { indexHint: "idx_zkd_start_end" }\n')
+    assert guard.stats()['hints_added'] == 1
+
+    hinted = ('FOR g IN genomic_elements OPTIONS { indexHint: "idx_zkd_start_end" }\n'
+              '    FILTER g.start <= 100 AND g.end > 100 LIMIT 5 RETURN g')
+    assert guard.rewrite(hinted) == hinted
+    by_name = 'FOR g IN genomic_elements FILTER g.name == "x" LIMIT 5 RETURN g'
+    assert guard.rewrite(by_name) == by_name
+
+
+@pytest.mark.parametrize('aql', [
+    'FOR g IN genomic_elements FILTER g.name == "x" LIMIT 5 '
+    'RETURN {s: g.start, e: g.end}',
+    'FOR g IN genomic_elements SORT g.start LIMIT 5 '
+    'RETURN {s: g.start, e: g.end}',
+])
+def test_rewrite_hints_only_filtered_attributes(aql):
+    """Test that attributes only sorted on or returned do not add a hint."""
+    guard = AqlGuard(Mock())
+
+    assert guard.rewrite(aql) == aql
+    assert guard.stats()['hints_added'] == 0
+
+
+def test_check_accepts_cheap_plans():
+    """Test that plans within the limits pass and are counted."""
+    db = Mock()
+    db.aql.explain.return_value = explain_plan(12, [
+        {'type': 'EnumerateCollectionNode', 'collection': 'genes', 'estimatedNrItems': 500}])
+    guard = AqlGuard(db)
+
+    guard.check('FOR g IN genes LIMIT 5 RETURN g', {'lit0': 1})
+
+    db.aql.explain.assert_called_once_with(
+        'FOR g IN genes LIMIT 5 RETURN g', bind_vars={'lit0': 1})
+    assert guard.stats()['explained'] == 1
+
+
+def test_check_rejects_expensive_plans_and_full_scans():
+    """Test that high estimated costs and large full scans are rejected."""
+    db = Mock()
+    db.aql.explain.return_value = explain_plan(5e8, [
+        {'type': 'EnumerateCollectionNode', 'collection': 'variants',
+         'estimatedNrItems': 90_000_000},
+        {'type': 'IndexNode', 'collection': 'genes', 'estimatedNrItems': 90_000_000}])
+    guard = AqlGuard(db)
+
+    with pytest.raises(AqlGuardError) as excinfo:
+        guard.check('FOR v IN variants LIMIT 5 RETURN v')
+
+    assert isinstance(excinfo.value, AqlValidationError)
+    assert len(excinfo.value.errors) == 2
+    assert 'estimated cost 500000000' in excinfo.value.errors[0]
+    assert "scans all 90000000 documents of collection 'variants'" in excinfo.value.errors[1]
+    assert guard.stats()['rejected'] == 1
+
+    AqlGuard(db, max_cost=0, max_full_scan=0).check(
+        'FOR v IN variants LIMIT 5 RETURN v')
+
+
+def test_check_reports_explain_errors():
+    """Test that queries ArangoDB cannot parse are rejected with its message."""
+    db = Mock()
+    response = Mock(error_message='syntax error, unexpected identifier', error_code=1501,
+                    status_code=400, status_text='Bad Request', url='', method='post',
+                    headers={})
+    db.aql.explain.side_effect = AQLQueryExplainError(response, Mock())
+
+    with pytest.raises(AqlGuardError, match='syntax error'):
+        AqlGuard(db).check('FOR g IN genes RETRUN g')
+
+
+def test_execute_options():
+    """Test that only the configured cursor limits are passed on."""
+    assert AqlGuard(Mock()).execute_options() == {'max_runtime': 30}
+    assert AqlGuard(Mock(), max_runtime=0, memory_limit=2 ** 30).execute_options() == {
+        'memory_limit': 2 ** 30}
@@ -0,0 +1,97 @@
+import pytest
+from aql_rewriter import (aql_fingerprint, canonical_aql, is_read_only, keywords,
+                          parameterize, tokenize, unquote)
+
+
+def test_tokenize_keeps_every_character():
+    """Test that tokens join back into the original query."""
+    query = 'FOR v IN variants /* c */ FILTER v.spdi == \'a\\\'b\' LIMIT 1..2 RETURN v[*].x // end'
+    assert ''.join(token.text for token in tokenize(query)) == query
+    assert [t.kind for t in tokenize('@@coll @name "s" 1.5 x ..')] == [
+        'bind', 'space', 'bind', 'space', 'string', 'space', 'number', 'space',
+        'name', 'space', 'op']
+
+
+def test_canonical_aql_upper_cases_keywords_only():
+    """Test that keyword case does not matter but identifiers keep theirs."""
+    assert canonical_aql('for g in Genes filter g.name == "pah" return g') == \
+        'FOR g IN Genes FILTER g.name == "pah" RETURN g'
+
+
+def test_canonical_aql_collapses_whitespace_and_comments():
+    """Test that layout and comments do not change the canonical text."""
+    query = 'FOR v  IN variants // variants by SPDI\n  FILTER v.spdi == "a  b" /* x */\n  RETURN v'
+
+    assert (canonical_aql(query)
+            == 'FOR v IN variants FILTER v.spdi == "a  b" RETURN v')
+    assert canonical_aql('RETURN "a//b"') == 'RETURN "a//b"'
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('FOR g IN genes RETURN g', True),
+    ('FOR g IN genes FILTER g.update_date > 1 RETURN g.remove', True),
+    ('FOR g IN genes FILTER g.name == "REMOVE" RETURN g', True),
+    ('FOR g IN genes UPDATE g WITH { a: 1 } IN genes', False),
+    ('INSERT { name: "x" } INTO genes', False),
+    ('FOR g IN genes remove g IN genes', False),
+    ('UPSERT { a: 1 } INSERT { a: 1 } UPDATE {} IN genes', False),
+])
+def test_is_read_only(query, expected):
+    """Test that data-modification operations are detected outside strings."""
+    assert is_read_only(query) is expected
+
+
+def test_keywords_ignore_attribute_names():
+    """Test that attribute names that look like keywords are not keywords."""
+    assert keywords('FOR d IN x FILTER d.update RETURN d.limit') == [
+        'for', 'in', 'filter', 'return']
+
+
+def test_unquote():
+    """Test that AQL string escapes are decoded."""
+    assert unquote("'it\\'s'") == "it's"
+    assert unquote('"a\\nb\\u00e9"') == 'a\nbé'
+
+
+def test_parameterize_lifts_literals():
+    """Test that strings and numbers become bind variables."""
+    result = parameterize(
+        "FOR v IN variants FILTER v.spdi == 'NC_000012.12:102855312:C:T' AND v.pos > 1.5 LIMIT 5 RETURN v")
+
+    assert result.aql == 'FOR v IN variants FILTER v.spdi == @lit0 AND v.pos > @lit1 LIMIT @lit2 RETURN v'
+    assert result.bind_vars == {
+        'lit0': 'NC_000012.12:102855312:C:T', 'lit1': 1.5, 'lit2': 5}
+    assert result.shape == result.aql
+
+
+def test_parameterize_keeps_literals_that_must_stay():
+    """Test that OPTIONS, object keys, traversal depths and indexes are untouched."""
+    query = ('FOR g IN genomic_elements OPTIONS { indexHint: "idx_zkd_start_end", forceIndexHint: true }\n'
+             '  FOR v, e IN 1..7 INBOUND g ontology_terms_ontology_terms\n'
+             '  RETURN { "name": g.names[0], label: "x" }')
+    result = parameterize(query)
+
+    assert result.bind_vars == {'lit0': 'x'}
+    assert '"idx_zkd_start_end"' in result.aql
+    assert '1..7' in result.aql
+    assert '"name": g.names[0]' in result.aql
+
+
+def test_parameterize_avoids_existing_bind_names():
+    """Test that lifted names never clash with bind variables already in the query."""
+    result = parameterize(
+        'FOR g IN genes FILTER g.name == @lit0 AND g.chr == "chr1" RETURN g')
+
+    assert result.bind_vars == {'_lit0': 'chr1'}
+    assert '@lit0' in result.aql and '@_lit0' in result.aql
+
+
+def test_fingerprint_is_shared_by_queries_differing_in_literals():
+    """Test that queries with different identifiers share a fingerprint."""
+    first = 'FOR g IN genes FILTER g.name == "PAH" RETURN g'
+    second = 'for g in genes\n  filter g.name == \'BRCA1\' // by symbol\n  return g'
+
+    assert aql_fingerprint(first) == aql_fingerprint(second)
+    assert aql_fingerprint(first) != aql_fingerprint('FOR g IN genes RETURN g')
+    assert aql_fingerprint(first) != aql_fingerprint(
+        first.replace('genes', 'proteins'))
@@ -0,0 +1,114 @@
+import pytest
+from aql_examples import AQL_EXAMPLES
+from aql_validator import AqlValidationError, AqlValidator
+from example_selector import parse_examples
+
+
+@pytest.fixture
+def validator(collection_schema):
+    return AqlValidator(collection_schema)
+
+
+def test_static_examples_pass(validator):
+    """Test that every static example passes validation."""
+    for example in parse_examples(AQL_EXAMPLES):
+        assert validator.errors(example.aql) == [], example.question
+        assert validator.warnings(example.aql) == [], example.question
+
+
+def test_valid_query_passes(validator):
+    """Test that a query over known collections and attributes passes."""
+    assert validator.errors(
+        'FOR g IN genes FILTER g.name == "PAH" LIMIT 5 RETURN {id: g._id, chr: g.chr}') == []
+    assert validator.errors('RETURN DOCUMENT("genes/ENSG00000171759")') == []
+
+
+@pytest.mark.parametrize('aql, message', [
+    ('FOR g IN genes FILTER g.name == "PAH LIMIT 5 RETURN g', 'Unterminated string'),
+    ('FOR g IN genes FILTER (g.name == "PAH" LIMIT 5 RETURN g', "Unclosed '('"),
+    ('FOR g IN genes FILTER g.name == "PAH") LIMIT 5 RETURN g', "Unbalanced ')'"),
+    ('FOR g IN genes FILTER g.name == "PAH" LIMIT 5', 'no RETURN'),
+])
+def test_syntax_errors(validator, aql, message):
+    """Test that syntax problems are reported without a parser."""
+    errors = validator.errors(aql)
+    assert len(errors) == 1
+    assert message in errors[0]
+
+
+def test_rejects_unknown_collections(validator):
+    """Test that collections missing from the schema are listed with the known ones."""
+    errors = validator.errors('FOR g IN gene LIMIT 5 RETURN g')
+    assert len(errors) == 1
+    assert "Collection 'gene' does not exist" in errors[0]
+    assert 'genes' in errors[0]
+
+
+@pytest.mark.parametrize('aql', [
+    'FOR g IN genes COLLECT c = g.chr INTO groups '
+    'FOR x IN groups LIMIT 5 RETURN x',
+    "FOR v IN 1..2 OUTBOUND 'genes/X' GRAPH 'igvf' LIMIT 5 RETURN v",
+    "FOR g IN genes FILTER g.name == 'and/or' LIMIT 5 RETURN g",
+])
+def test_accepts_variables_graphs_and_slashes(validator, aql):
+    """Test that COLLECT variables, graphs and slashes are not collections."""
+    assert validator.errors(aql) == []
+
+
+def test_warns_about_unknown_attributes(validator):
+    """Test that attributes missing from a loop variable's sampled collection are warnings."""
+    aql = 'FOR v IN variants FILTER v.rsid == "rs1" AND v.position == 1 LIMIT 5 RETURN v.gene'
+    warnings = validator.warnings(aql)
+
+    assert validator.errors(aql) == []
+    assert len(warnings) == 2
+    assert ("Attribute 'position' (in v.position) was not seen in the sampled documents "
+            "of collection 'variants'") in warnings[0]
+    assert 'pos' in warnings[0]
+    assert "Attribute 'gene'" in warnings[1]
+
+
+def test_edge_attributes_include_from_and_to(validator):
+    """Test that edge loops may read _from and _to."""
+    assert validator.warnings(
+        'FOR e IN variants_genes FILTER e._from == "variants/x" LIMIT 5 RETURN e._to') == []
+
+
+def test_ignores_attributes_of_non_collection_variables(validator):
+    """Test that subquery results and traversal variables are not checked."""
+    aql = '''
+    LET variant = FIRST(FOR v IN variants FILTER "rs1" IN v.rsid LIMIT 1 RETURN v)
+    FOR d IN OUTBOUND variant variants_diseases
+        LIMIT 5
+        RETURN {term: d.anything, chr: variant.chr}
+    '''
+    assert validator.warnings(aql) == []
+
+
+def test_rejects_writes(validator):
+    """Test that data-modification operations are rejected."""
+    errors = validator.errors(
+        'FOR g IN genes LIMIT 5 UPDATE g WITH {name: "x"} IN genes RETURN NEW')
+    assert any('modifies data' in error for error in errors)
+
+
+def test_requires_limit(collection_schema, validator):
+    """Test that loops need a LIMIT unless the check is disabled."""
+    aql = 'FOR g IN genes RETURN g'
+    assert validator.errors(aql) == [
+        'The query has no LIMIT. Add LIMIT 5 before the final RETURN.']
+    assert AqlValidator(collection_schema,
+                        require_limit=False).errors(aql) == []
+
+
+def test_validate_raises_and_counts(validator):
+    """Test that validate raises with every problem and counts the checks."""
+    assert validator.validate('FOR g IN genes LIMIT 5 RETURN g') == []
+    assert len(validator.validate(
+        'FOR g IN genes LIMIT 5 RETURN g.symbol')) == 1
+    with pytest.raises(AqlValidationError) as excinfo:
+        validator.validate('FOR g IN gene RETURN g')
+
+    assert len(excinfo.value.errors) == 2
+    assert excinfo.value.error_message == '\n'.join(excinfo.value.errors)
+    assert validator.stats() == {'checked': 3, 'rejected': 1, 'warned': 1}
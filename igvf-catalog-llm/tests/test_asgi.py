@@ -0,0 +1,97 @@
+import asyncio
+import json
+from unittest.mock import Mock, patch
+
+import httpx
+
+import asgi
+
+
+def request(method, path, body=None):
+    async def send():
+        transport = httpx.ASGITransport(app=asgi.application)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.request(method, path, json=body)
+    return asyncio.run(send())
+
+
+def services():
+    return patch('app.model', Mock()), patch('app.graph', Mock()), \
+        patch('app.collection_schema', Mock())
+
+
+def test_health_matches_the_flask_app():
+    """Test that /health reports the same body and status."""
+    with patch('app.arango_healthy', False), \
+            patch('app.arango_error', 'Connection failed'), \
+            patch('app.model', Mock()):
+        response = request('GET', '/health')
+
+    assert response.status_code == 503
+    assert response.json()['arangodb'] == 'ERROR: Connection failed'
+
+
+def test_query_checks_the_request():
+    """Test that /query validates the body like the Flask app."""
+    assert request('POST', '/query', {}).status_code == 400
+    assert request('POST', '/query',
+                   {'password': 'nope', 'query': 'q'}).status_code == 403
+    assert request('GET', '/nowhere').status_code == 404
+
+
+def test_query_awaits_aask_llm():
+    """Test that /query answers through aask_llm with the requested mode."""
+    async def fake_aask_llm(question, mode, on_event=None):
+        return {'query': question, 'aql_query': 'RETURN 1', 'aql_result': [1], 'result': 'one'}
+
+    model, graph, schema = services()
+    with model, graph, schema, patch('app.aask_llm', side_effect=fake_aask_llm) as mock_aask_llm, \
+            patch('asgi.limiter', asgi.RateLimiter()):
+        response = request('POST', '/query', {
+            'password': 'test_password', 'query': 'test query', 'mode': 'raw'})
+
+    assert response.status_code == 200
+    assert response.json() == {'query': 'test query', 'aql_query': 'RETURN 1',
+                               'aql_result': [1], 'title': 'IGVF Catalog LLM Query'}
+    mock_aask_llm.assert_called_once_with('test query', 'raw')
+
+
+def test_query_reports_errors():
+    """Test that failures get the same status codes as the Flask app."""
+    model, graph, schema = services()
+    with model, graph, schema, patch('app.aask_llm', side_effect=ValueError('no luck')), \
+            patch('asgi.limiter', asgi.RateLimiter()):
+        response = request(
+            'POST', '/query', {'password': 'test_password', 'query': 'q'})
+
+    assert response.status_code == 422
+    assert response.json() == {'query': 'q', 'error': 'no luck'}
+
+
+def test_query_stream_sends_stage_events():
+    """Test that the streaming endpoint sends each stage and then the response."""
+    async def fake_aask_llm(question, mode, on_event=None):
+        on_event('collections', {'collections': ['genes']})
+        on_event('aql', {'aql_query': 'RETURN 1'})
+        return {'query': question, 'aql_query': 'RETURN 1', 'result': 'one'}
+
+    model, graph, schema = services()
+    with model, graph, schema, patch('app.aask_llm', side_effect=fake_aask_llm), \
+            patch('asgi.limiter', asgi.RateLimiter()):
+        response = request('POST', '/query/stream', {
+            'password': 'test_password', 'query': 'test query'})
+
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = [block.split('\n')
+              for block in response.text.strip().split('\n\n')]
+    assert [lines[0] for lines in events] == [
+        'event: collections', 'event: aql', 'event: answer']
+    assert json.loads(events[-1][1][len('data: '):])['result'] == 'one'
+
+
+def test_rate_limiter():
+    """Test that each client gets its own window of requests."""
+    limiter = asgi.RateLimiter(limit=2, window=60)
+
+    assert [limiter.allow('a') for _ in range(3)] == [True, True, False]
+    assert limiter.allow('b')
@@ -0,0 +1,85 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+from arango.exceptions import AQLQueryExecuteError, AQLQueryExplainError
+
+from async_arango import AsyncArangoDatabase
+
+
+def make_db(handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncArangoDatabase('https://db.example.com/', 'igvf', 'u', 'p', client=client)
+
+
+def test_execute_fetches_batches_until_top_k():
+    """Test that batches are fetched up to top_k and the open cursor is deleted."""
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.url.path,
+                         json.loads(request.content) if request.content else None))
+        if request.method == 'POST':
+            return httpx.Response(201, json={'result': [1, 2], 'hasMore': True, 'id': '7'})
+        if request.method == 'PUT':
+            return httpx.Response(200, json={'result': [3, 4], 'hasMore': True, 'id': '7'})
+        return httpx.Response(202, json={})
+
+    db = make_db(handler)
+    rows = asyncio.run(db.execute('FOR g IN genes RETURN g', bind_vars={'x': 1},
+                                  top_k=3, max_runtime=30))
+
+    assert rows == [1, 2, 3]
+    assert [request[:2] for request in requests] == [
+        ('POST', '/_db/igvf/_api/cursor'),
+        ('PUT', '/_db/igvf/_api/cursor/7'),
+        ('DELETE', '/_db/igvf/_api/cursor/7'),
+    ]
+    assert requests[0][2] == {'query': 'FOR g IN genes RETURN g', 'count': False,
+                              'bindVars': {'x': 1}, 'batchSize': 3,
+                              'options': {'maxRuntime': 30}}
+
+
+def test_execute_raises_python_arango_errors():
+    """Test that server errors raise the exceptions python-arango would."""
+    def handler(request):
+        return httpx.Response(400, json={
+            'error': True, 'errorNum': 1203, 'errorMessage': 'collection not found'})
+
+    db = make_db(handler)
+    with pytest.raises(AQLQueryExecuteError) as error:
+        asyncio.run(db.execute('FOR g IN gene RETURN g'))
+
+    assert error.value.error_code == 1203
+    assert error.value.error_message == 'collection not found'
+
+
+def test_explain_returns_the_plan():
+    """Test that explain returns the plan and raises explain errors."""
+    def handler(request):
+        if 'broken' in json.loads(request.content)['query']:
+            return httpx.Response(400, json={'errorNum': 1501, 'errorMessage': 'syntax error'})
+        return httpx.Response(200, json={'plan': {'estimatedCost': 12, 'nodes': []}})
+
+    db = make_db(handler)
+
+    assert asyncio.run(db.explain('RETURN 1')) == {
+        'estimatedCost': 12, 'nodes': []}
+    with pytest.raises(AQLQueryExplainError):
+        asyncio.run(db.explain('broken'))
+
+
+def test_client_is_created_per_process():
+    """Test that the client is created on first use in each process."""
+    db = AsyncArangoDatabase('https://db.example.com',
+                             'igvf', 'u', 'p', max_connections=4)
+    assert db.stats() is None
+
+    client = db.client
+    assert db.client is client
+    assert db.stats() == {'max_connections': 4, 'open': 0,
+                          'in_use': 0, 'utilization': 0.0}
+    with patch('async_arango.os.getpid', return_value=-1):
+        assert db.client is not client
@@ -0,0 +1,419 @@
+import asyncio
+import pytest
+from unittest.mock import Mock
+from arango import AQLQueryExecuteError
+from aql_cache import AqlCache
+from aql_guard import AqlGuard
+from aql_validator import AqlValidationError, AqlValidator
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import LLM, FakeListLLM
+from catalog_chain import AQL_ONLY, RAW, CatalogGraphQAChain, describe_error
+from metrics import metrics, repair_success_rate
+from prompt_template import AQL_GENERATION_PROMPT, AQL_REPAIR_PROMPT
+from result_renderer import ResultRenderer
+from schema_registry import GraphView, SchemaRegistry
+
+
+class PromptRecorder(BaseCallbackHandler):
+    def __init__(self):
+        self.prompts = []
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.prompts.extend(prompts)
+
+
+def make_chain(catalog_schema, responses, db, collection_names=('genes',)):
+    view = SchemaRegistry(catalog_schema).view(collection_names)
+    graph = GraphView(db, view)
+    chain = CatalogGraphQAChain.from_llm(
+        FakeListLLM(responses=responses),
+        aql_generation_prompt=AQL_GENERATION_PROMPT,
+        aql_fix_prompt=AQL_REPAIR_PROMPT,
+        graph=graph,
+        allow_dangerous_requests=True,
+    )
+    chain.return_aql_query = True
+    chain.return_aql_result = True
+    return chain
+
+
+def execute_error(message):
+    response = Mock(error_message=message, error_code=1501, status_code=400,
+                    status_text='Bad Request', url='', method='post', headers={})
+    return AQLQueryExecuteError(response, Mock())
+
+
+def test_chain_passes_entities_to_the_generation_prompt(catalog_schema):
+    """Test that resolved entities reach the prompt and the loop runs as before."""
+    db = Mock()
+    db.aql.execute.return_value = iter([{'name': 'PAH'}])
+    recorder = PromptRecorder()
+    chain = make_chain(catalog_schema, [
+        '```aql\nRETURN DOCUMENT("genes/ENSG00000171759")\n```', 'PAH is a gene.'], db)
+    chain.entities = 'PAH (gene): genes/ENSG00000171759'
+
+    result = chain.invoke({'query': 'Tell me about PAH'},
+                          config={'callbacks': [recorder]})
+
+    assert 'Resolved Entities (Optional):\nPAH (gene): genes/ENSG00000171759' in recorder.prompts[0]
+    assert result['result'] == 'PAH is a gene.'
+    assert (result['aql_query'].strip()
+            == 'RETURN DOCUMENT("genes/ENSG00000171759")')
+    assert result['aql_result'] == [{'name': 'PAH'}]
+
+
+def test_chain_fixes_queries_that_fail(catalog_schema):
+    """Test that execution errors go through the fix prompt."""
+    db = Mock()
+    db.aql.execute.side_effect = [
+        execute_error('syntax error'), iter([{'name': 'PAH'}])]
+    chain = make_chain(catalog_schema, [
+        '```FOR g IN gene RETURN g```', '```FOR g IN genes RETURN g```', 'done'], db)
+
+    result = chain.invoke({'query': 'Tell me about PAH'})
+
+    assert result['aql_query'] == 'FOR g IN genes RETURN g'
+    assert db.aql.execute.call_count == 2
+
+
+def test_chain_gives_up_after_max_attempts(catalog_schema):
+    """Test that repeated failures raise once attempts run out."""
+    db = Mock()
+    db.aql.execute.side_effect = execute_error('still broken')
+    chain = make_chain(
+        catalog_schema, ['```FOR g IN gene RETURN g```'] * 3, db)
+    chain.max_aql_generation_attempts = 2
+
+    with pytest.raises(ValueError, match='still broken'):
+        chain.invoke({'query': 'Tell me about PAH'})
+
+
+def test_chain_rejects_responses_without_aql(catalog_schema):
+    """Test that a response with no AQL block is invalid."""
+    chain = make_chain(catalog_schema, ['I cannot help with that.'], Mock())
+
+    with pytest.raises(ValueError, match='Response is Invalid'):
+        chain.invoke({'query': 'delete everything'})
+
+
+def test_chain_reuses_cached_aql(catalog_schema):
+    """Test that a cache hit skips generation and a miss caches the new query."""
+    db = Mock()
+    db.aql.execute.side_effect = lambda *args, **kwargs: iter(
+        [{'name': 'PAH'}])
+    cache = AqlCache()
+    recorder = PromptRecorder()
+
+    first = make_chain(
+        catalog_schema, ['```FOR g IN genes RETURN g```', 'first'], db)
+    first.aql_cache, first.aql_cache_key = cache, 'key'
+    first.invoke({'query': 'Tell me about PAH'},
+                 config={'callbacks': [recorder]})
+    second = make_chain(catalog_schema, ['second'], db)
+    second.aql_cache, second.aql_cache_key = cache, 'key'
+    result = second.invoke({'query': 'Tell me about PAH'},
+                           config={'callbacks': [recorder]})
+
+    assert result['result'] == 'second'
+    assert result['aql_query'] == 'FOR g IN genes RETURN g'
+    assert len(recorder.prompts) == 3
+    assert cache.stats()['hits'] == 1
+
+
+def test_chain_evicts_cached_aql_that_fails(catalog_schema):
+    """Test that a cached query that no longer executes is evicted and regenerated."""
+    db = Mock()
+    db.aql.execute.side_effect = [
+        execute_error('collection not found'), iter([{'name': 'PAH'}])]
+    cache = AqlCache()
+    cache.set('key', 'FOR g IN old_genes RETURN g')
+    chain = make_chain(
+        catalog_schema, ['```FOR g IN genes RETURN g```', 'done'], db)
+    chain.aql_cache, chain.aql_cache_key = cache, 'key'
+
+    result = chain.invoke({'query': 'Tell me about PAH'})
+
+    assert result['aql_query'] == 'FOR g IN genes RETURN g'
+    assert cache.stats()['evictions'] == 1
+    assert cache.get('key') == 'FOR g IN genes RETURN g'
+
+
+def test_chain_fixes_queries_rejected_by_the_validator(catalog_schema, collection_schema):
+    """Test that a query failing validation goes to the fix prompt without reaching the database."""
+    db = Mock()
+    db.aql.execute.return_value = iter([{'name': 'PAH'}])
+    recorder = PromptRecorder()
+    chain = make_chain(catalog_schema, [
+        '```FOR g IN gene LIMIT 5 RETURN g```',
+        '```FOR g IN genes LIMIT 5 RETURN g```', 'done'], db)
+    chain.validator = AqlValidator(collection_schema)
+
+    result = chain.invoke({'query': 'Tell me about PAH'},
+                          config={'callbacks': [recorder]})
+
+    assert result['aql_query'] == 'FOR g IN genes LIMIT 5 RETURN g'
+    assert db.aql.execute.call_count == 1
+    assert "Collection 'gene' does not exist" in recorder.prompts[1]
+    assert chain.validator.stats() == {
+        'checked': 2, 'rejected': 1, 'warned': 0}
+
+
+def test_chain_repairs_with_the_validator_warnings(catalog_schema, collection_schema):
+    """Test that attributes the sampled schema lacks are run, and named in a repair."""
+    db = Mock()
+    db.aql.execute.side_effect = [
+        execute_error('unknown attribute'), iter([{'name': 'PAH'}])]
+    recorder = PromptRecorder()
+    chain = make_chain(catalog_schema, [
+        '```FOR g IN genes FILTER g.symbol == "PAH" LIMIT 5 RETURN g```',
+        '```FOR g IN genes FILTER g.name == "PAH" LIMIT 5 RETURN g```', 'done'], db)
+    chain.validator = AqlValidator(collection_schema)
+
+    chain.invoke({'query': 'Tell me about PAH'},
+                 config={'callbacks': [recorder]})
+
+    assert db.aql.execute.call_count == 2
+    assert 'ArangoDB error 1501: unknown attribute' in recorder.prompts[1]
+    assert "Attribute 'symbol' (in g.symbol)" in recorder.prompts[1]
+
+
+def test_chain_repairs_with_the_schema_of_the_failing_query(catalog_schema):
+    """Test that repairs send the error code and only the collections the query reads."""
+    metrics.reset()
+    db = Mock()
+    db.aql.execute.side_effect = [
+        execute_error('unknown attribute'), iter([{'name': 'PAH'}])]
+    recorder = PromptRecorder()
+    chain = make_chain(catalog_schema, [
+        '```FOR g IN genes FILTER g.symbol == "PAH" RETURN g```',
+        '```FOR g IN genes FILTER g.name == "PAH" RETURN g```', 'done'],
+        db, collection_names=['genes', 'variants'])
+
+    chain.invoke({'query': 'Tell me about PAH'},
+                 config={'callbacks': [recorder]})
+
+    generation, repair = recorder.prompts[:2]
+    assert "'collection_name': 'variants'" in generation
+    assert repair.startswith(
+        'Task: Fix an ArangoDB Query Language (AQL) query that failed.')
+    assert "'collection_name': 'genes'" in repair
+    assert "'collection_name': 'variants'" not in repair
+    assert 'ArangoDB error 1501: unknown attribute' in repair
+    snapshot = metrics.snapshot()
+    assert snapshot['timings']['aql.attempts']['total'] == 2
+    assert snapshot['timings']['aql.generation.tokens']['count'] == 1
+    assert snapshot['timings']['aql.repair.tokens']['count'] == 1
+    assert repair_success_rate() == 1.0
+    metrics.reset()
+
+
+def test_chain_stops_repairing_when_the_budget_runs_out(catalog_schema):
+    """Test that no repair is requested after the last allowed attempt."""
+    metrics.reset()
+    db = Mock()
+    db.aql.execute.side_effect = execute_error('still broken')
+    recorder = PromptRecorder()
+    chain = make_chain(
+        catalog_schema, ['```FOR g IN gene RETURN g```'] * 3, db)
+    chain.max_aql_generation_attempts = 2
+
+    with pytest.raises(ValueError):
+        chain.invoke({'query': 'Tell me about PAH'},
+                     config={'callbacks': [recorder]})
+
+    assert len(recorder.prompts) == 2
+    assert repair_success_rate() == 0.0
+    metrics.reset()
+
+
+def test_describe_error():
+    """Test that ArangoDB error codes are kept and validation errors pass through."""
+    assert describe_error(execute_error('boom')) == 'ArangoDB error 1501: boom'
+    assert describe_error(AqlValidationError(['a', 'b'])) == 'a\nb'
+
+
+class TemperatureLLM(LLM):
+    """Answers candidate generation by temperature and other prompts in order."""
+
+    responses: dict
+    others: list = ['summary']
+
+    @property
+    def _llm_type(self):
+        return 'temperature'
+
+    def _call(self, prompt, stop=None, run_manager=None, temperature=None, **kwargs):
+        if temperature is not None:
+            return self.responses[temperature]
+        return self.others.pop(0)
+
+
+def make_candidate_chain(catalog_schema, responses, db, others=('summary',), **kwargs):
+    graph = GraphView(db, SchemaRegistry(catalog_schema).view(['genes']),
+                      guard=AqlGuard(db, max_cost=100))
+    chain = CatalogGraphQAChain.from_llm(
+        TemperatureLLM(responses=responses, others=list(others)),
+        aql_generation_prompt=AQL_GENERATION_PROMPT,
+        aql_fix_prompt=AQL_REPAIR_PROMPT,
+        graph=graph,
+        allow_dangerous_requests=True,
+    )
+    chain.return_aql_query = True
+    chain.candidates = 3
+    chain.candidate_grace = 5
+    for name, value in kwargs.items():
+        setattr(chain, name, value)
+    return chain
+
+
+def test_chain_runs_the_cheapest_valid_candidate(catalog_schema, collection_schema):
+    """Test that candidates are checked concurrently and only the cheapest valid one runs."""
+    metrics.reset()
+    db = Mock()
+    costs = {'name': 50, 'chr': 10}
+    db.aql.explain.side_effect = lambda aql, **kwargs: {
+        'estimatedCost': next(cost for attribute, cost in costs.items() if attribute in aql),
+        'nodes': []}
+    db.aql.execute.return_value = iter([{'name': 'PAH'}])
+    chain = make_candidate_chain(catalog_schema, {
+        0.0: '```FOR g IN genes FILTER g.name == "PAH" LIMIT 5 RETURN g```',
+        0.4: '```FOR g IN gene FILTER g.name == "PAH" LIMIT 5 RETURN g```',
+        0.8: '```FOR g IN genes FILTER g.chr == "chr12" LIMIT 5 RETURN g```',
+    }, db, validator=AqlValidator(collection_schema))
+
+    result = chain.invoke({'query': 'Tell me about PAH'})
+
+    assert result['aql_query'] == 'FOR g IN genes FILTER g.chr == "chr12" LIMIT 5 RETURN g'
+    assert result['result'] == 'summary'
+    assert db.aql.explain.call_count == 2
+    db.aql.execute.assert_called_once()
+    assert metrics.counter('aql.candidates.generated') == 3
+    assert metrics.counter('aql.candidates.valid') == 2
+    metrics.reset()
+
+
+def test_chain_repairs_when_no_candidate_is_valid(catalog_schema):
+    """Test that without a valid candidate the repair loop takes over."""
+    db = Mock()
+    db.aql.explain.side_effect = lambda aql, **kwargs: {
+        'estimatedCost': 10 if 'name' in aql else 1000, 'nodes': []}
+    db.aql.execute.return_value = iter([{'name': 'PAH'}])
+    chain = make_candidate_chain(catalog_schema, {
+        temperature: '```FOR g IN genes LIMIT 5 RETURN g```' for temperature in (0.0, 0.4, 0.8)
+    }, db, others=['```FOR g IN genes FILTER g.name == "PAH" LIMIT 5 RETURN g```', 'summary'])
+
+    result = chain.invoke({'query': 'Tell me about PAH'})
+
+    assert result['aql_query'] == 'FOR g IN genes FILTER g.name == "PAH" LIMIT 5 RETURN g'
+    db.aql.execute.assert_called_once()
+
+
+def test_chain_renders_small_results_without_summarizing(catalog_schema):
+    """Test that a rendered result skips the summarization call."""
+    db = Mock()
+    db.aql.execute.return_value = iter([])
+    recorder = PromptRecorder()
+    chain = make_chain(
+        catalog_schema, ['```FOR g IN genes LIMIT 5 RETURN g```'], db)
+    chain.renderer = ResultRenderer()
+
+    result = chain.invoke({'query': 'Tell me about NOPE'},
+                          config={'callbacks': [recorder]})
+
+    assert result['result'].startswith('No records were found')
+    assert result['aql_result'] == []
+    assert len(recorder.prompts) == 1
+
+
+def test_chain_stops_after_checking_in_aql_only_mode(catalog_schema, collection_schema):
+    """Test that aql_only mode repairs invalid queries but never executes or summarizes."""
+    db = Mock()
+    recorder = PromptRecorder()
+    cache = AqlCache()
+    chain = make_chain(catalog_schema, [
+        '```FOR g IN gene LIMIT 5 RETURN g```', '```FOR g IN genes LIMIT 5 RETURN g```'], db)
+    chain.validator = AqlValidator(collection_schema)
+    chain.aql_cache, chain.aql_cache_key = cache, 'key'
+    chain.mode = AQL_ONLY
+
+    result = chain.invoke({'query': 'Tell me about PAH'},
+                          config={'callbacks': [recorder]})
+
+    assert result == {'query': 'Tell me about PAH', 'result': None,
+                      'aql_query': 'FOR g IN genes LIMIT 5 RETURN g', 'aql_result': None}
+    db.aql.execute.assert_not_called()
+    assert len(recorder.prompts) == 2
+    assert len(cache) == 0
+
+
+def test_chain_returns_rows_without_summarizing_in_raw_mode(catalog_schema):
+    """Test that raw mode executes the query and skips the answer."""
+    db = Mock()
+    db.aql.execute.return_value = iter([{'name': 'PAH'}])
+    recorder = PromptRecorder()
+    chain = make_chain(
+        catalog_schema, ['```FOR g IN genes LIMIT 5 RETURN g```'], db)
+    chain.mode = RAW
+
+    result = chain.invoke({'query': 'Tell me about PAH'},
+                          config={'callbacks': [recorder]})
+
+    assert result['aql_result'] == [{'name': 'PAH'}]
+    assert result['result'] is None
+    assert len(recorder.prompts) == 1
+
+
+def test_chain_reports_stages_and_streams_the_answer(catalog_schema):
+    """Test that on_event sees the query, the rows and the answer tokens."""
+    db = Mock()
+    db.aql.execute.return_value = iter([{'name': 'PAH'}])
+    events = []
+    chain = make_chain(
+        catalog_schema, ['```FOR g IN genes LIMIT 5 RETURN g```', 'PAH.'], db)
+    chain.on_event = lambda event, data: events.append((event, data))
+
+    result = chain.invoke({'query': 'Tell me about PAH'})
+
+    assert events[:2] == [('aql', {'aql_query': 'FOR g IN genes LIMIT 5 RETURN g'}),
+                          ('rows', {'aql_result': [{'name': 'PAH'}]})]
+    tokens = [data['text'] for event, data in events[2:] if event == 'token']
+    assert ''.join(tokens) == 'PAH.'
+    assert result['result'] == 'PAH.'
+
+
+def test_chain_ainvoke_runs_the_same_steps(catalog_schema):
+    """Test that ainvoke repairs, executes and streams the answer like invoke."""
+    db = Mock()
+    db.aql.execute.side_effect = [
+        execute_error('syntax error'), iter([{'name': 'PAH'}])]
+    events = []
+    chain = make_chain(catalog_schema, [
+        '```FOR g IN gene LIMIT 5 RETURN g```', '```FOR g IN genes LIMIT 5 RETURN g```',
+        'PAH.'], db)
+    chain.on_event = lambda event, data: events.append(event)
+
+    result = asyncio.run(chain.ainvoke({'query': 'Tell me about PAH'}))
+
+    assert result['aql_query'] == 'FOR g IN genes LIMIT 5 RETURN g'
+    assert result['aql_result'] == [{'name': 'PAH'}]
+    assert result['result'] == 'PAH.'
+    assert events[:2] == ['aql', 'rows'] and 'token' in events
+    assert db.aql.execute.call_count == 2
+
+
+def test_chain_ainvoke_runs_the_cheapest_valid_candidate(catalog_schema):
+    """Test that async candidates are raced and only the cheapest valid one runs."""
+    db = Mock()
+    db.aql.explain.side_effect = lambda aql, **kwargs: {
+        'estimatedCost': 10 if 'chr' in aql else 50, 'nodes': []}
+    db.aql.execute.return_value = iter([{'name': 'PAH'}])
+    chain = make_candidate_chain(catalog_schema, {
+        0.0: '```FOR g IN genes FILTER g.name == "PAH" LIMIT 5 RETURN g```',
+        0.4: '```FOR g IN genes FILTER g.chr == "chr12" LIMIT 5 RETURN g```',
+        0.8: '```FOR g IN genes FILTER g.name == "PAH" LIMIT 5 RETURN g```',
+    }, db)
+
+    result = asyncio.run(chain.ainvoke({'query': 'Tell me about PAH'}))
+
+    assert result['aql_query'] == 'FOR g IN genes FILTER g.chr == "chr12" LIMIT 5 RETURN g'
+    db.aql.execute.assert_called_once()
@@ -0,0 +1,162 @@
+import json
+import pytest
+from unittest.mock import Mock
+from collection_classifier import CollectionClassifier
+
+
+@pytest.fixture
+def classifier(collection_schema):
+    return CollectionClassifier(collection_schema)
+
+
+@pytest.mark.parametrize('question, expected', [
+    ('Tell me about gene PAH?', ['genes']),
+    ('what diseases are associated with gene PAH?',
+     ['genes', 'ontology_terms', 'diseases_genes']),
+    ('The variant with SPDI of NC_000001.11:981168:A:G affects the expression of several genes. '
+     'What are the genes that are affected?',
+     ['genes', 'variants', 'variants_genes']),
+    ('Can you tell me the variant with SPDI of NC_000012.12:102855312:C:T is associated with what diseases?',
+     ['variants', 'ontology_terms', 'variants_diseases']),
+    ('What does NEK5 interact with?', ['proteins', 'proteins_proteins']),
+    ('what genomic elements overlap rs1047055?',
+     ['variants', 'genomic_elements', 'variants_genomic_elements']),
+    ('Which regulatory regions overlap rs1047055?',
+     ['variants', 'genomic_elements', 'variants_genomic_elements']),
+    ('Which genes are on chr12?', ['genes']),
+])
+def test_classify_examples(classifier, question, expected):
+    """Test the rule-based classifier on the selection prompt examples."""
+    selected, confidence = classifier.classify(question)
+    assert selected == expected
+    assert confidence >= classifier.threshold
+
+
+def test_classify_without_signal(classifier):
+    """Test that a question without known terms is not confident."""
+    selected, confidence = classifier.classify('How is the weather today?')
+    assert selected == []
+    assert confidence == 0.0
+
+
+def test_classify_uses_resolved_entities(classifier):
+    """Test that collections of resolved entities count as identifier matches."""
+    question = 'Which variants are associated with cardiomyopathy?'
+    selected, confidence = classifier.classify(
+        question, entity_collections=['ontology_terms'])
+
+    assert selected == ['variants', 'ontology_terms', 'variants_diseases']
+    assert confidence >= classifier.threshold
+
+
+def test_classify_unlinked_entities_is_not_confident(classifier):
+    """Test that entity types without a connecting edge lower confidence."""
+    _, confidence = classifier.classify('Which proteins are near rs1047055?')
+    assert confidence < classifier.threshold
+
+
+def test_classify_relationship_without_edge_is_not_confident(classifier):
+    """Test that relationship wording without a matching edge lowers confidence."""
+    selected, confidence = classifier.classify(
+        'Which genes are similar to SAMD11?')
+    assert selected == ['genes']
+    assert confidence < classifier.threshold
+
+
+def test_classify_keyword_the_edge_does_not_cover_is_not_confident(
+        classifier):
+    """Test that a keyword outside an edge's shorthand lowers confidence."""
+    selected, confidence = classifier.classify(
+        'Show me variants in the liver tissue')
+    assert selected == ['variants', 'ontology_terms', 'variants_diseases']
+    assert confidence < classifier.threshold
+
+
+def test_classify_competing_edges_is_not_confident(classifier):
+    """Test that several edges linking the same endpoints lower confidence."""
+    _, confidence = classifier.classify(
+        'Which genes does rs1047055 affect in the liver?',
+        entity_collections=['ontology_terms'])
+    assert confidence < classifier.threshold
+
+
+def test_classify_ambiguous_alias_is_not_confident():
+    """Test that a word naming several collections lowers confidence."""
+    classifier = CollectionClassifier([
+        {'collection_name': 'genes', 'collection_type': 'document'},
+        {'collection_name': 'mouse_genes', 'collection_type': 'document'}])
+    selected, confidence = classifier.classify('Tell me about genes')
+    assert selected == ['genes', 'mouse_genes']
+    assert confidence < classifier.threshold
+
+
+def test_classify_edge_keyword_adds_endpoints(classifier):
+    """Test that a relationship keyword pulls in the edge's endpoints."""
+    selected, _ = classifier.classify('Find the top 5 eQTLs for PAH')
+    assert selected == ['genes', 'variants', 'variants_genes']
+
+
+def test_select_uses_local_result(classifier):
+    """Test that a confident local result skips the LLM."""
+    fallback = Mock()
+    result = classifier.select('Tell me about gene PAH?',
+                               ['genes', 'variants'], fallback)
+
+    assert result == ['genes']
+    fallback.assert_not_called()
+    assert classifier.stats()['fallback_rate'] == 0.0
+
+
+def test_select_falls_back_and_learns(classifier):
+    """Test the LLM fallback and that its answer is reused for similar questions."""
+    fallback = Mock(return_value=['genes', 'genes_genes'])
+    question = 'Which genes are most similar in expression profile to SAMD11?'
+
+    assert classifier.select(question, ['genes', 'genes_genes'], fallback) == [
+        'genes', 'genes_genes']
+    fallback.assert_called_once()
+
+    assert classifier.select(question, ['genes', 'genes_genes'], fallback) == [
+        'genes', 'genes_genes']
+    fallback.assert_called_once()
+
+    stats = classifier.stats()
+    assert stats['requests'] == 2
+    assert stats['fallback'] == 1
+    assert stats['fallback_rate'] == 0.5
+    assert stats['logged_examples'] == 1
+
+
+def test_select_does_not_record_invalid_fallback_output(classifier):
+    """Test that a raw string from the LLM is passed through but not learned."""
+    fallback = Mock(return_value='Invalid JSON response')
+    assert classifier.select('How is the weather today?', ['genes'], fallback) == \
+        'Invalid JSON response'
+    assert classifier.stats()['logged_examples'] == 0
+
+
+def test_log_round_trip(collection_schema, tmp_path):
+    """Test that logged selections are loaded by a new classifier."""
+    log_path = str(tmp_path / 'selections.jsonl')
+    first = CollectionClassifier(collection_schema, log_path=log_path)
+    first.record('Which genes are co-regulated with SAMD11?',
+                 ['genes', 'genes_genes', 'unknown'])
+
+    with open(log_path) as f:
+        assert json.loads(f.readline())['collections'] == [
+            'genes', 'genes_genes']
+
+    second = CollectionClassifier(collection_schema, log_path=log_path)
+    selected, confidence = second.classify(
+        'Which genes are co-regulated with SAMD11?')
+    assert selected == ['genes', 'genes_genes']
+    assert confidence == pytest.approx(1.0, abs=1e-5)
+
+
+def test_empty_schema():
+    """Test that a classifier without a schema always defers to the LLM."""
+    classifier = CollectionClassifier(None)
+    fallback = Mock(return_value=['genes'])
+    assert classifier.select(
+        'Tell me about gene PAH?', ['genes'], fallback) == ['genes']
+    fallback.assert_called_once()
@@ -0,0 +1,126 @@
+import os
+import pytest
+from unittest.mock import Mock
+from entity_index import (Entity, EntityIndex, build_entries, entity_collections,
+                          format_entities, write_index)
+
+
+ENTRIES = {
+    'gene': [('PAH', 'genes/ENSG00000171759'), ('PH', 'genes/ENSG00000171759'),
+             ('SAMD11', 'genes/ENSG00000187634')],
+    'variant': [('rs5030858', 'variants/NC_000012.12:102855312:C:T'),
+                ('rs1047055', 'variants/rs1047055_a'), ('rs1047055', 'variants/rs1047055_b')],
+    'protein': [('PH4H_HUMAN', 'proteins/P00439')],
+    'ontology_term': [('cardiomyopathy', 'ontology_terms/MONDO_0004994'),
+                      ('heart', 'ontology_terms/UBERON_0000948'),
+                      ('heart left ventricle', 'ontology_terms/UBERON_0002084')],
+}
+
+
+@pytest.fixture
+def index():
+    return EntityIndex.from_entries(ENTRIES)
+
+
+def test_lookup_is_case_insensitive(index):
+    """Test that names resolve regardless of case and repeated names keep all ids."""
+    assert index.lookup('gene', 'pah') == ('genes/ENSG00000171759',)
+    assert index.lookup('variant', 'RS1047055') == (
+        'variants/rs1047055_a', 'variants/rs1047055_b')
+    assert index.lookup('variant', 'rs1047055', limit=1) == (
+        'variants/rs1047055_a',)
+    assert index.lookup('gene', 'NOTAGENE') == ()
+    assert index.lookup('unknown', 'PAH') == ()
+
+
+def test_resolve_finds_each_kind(index):
+    """Test that mentions of every kind are resolved in order of appearance."""
+    entities = index.resolve(
+        'Is rs5030858 near PAH, does PH4H_HUMAN bind, and is it linked to cardiomyopathy?')
+
+    assert entities == [
+        Entity('variant', 'rs5030858', ('variants/NC_000012.12:102855312:C:T',)),
+        Entity('gene', 'PAH', ('genes/ENSG00000171759',)),
+        Entity('protein', 'PH4H_HUMAN', ('proteins/P00439',)),
+        Entity('ontology_term', 'cardiomyopathy',
+               ('ontology_terms/MONDO_0004994',)),
+    ]
+
+
+def test_resolve_prefers_longest_term_and_skips_lowercase_symbols(index):
+    """Test that the longest term wins and lower case words are not gene symbols."""
+    entities = index.resolve('what does pah do in the heart left ventricle?')
+
+    assert entities == [Entity('ontology_term', 'heart left ventricle',
+                               ('ontology_terms/UBERON_0002084',))]
+
+
+def test_resolve_with_empty_index():
+    """Test that an index without tables resolves nothing."""
+    assert EntityIndex().resolve('Tell me about gene PAH') == []
+    assert len(EntityIndex()) == 0
+
+
+def test_save_and_load_memory_mapped(index, tmp_path):
+    """Test that a saved index loads memory-mapped and answers the same."""
+    index.save(str(tmp_path))
+    loaded = EntityIndex.load(str(tmp_path))
+
+    assert len(loaded) == len(index)
+    assert loaded.lookup('protein', 'ph4h_human') == ('proteins/P00439',)
+    assert EntityIndex.load(str(tmp_path / 'missing')).resolve('PAH') == []
+
+
+@pytest.mark.parametrize('run_size', [2, 1000])
+def test_write_index_sorts_in_runs(index, tmp_path, run_size):
+    """Test that merging sorted runs gives the index built in memory."""
+    entries = {kind: iter(pairs + pairs[:1])
+               for kind, pairs in ENTRIES.items()}
+    write_index(str(tmp_path), entries, run_size=run_size)
+    loaded = EntityIndex.load(str(tmp_path))
+
+    assert len(loaded) == len(index)
+    for kind, pairs in ENTRIES.items():
+        for name, _ in pairs:
+            assert loaded.lookup(kind, name) == index.lookup(kind, name)
+    # The spilled runs are removed
+    assert not any(os.path.isdir(tmp_path / name)
+                   for name in os.listdir(tmp_path))
+
+
+def test_load_empty_table(tmp_path):
+    """Test that a kind without names loads and finds nothing."""
+    write_index(str(tmp_path), {'gene': []})
+
+    assert EntityIndex.load(str(tmp_path)).lookup('gene', 'PAH') == ()
+
+
+def test_format_entities_and_collections():
+    """Test the prompt lines and collection names for resolved entities."""
+    entities = [Entity('gene', 'PAH', ('genes/ENSG00000171759',)),
+                Entity('ontology_term', 'heart',
+                       ('ontology_terms/a', 'ontology_terms/b')),
+                Entity('gene', 'SAMD11', ('genes/ENSG00000187634',))]
+
+    assert format_entities(entities) == (
+        'PAH (gene): genes/ENSG00000171759\n'
+        'heart (ontology term): ontology_terms/a, ontology_terms/b\n'
+        'SAMD11 (gene): genes/ENSG00000187634')
+    assert entity_collections(entities) == ['genes', 'ontology_terms']
+
+
+def test_build_entries():
+    """Test that names are read per kind and missing collections are skipped."""
+    db = Mock()
+    db.has_collection.side_effect = lambda name: name in ('genes', 'variants')
+    db.aql.execute.side_effect = [
+        iter([['genes/ENSG00000171759', ['PAH', 'PH', None]]]),
+        iter([['variants/v1', ['rs5030858']]]),
+    ]
+
+    entries = {kind: list(pairs) for kind, pairs in build_entries(db).items()}
+
+    assert entries == {
+        'gene': [('PAH', 'genes/ENSG00000171759'), ('PH', 'genes/ENSG00000171759')],
+        'variant': [('rs5030858', 'variants/v1')],
+    }
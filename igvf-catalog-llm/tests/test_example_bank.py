@@ -0,0 +1,88 @@
+import pytest
+from example_bank import ExampleBank, aql_fingerprint
+from example_selector import AqlExample, ExampleSelector
+
+
+def test_fingerprint_ignores_literals_case_and_whitespace():
+    """Test that queries differing only by identifiers share a fingerprint."""
+    first = "FOR v IN variants FILTER v.spdi == 'NC_000012.12:102855312:C:T' LIMIT 5 RETURN v"
+    second = 'for v in variants\n  filter v.spdi == "NC_000005.10:173860847:G:A"\n  limit 10 return v'
+    assert aql_fingerprint(first) == aql_fingerprint(second)
+
+
+def test_fingerprint_differs_for_other_shapes():
+    """Test that structurally different queries get different fingerprints."""
+    assert aql_fingerprint('FOR g IN genes RETURN g') != \
+        aql_fingerprint('FOR g IN genes FILTER g.name == "PAH" RETURN g')
+
+
+def test_record_deduplicates_by_fingerprint():
+    """Test that one example is kept per query shape."""
+    bank = ExampleBank()
+    assert bank.record('Tell me about gene PAH',
+                       'FOR g IN genes FILTER g.name == "PAH" RETURN g')
+    assert not bank.record('Tell me about gene BRCA1',
+                           'FOR g IN genes FILTER g.name == "BRCA1" RETURN g')
+    assert len(bank) == 1
+
+
+def test_record_skips_known_shapes():
+    """Test that shapes already in the static examples are not recorded."""
+    bank = ExampleBank(
+        known=['FOR g IN genes FILTER g.name == "SAMD11" RETURN g'])
+    assert not bank.record('Tell me about gene PAH',
+                           'FOR g IN genes FILTER g.name == "PAH" RETURN g')
+    assert len(bank) == 0
+
+
+def test_record_respects_max_examples():
+    """Test that the bank stops growing at its limit."""
+    bank = ExampleBank(max_examples=1)
+    assert bank.record('q1', 'FOR g IN genes RETURN g')
+    assert not bank.record('q2', 'FOR p IN proteins RETURN p')
+
+
+def test_nearest_returns_similar_examples():
+    """Test retrieval by question similarity."""
+    bank = ExampleBank()
+    bank.record('Which pathways include gene PAH?',
+                'FOR g IN genes FILTER g.name == "PAH" FOR p IN OUTBOUND g genes_pathways RETURN p')
+    bank.record('What does NEK5 interact with?',
+                'FOR p IN proteins FILTER "NEK5_HUMAN" IN p.names RETURN p')
+
+    nearest = bank.nearest('Which pathways include gene BRCA1?', k=1)
+
+    assert len(nearest) == 1
+    assert nearest[0].question == 'Which pathways include gene PAH?'
+    assert nearest[0].collections == ('genes', 'genes_pathways')
+    assert bank.nearest('zzz', k=2) == []
+    assert bank.nearest('Which pathways include gene BRCA1?', k=0) == []
+
+
+def test_persistence_round_trip(tmp_path):
+    """Test that recorded examples are loaded by a new bank."""
+    path = str(tmp_path / 'bank.jsonl')
+    ExampleBank(path).record('Tell me about gene PAH',
+                             ' FOR g IN genes RETURN g\n')
+
+    bank = ExampleBank(path)
+
+    assert len(bank) == 1
+    nearest = bank.nearest('Tell me about gene PAH')
+    assert nearest[0].aql == 'FOR g IN genes RETURN g'
+    assert not bank.record('Tell me about gene X', 'FOR g IN genes RETURN g')
+
+
+def test_selector_appends_bank_examples():
+    """Test that the selector adds the bank's nearest examples."""
+    bank = ExampleBank()
+    bank.record('Which pathways include gene PAH?',
+                'FOR p IN genes_pathways RETURN p')
+    static = [AqlExample('Tell me about gene SAMD11',
+                         'FOR g IN genes RETURN g', ('genes',))]
+    selector = ExampleSelector(static, k=1, bank=bank, bank_k=1)
+
+    ranked = selector.rank('Which pathways include gene BRCA1?', ['genes'])
+
+    assert [example.question for example in ranked] == [
+        'Tell me about gene SAMD11', 'Which pathways include gene PAH?']
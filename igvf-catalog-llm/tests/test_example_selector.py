@@ -0,0 +1,85 @@
+import pytest
+from aql_examples import AQL_EXAMPLES
+from example_selector import (
+    AqlExample, ExampleSelector, format_examples, parse_examples, referenced_collections)
+
+
+@pytest.fixture(scope='module')
+def examples():
+    return parse_examples(AQL_EXAMPLES)
+
+
+def test_parse_examples(examples):
+    """Test that every commented example in AQL_EXAMPLES is parsed."""
+    assert len(examples) == AQL_EXAMPLES.count('\n    #')
+    assert examples[0] == AqlExample(
+        'Tell me about gene SAMD11',
+        'FOR gene IN genes\nFILTER gene.name == "SAMD11"\nLIMIT 5\nRETURN gene',
+        ('genes',),
+    )
+
+
+@pytest.mark.parametrize('aql, expected', [
+    ('WITH variants, variants_diseases, ontology_terms\n'
+     'FOR variant IN variants\nFOR disease IN OUTBOUND variant variants_diseases\nRETURN disease',
+     ['variants', 'variants_diseases', 'ontology_terms']),
+    ('LET heartTerms = (FOR t IN ontology_terms RETURN t)\n'
+     'FOR tgt IN heartTerms\nFOR v, e IN 1..7 INBOUND tgt ontology_terms_ontology_terms RETURN v',
+     ['ontology_terms', 'ontology_terms_ontology_terms']),
+    ("FOR gg in genes_genes FILTER gg._from == 'genes/ENSG00000261221' RETURN gg",
+     ['genes_genes']),
+    ('FOR t IN transcripts_proteins FILTER t._to == p._id RETURN DOCUMENT(t._from)',
+     ['transcripts_proteins']),
+    ("RETURN DOCUMENT('genes/ENSG00000261221')", ['genes']),
+    ('FOR g IN genes COLLECT c = g.chr INTO groups\n'
+     'FOR x IN groups LIMIT 5 RETURN x', ['genes']),
+    ('FOR g IN genes COLLECT c = g.chr, s = g.strand AGGREGATE n = COUNT(g)\n'
+     'FOR x IN [c, s] RETURN [x, n]', ['genes']),
+    ("FOR v IN 1..2 OUTBOUND 'genes/X' GRAPH 'igvf' LIMIT 5 RETURN v", []),
+    ("FOR g IN genes FILTER g.name == 'and/or' LIMIT 5 RETURN g", ['genes']),
+])
+def test_referenced_collections(aql, expected):
+    """Test collection extraction from WITH, loops, traversals and document ids."""
+    assert referenced_collections(aql) == expected
+
+
+def test_format_examples_round_trip(examples):
+    """Test that formatted examples parse back to the same records."""
+    assert parse_examples(format_examples(examples)) == examples
+
+
+def test_select_prefers_matching_collections(examples):
+    """Test that examples over the selected collections rank first."""
+    selector = ExampleSelector(examples, k=3)
+
+    ranked = selector.rank('what diseases are associated with gene BRCA1',
+                           ['genes', 'ontology_terms', 'diseases_genes'])
+
+    assert len(ranked) == 3
+    assert ranked[0].question == 'What diseases are associated with variant with gene PAH?'
+
+
+def test_select_uses_question_similarity(examples):
+    """Test that question wording breaks ties between similar collection sets."""
+    selector = ExampleSelector(examples, k=1)
+
+    ranked = selector.rank('Is variant with rsID rs12345 a caQTL?',
+                           ['variants', 'variants_genomic_elements'])
+
+    assert ranked[0].question == 'Is variant with rsID rs875741 a caQTL?'
+
+
+def test_select_is_smaller_than_all_examples(examples):
+    """Test that the selected examples are a fraction of the full string."""
+    selector = ExampleSelector(examples)
+    selected = selector.select('Tell me about gene PAH', ['genes'])
+
+    assert selected.startswith('# Tell me about gene SAMD11')
+    assert len(selected) < len(AQL_EXAMPLES) / 2
+
+
+def test_select_without_any_match():
+    """Test that unrelated questions get no examples."""
+    selector = ExampleSelector([AqlExample(
+        'Tell me about gene X', 'FOR g IN genes RETURN g', ('genes',))])
+    assert selector.select('zzz', ['proteins']) == ''
@@ -0,0 +1,114 @@
+import pytest
+from unittest.mock import Mock
+from fast_path import RULES, FastPath, inline_bind_vars
+
+
+def make_db(rows):
+    db = Mock()
+    db.aql.execute.return_value = iter(rows)
+    return db
+
+
+@pytest.mark.parametrize('question, rule, bind_vars', [
+    ('Tell me about gene SAMD11', 'gene_about', {'names': ['SAMD11']}),
+    ('tell me about the gene pah?', 'gene_about', {'names': ['pah', 'PAH']}),
+    ('Tell me about gene C1orf112', 'gene_about',
+     {'names': ['C1orf112', 'C1ORF112']}),
+    ('Can you tell me the variant with SPDI of NC_000012.12:102855312:C:T is associated with what diseases?',
+     'variant_diseases', {'spdi': 'NC_000012.12:102855312:C:T'}),
+    ('Tell me about variant NC_000012.12:102855312:C:T',
+     'variant_spdi', {'spdi': 'NC_000012.12:102855312:C:T'}),
+    ('what genomic elements overlap rs1047055?',
+     'rsid_genomic_elements', {'rsid': 'rs1047055'}),
+    ('Which genes are linked to variant rs5030858?',
+     'variant_genes', {'rsid': 'rs5030858'}),
+    ('genes associated with   rs5030858',
+     'variant_genes', {'rsid': 'rs5030858'}),
+])
+def test_match(question, rule, bind_vars):
+    """Test that common question shapes map to their rule and bind variables."""
+    match = FastPath(None).match(question)
+
+    assert match.rule.name == rule
+    assert match.bind_vars == bind_vars
+
+
+@pytest.mark.parametrize('question', [
+    'Show me all variants associated with cardiomyopathy',
+    'Tell me about gene PAH and its variants',
+    'what genomic elements overlap rs1047055 in heart?',
+    '',
+])
+def test_no_match(question):
+    """Test that other questions are left to the LLM."""
+    assert FastPath(None).match(question) is None
+
+
+def test_answer_runs_bind_variable_query():
+    """Test that a matched question is answered without string-built AQL."""
+    db = make_db([{'_id': 'genes/ENSG00000171759', 'name': 'PAH'}])
+    fast_path = FastPath(db)
+
+    response = fast_path.answer('Tell me about gene PAH')
+
+    query, = db.aql.execute.call_args[0]
+    assert '@names' in query and 'PAH' not in query
+    assert db.aql.execute.call_args[1]['bind_vars'] == {
+        'names': ['PAH'], 'limit': 5}
+    assert response['aql_query'] == (
+        'FOR gene IN genes\n    FILTER gene.name IN ["PAH"]\n'
+        '    LIMIT 5\n    RETURN gene')
+    assert response['aql_result'] == [
+        {'_id': 'genes/ENSG00000171759', 'name': 'PAH'}]
+    assert response['result'] == (
+        'Found 1 record in genes:\n- _id: genes/ENSG00000171759; name: PAH')
+    assert response['query'] == response['user_input'] == 'Tell me about gene PAH'
+    assert fast_path.stats() == {'answered': {'gene_about': 1}, 'fallbacks': 0}
+
+
+def test_every_rule_limits_its_query():
+    """Test that template queries limit rows on the server, not only in the cursor."""
+    for rule in RULES:
+        assert 'LIMIT @limit' in rule.aql, rule.name
+
+
+def test_answer_summarizes_rows_the_renderer_cannot_write_out():
+    """Test that nested documents are answered with the rule's summary, not raw JSON."""
+    fast_path = FastPath(
+        make_db([{'_id': 'variants/x', 'annotations': {'freq': 0.1}}]))
+
+    response = fast_path.answer(
+        'Tell me about variant NC_000012.12:102855312:C:T')
+
+    assert response['result'] == 'Found 1 variant(s) with SPDI NC_000012.12:102855312:C:T.'
+
+    fast_path = FastPath(make_db([{'_id': 'genes/1', 'alias': ['x' * 200]}]))
+    response = fast_path.answer('Tell me about gene PAH')
+
+    assert response['result'] == 'Found 1 gene(s) named PAH.'
+
+
+def test_answer_limits_rows():
+    """Test that at most top_k rows are returned."""
+    fast_path = FastPath(make_db([{'n': i} for i in range(20)]), top_k=3)
+
+    assert len(fast_path.answer('Tell me about gene PAH')['aql_result']) == 3
+
+
+def test_answer_falls_back_when_empty_or_failing():
+    """Test that empty results and query errors fall back to the LLM."""
+    empty = FastPath(make_db([]))
+    failing_db = Mock()
+    failing_db.aql.execute.side_effect = RuntimeError('boom')
+    failing = FastPath(failing_db)
+
+    assert empty.answer('Tell me about gene NOTAGENE') is None
+    assert failing.answer('Tell me about gene PAH') is None
+    assert failing.stats() == {'answered': {}, 'fallbacks': 1}
+    assert FastPath(make_db([])).answer('Which genes are in heart?') is None
+
+
+def test_inline_bind_vars():
+    """Test that displayed queries have bind variables written out."""
+    assert inline_bind_vars('FILTER @rsid IN v.rsid AND x == @other', {'rsid': 'rs1'}) == \
+        'FILTER "rs1" IN v.rsid AND x == @other'
@@ -0,0 +1,37 @@
+import os
+import runpy
+from unittest.mock import patch
+
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'gunicorn.conf.py')
+
+
+def load_config(**env):
+    with patch.dict(os.environ, env):
+        return runpy.run_path(CONFIG_PATH)
+
+
+def test_workers_and_threads_follow_the_task_size():
+    """Test that worker and thread counts come from the task's CPU and memory."""
+    config = load_config(TASK_CPU_UNITS='1024', TASK_MEMORY_MIB='2048')
+    assert config['workers'] == 3
+    assert config['threads'] == 8
+    assert config['preload_app'] is True
+    assert config['timeout'] == 300
+
+    # Memory, not CPU, limits a small task
+    assert config['worker_count'](2048, 1024) == 2
+    assert config['worker_count'](256, 512) == 1
+    assert config['thread_count'](256) == 4
+
+
+def test_worker_class_picks_the_app():
+    """Test that gthread workers serve the Flask app and uvicorn workers the ASGI app."""
+    config = load_config()
+    assert config['worker_class'] == 'gthread'
+    assert config['wsgi_app'] == 'app:app'
+    config = load_config(GUNICORN_WORKER_CLASS='uvicorn_worker.UvicornWorker',
+                         GUNICORN_WORKERS='2')
+    assert config['wsgi_app'] == 'asgi:application'
+    assert config['workers'] == 2
@@ -0,0 +1,65 @@
+from unittest.mock import Mock, patch
+
+import httpx
+from arango import ArangoClient
+from http_clients import OpenAIConnectionPool, PooledArangoHTTPClient
+
+
+def test_pooled_arango_client_pool_size():
+    """Test that the Arango session uses the configured pool size."""
+    http_client = PooledArangoHTTPClient(pool_maxsize=32, request_timeout=15)
+    session = http_client.create_session('https://db.example.com')
+
+    adapter = session.get_adapter('https://db.example.com')
+    assert adapter._pool_maxsize == 32
+    assert adapter.max_retries.total == PooledArangoHTTPClient.RETRY_ATTEMPTS
+    assert http_client.REQUEST_TIMEOUT == 15
+
+
+def test_pooled_arango_client_with_arango_client():
+    """Test that ArangoClient accepts the pooled client."""
+    http_client = PooledArangoHTTPClient(pool_maxsize=4)
+    client = ArangoClient(hosts='https://db.example.com',
+                          http_client=http_client)
+    assert client.db('igvf', username='u', password='p').name == 'igvf'
+
+
+def test_pooled_arango_client_counts_requests_in_flight():
+    """Test that the Arango client reports pool utilization."""
+    http_client = PooledArangoHTTPClient(pool_maxsize=4)
+    seen = []
+    session = Mock()
+    session.request.side_effect = lambda **kwargs: seen.append(http_client.stats()) or Mock(
+        url='u', headers={}, status_code=200, reason='OK', text='{}')
+
+    http_client.send_request(
+        session, 'get', 'https://db.example.com/_api/version')
+
+    assert seen[0]['in_use'] == 1 and seen[0]['utilization'] == 0.25
+    assert http_client.stats() == {'max_connections': 4, 'in_use': 0, 'peak': 1,
+                                   'requests': 1, 'utilization': 0.0}
+
+
+def test_openai_pool_shares_clients_per_process():
+    """Test that OpenAI clients share one sized pool and are rebuilt after a fork."""
+    pool = OpenAIConnectionPool(
+        max_connections=8, timeout=30, connect_timeout=2)
+
+    assert pool.stats() == {'http2': False, 'sync': None, 'async': None}
+    assert pool.client is pool.client
+    assert pool.client._client is pool.http_client
+    assert pool.async_client._client is pool.async_http_client
+    assert pool.client.timeout == httpx.Timeout(30, connect=2)
+    assert pool.http_client._transport._pool._max_connections == 8
+    assert pool.stats()['sync'] == {'max_connections': 8, 'open': 0, 'in_use': 0,
+                                    'utilization': 0.0}
+
+    http_client = pool.http_client
+    with patch('http_clients.os.getpid', return_value=-1):
+        assert pool.http_client is not http_client
+
+
+def test_openai_pool_falls_back_without_h2():
+    """Test that HTTP/2 is only used when the h2 package is installed."""
+    with patch('http_clients.http2_available', return_value=False):
+        assert OpenAIConnectionPool(http2=True).http2 is False
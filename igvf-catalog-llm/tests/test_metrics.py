@@ -0,0 +1,57 @@
+import pytest
+from metrics import Metrics, ShapeTimings, metrics, prompt_cache_hit_rates, record_token_usage
+
+
+def test_counters_and_timings():
+    """Test counter increments and timing aggregates."""
+    m = Metrics()
+    m.increment('a')
+    m.increment('a', 2)
+    m.observe('t', 1.0)
+    m.observe('t', 3.0)
+
+    snapshot = m.snapshot()
+
+    assert snapshot['counters'] == {'a': 3}
+    assert snapshot['timings']['t'] == {
+        'count': 2, 'total': 4.0, 'max': 3.0, 'mean': 2.0}
+    assert m.counter('a') == 3
+    assert m.counter('missing') == 0
+
+    m.reset()
+    assert m.snapshot() == {'counters': {}, 'timings': {}}
+
+
+def test_shape_timings_keep_the_most_recent_shapes():
+    """Test that the least recently run shape is dropped once the table is full."""
+    timings = ShapeTimings(max_size=2)
+    timings.observe('a', 1.0)
+    timings.observe('b', 1.0)
+    timings.observe('a', 3.0)
+    timings.observe('c', 1.0)
+
+    snapshot = timings.snapshot()
+
+    assert list(snapshot['shapes']) == ['a', 'c']
+    assert snapshot['shapes']['a'] == {
+        'count': 2, 'total': 4.0, 'max': 3.0, 'mean': 2.0}
+    assert snapshot['dropped'] == 1
+
+    disabled = ShapeTimings(max_size=0)
+    disabled.observe('a', 1.0)
+    assert disabled.snapshot() == {'dropped': 0, 'shapes': {}}
+
+
+def test_prompt_cache_hit_rates():
+    """Test per-stage cached token share."""
+    metrics.reset()
+    record_token_usage('select_collections', 2000, 1536, 20)
+    record_token_usage('select_collections', 2000, 0, 20)
+    record_token_usage('aql_chain', 100, None, 10)
+
+    rates = prompt_cache_hit_rates()
+
+    assert rates['select_collections'] == pytest.approx(0.384)
+    assert rates['aql_chain'] == 0.0
+    assert metrics.counter('tokens.select_collections.completion') == 40
+    metrics.reset()
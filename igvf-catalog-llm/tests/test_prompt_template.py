@@ -6,12 +6,32 @@ def test_prompt_template_format():
     """Test that the prompt template can be formatted with variables."""
     aql_examples = 'FOR doc IN genes RETURN doc'
     user_input = 'Show me all genes'
+    adb_schema = "{'Collection Schema': [{'collection_name': 'genes'}]}"
 
     formatted_prompt = AQL_GENERATION_PROMPT.format(
+        adb_schema=adb_schema,
         aql_examples=aql_examples,
+        entities='',
         user_input=user_input
     )
 
+    assert adb_schema in formatted_prompt
     assert aql_examples in formatted_prompt
     assert user_input in formatted_prompt
     assert 'Task: Generate an ArangoDB Query Language' in formatted_prompt
+
+
+def test_prompt_template_variable_parts_come_last():
+    """Test that per-request content follows the static instructions."""
+    first = AQL_GENERATION_PROMPT.format(
+        adb_schema='schema A', aql_examples='examples A', entities='entities A',
+        user_input='question A')
+    second = AQL_GENERATION_PROMPT.format(
+        adb_schema='schema B', aql_examples='examples B', entities='entities B',
+        user_input='question B')
+
+    prefix = first[:first.index('schema A')]
+    assert second.startswith(prefix)
+    assert 'Things you should not do' in prefix
+    assert (first.index('schema A') < first.index('examples A')
+            < first.index('entities A') < first.index('question A'))
@@ -0,0 +1,69 @@
+import pytest
+from unittest.mock import Mock
+from result_cache import ResultCache
+
+
+def test_key_uses_canonical_text_bind_vars_and_limit():
+    """Test that only the canonical query, bind variables and limit make up the key."""
+    key = ResultCache.make_key('FOR g IN genes RETURN g', {'name': 'PAH'}, 5)
+
+    assert key == ResultCache.make_key(
+        'FOR g  IN genes\nRETURN g', {'name': 'PAH'}, 5)
+    assert key != ResultCache.make_key(
+        'FOR g IN genes RETURN g', {'name': 'SAMD11'}, 5)
+    assert key != ResultCache.make_key(
+        'FOR g IN genes RETURN g', {'name': 'PAH'}, 10)
+
+
+def test_lru_eviction():
+    """Test that the cache stays within its size."""
+    cache = ResultCache(max_size=2)
+    for name in ('a', 'b', 'c'):
+        cache.set(name, 'FOR g IN genes RETURN g', [name])
+
+    assert cache.get('a') is None
+    assert cache.get('c') == ['c']
+    assert len(cache) == 2
+
+
+def test_invalidates_only_changed_collections(monkeypatch):
+    """Test that a changed collection marker drops the entries reading it."""
+    revisions = {'genes': '1', 'variants': '1'}
+    marker = Mock(side_effect=lambda name: revisions[name])
+    cache = ResultCache(marker=marker, check_interval=0)
+    cache.set('genes', 'FOR g IN genes RETURN g', [{'name': 'PAH'}])
+    cache.set('variants', 'FOR v IN variants RETURN v', [{'rsid': ['rs1']}])
+
+    revisions['genes'] = '2'
+
+    assert cache.get('genes') is None
+    assert cache.get('variants') == [{'rsid': ['rs1']}]
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_markers_are_checked_at_most_every_interval():
+    """Test that collection markers are not read on every request."""
+    marker = Mock(return_value='1')
+    cache = ResultCache(marker=marker, check_interval=3600)
+    cache.set('k', 'FOR g IN genes RETURN g', [])
+    for _ in range(3):
+        assert cache.get('k') == []
+
+    assert marker.call_count == 1
+
+
+def test_marker_errors_keep_entries():
+    """Test that a failing marker lookup does not break the cache."""
+    marker = Mock(side_effect=RuntimeError('down'))
+    cache = ResultCache(marker=marker, check_interval=0)
+    cache.set('k', 'FOR g IN genes RETURN g', [1])
+
+    assert cache.get('k') == [1]
+
+
+def test_disabled_cache():
+    """Test that a zero-sized cache stores nothing."""
+    cache = ResultCache(max_size=0)
+    cache.set('k', 'FOR g IN genes RETURN g', [1])
+
+    assert cache.get('k') is None
@@ -0,0 +1,66 @@
+from result_renderer import ResultRenderer
+
+
+AQL = 'FOR g IN genes FILTER g.name == "NOPE" LIMIT 5 RETURN g'
+
+
+def test_empty_results_get_a_fixed_answer_with_the_query():
+    """Test that empty results are answered with the query that ran."""
+    renderer = ResultRenderer()
+
+    for result in ([], None, [None], [[]]):
+        answer = renderer.render(AQL + '\n', result)
+        assert answer.startswith('No records were found in the IGVF Catalog')
+        assert answer.endswith(AQL)
+    assert renderer.stats()['empty'] == 4
+
+
+def test_scalars_are_rendered():
+    """Test that counts and short value lists are rendered inline."""
+    renderer = ResultRenderer()
+
+    assert renderer.render(AQL, [42]) == 'The answer is 42.'
+    assert (renderer.render(AQL, ['PAH', 'SAMD11'])
+            == 'Found 2 results: PAH; SAMD11.')
+
+
+def test_regular_documents_are_rendered():
+    """Test that small documents sharing attributes become a list."""
+    renderer = ResultRenderer()
+    rows = [
+        {'_id': 'genes/ENSG00000171759', '_key': 'ENSG00000171759', '_rev': 'x',
+         'name': 'PAH', 'chr': 'chr12', 'synonyms': ['PH', 'PKU']},
+        {'_id': 'genes/ENSG00000187634', '_key': 'ENSG00000187634', '_rev': 'y',
+         'name': 'SAMD11', 'chr': 'chr1', 'synonyms': []},
+    ]
+
+    assert renderer.render(AQL, rows) == (
+        'Found 2 records in genes:\n'
+        '- _id: genes/ENSG00000171759; name: PAH; chr: chr12; synonyms: PH, PKU\n'
+        '- _id: genes/ENSG00000187634; name: SAMD11; chr: chr1; synonyms: ')
+    assert renderer.render(AQL, [{'name': 'PAH', 'count': 3}]) == (
+        'Found 1 record:\n- name: PAH; count: 3')
+    assert renderer.stats()['rendered'] == 2
+
+
+def test_large_or_irregular_results_go_to_the_llm():
+    """Test that results templates cannot render well are left to summarization."""
+    renderer = ResultRenderer(max_rows=2, max_fields=3, max_value_chars=10)
+
+    assert renderer.render(AQL, [{'a': 1}, {'a': 2}, {'a': 3}]) is None
+    assert renderer.render(AQL, [{'a': 1}, {'b': 2}]) is None
+    assert renderer.render(AQL, [{'a': 1, 'b': 2, 'c': 3, 'd': 4}]) is None
+    assert renderer.render(AQL, [{'a': 'a long description'}]) is None
+    assert renderer.render(AQL, [{'a': {'nested': 1}}]) is None
+    assert renderer.render(AQL, [{'a': 1}, 2]) is None
+    assert renderer.stats() == {'empty': 0, 'rendered': 0, 'summarized': 6}
+
+
+def test_lists_with_long_items_go_to_the_llm():
+    """Test that a list with an item too long to write out is summarized."""
+    renderer = ResultRenderer()
+
+    assert renderer.render(
+        AQL, [{'_id': 'genes/1', 'alias': ['x' * 200, 'y']}]) is None
+    assert renderer.render(AQL, [['x' * 200, 'y']]) is None
+    assert renderer.stats()['summarized'] == 2
@@ -0,0 +1,125 @@
+import re
+import threading
+import pytest
+from unittest.mock import Mock
+from langchain_community.graphs import ArangoGraph
+from schema_builder import build_schema, sample_collection
+
+
+DOCS = {
+    'genes': [{'_key': 'ENSG00000171759', 'name': 'PAH', 'start': 102836888}],
+    'variants': [{'_key': 'v1', 'spdi': 'NC_000012.12:102855312:C:T', 'rsid': ['rs5030858']}],
+    'variants_genes': [{'_from': 'variants/v1', '_to': 'genes/ENSG00000171759', 'p_value': 0.01}],
+    'empty': [],
+}
+TYPES = {'genes': 'document', 'variants': 'document',
+         'variants_genes': 'edge', 'empty': 'document'}
+
+
+class FakeDatabase:
+    """Enough of arango's StandardDatabase for schema sampling."""
+
+    def __init__(self, docs=DOCS, on_execute=None):
+        self.docs = docs
+        self.on_execute = on_execute
+        self.aql = Mock()
+        self.aql.execute.side_effect = self._execute
+
+    def graphs(self):
+        return [{'name': 'igvf', 'edge_definitions': [{'edge_collection': 'variants_genes'}]}]
+
+    def collections(self):
+        return [{'name': '_system_things', 'type': 'document', 'system': True}] + [
+            {'name': name, 'type': TYPES[name], 'system': False} for name in self.docs]
+
+    def collection(self, name):
+        collection = Mock()
+        collection.count.return_value = len(self.docs[name])
+        return collection
+
+    def _execute(self, query, bind_vars=None, **kwargs):
+        if bind_vars:
+            name, limit = bind_vars['@collection'], bind_vars['sample_size']
+        else:
+            name = re.search(r'`(\w+)`', query).group(1)
+            limit = int(re.search(r'LIMIT (\d+)', query).group(1))
+        if self.on_execute:
+            self.on_execute(name)
+        return iter(self.docs[name][:limit])
+
+
+def arango_graph_schema(db):
+    graph = ArangoGraph.__new__(ArangoGraph)
+    graph._ArangoGraph__db = db
+    return graph.generate_schema()
+
+
+def test_build_schema_matches_arango_graph():
+    """Test that the parallel builder produces ArangoGraph's schema structure."""
+    db = FakeDatabase()
+    assert build_schema(db, max_workers=4) == arango_graph_schema(db)
+
+
+def test_build_schema_skips_system_and_empty_collections():
+    """Test that system and empty collections are left out."""
+    schema = build_schema(FakeDatabase())
+    names = [c['collection_name'] for c in schema['Collection Schema']]
+    assert names == ['genes', 'variants', 'variants_genes']
+    assert schema['Graph Schema'][0]['graph_name'] == 'igvf'
+
+
+def test_build_schema_samples_concurrently():
+    """Test that collections are sampled at the same time, not one by one."""
+    # Every sampling call waits until all three are in flight; a serial
+    # builder would break the barrier.
+    barrier = threading.Barrier(3, timeout=5)
+    db = FakeDatabase(on_execute=lambda name: barrier.wait())
+
+    schema = build_schema(db, max_workers=3)
+
+    assert len(schema['Collection Schema']) == 3
+
+
+def test_build_schema_drops_failed_collection():
+    """Test that a collection that errors does not fail the whole build."""
+    def fail_variants(name):
+        if name == 'variants':
+            raise RuntimeError('boom')
+
+    schema = build_schema(FakeDatabase(on_execute=fail_variants))
+    names = [c['collection_name'] for c in schema['Collection Schema']]
+    assert names == ['genes', 'variants_genes']
+
+
+def test_build_schema_drops_slow_collection():
+    """Test that a collection exceeding the timeout is left out."""
+    release = threading.Event()
+
+    def hang_variants(name):
+        if name == 'variants':
+            release.wait(5)
+
+    try:
+        db = FakeDatabase(on_execute=hang_variants)
+        schema = build_schema(db, timeout=0.2, max_workers=4)
+    finally:
+        release.set()
+    names = [c['collection_name'] for c in schema['Collection Schema']]
+    assert names == ['genes', 'variants_genes']
+
+
+def test_sample_collection_with_larger_sample():
+    """Test that sampling several documents merges their properties once."""
+    docs = {'genes': [{'_key': '1', 'name': 'PAH'},
+                      {'_key': '2', 'name': 'BRCA1', 'alias': ['x']}]}
+    db = FakeDatabase(docs=docs)
+
+    entry = sample_collection(db, 'genes', 'document',
+                              sample_size=2, timeout=5)
+
+    assert [p['name']
+            for p in entry['document_properties']] == ['_key', 'name', 'alias']
+    assert entry['example_document']['name'] == 'BRCA1'
+    _, kwargs = db.aql.execute.call_args
+    assert kwargs['bind_vars'] == {'@collection': 'genes', 'sample_size': 2}
+    assert kwargs['max_runtime'] == 5
@@ -0,0 +1,111 @@
+from schema_compactor import (COMPACT, DROPPED, FIELDS, compact_collection,
+                              compact_graph_schema, count_tokens, pack,
+                              truncate_value)
+from schema_registry import SchemaRegistry
+
+
+def char_tokens(text):
+    return len(text)
+
+
+def test_compact_collection_keeps_names_and_types(catalog_schema):
+    """Test that properties become a name -> type map without noisy fields."""
+    genes = catalog_schema['Collection Schema'][0]
+    result = compact_collection(genes)
+
+    assert result['collection_name'] == 'genes'
+    assert result['document_properties']['start'] == 'int'
+    assert '_rev' not in result['document_properties']
+    assert 'source_url' not in result['document_properties']
+    assert '_rev' not in result['example_document']
+    assert result['example_document']['_key'] == 'ENSG00000171759'
+
+
+def test_compact_collection_fields_level_drops_example(catalog_schema):
+    """Test that the fields level leaves the example document out."""
+    genes = catalog_schema['Collection Schema'][0]
+    result = compact_collection(genes, FIELDS)
+
+    assert 'example_document' not in result
+    assert len(repr(result)) < len(repr(compact_collection(genes)))
+
+
+def test_truncate_value():
+    """Test that long strings, long lists and deep dicts are shortened."""
+    assert truncate_value('x' * 100, max_chars=10) == 'x' * 10 + '...'
+    assert truncate_value([1, 2, 3, 4, 5], max_items=2) == [1, 2, '... 3 more']
+    assert truncate_value({'a': {'b': {'c': 1}}}) == {'a': {'b': '{...}'}}
+    assert truncate_value(7) == 7
+
+
+def test_compact_graph_schema_keeps_selected_edges(catalog_schema):
+    """Test that only edge definitions for selected edges are kept."""
+    result = compact_graph_schema(
+        catalog_schema['Graph Schema'], ['variants', 'genes', 'variants_genes'])
+
+    edges = [d['edge_collection']
+             for g in result for d in g['edge_definitions']]
+    assert edges == ['variants_genes']
+    assert compact_graph_schema(
+        catalog_schema['Graph Schema'], ['genes']) == []
+
+
+def test_pack_downgrades_largest_collections_first():
+    """Test that the largest collections lose detail first."""
+    counts = {
+        'genes': {COMPACT: 50, FIELDS: 20},
+        'variants': {COMPACT: 200, FIELDS: 40},
+    }
+
+    assert pack(counts, None) == {'genes': COMPACT, 'variants': COMPACT}
+    assert pack(counts, 250) == {'genes': COMPACT, 'variants': COMPACT}
+    assert pack(counts, 100) == {'genes': COMPACT, 'variants': FIELDS}
+    assert pack(counts, 60) == {'genes': FIELDS, 'variants': FIELDS}
+    assert pack(counts, 30) == {'genes': FIELDS, 'variants': DROPPED}
+    assert pack(counts, 10) == {'genes': DROPPED, 'variants': DROPPED}
+
+
+def test_count_tokens_is_positive():
+    """Test that token counting works with or without the tiktoken encoding."""
+    assert count_tokens('FOR g IN genes RETURN g') > 0
+    assert count_tokens('') == 0
+
+
+def test_compact_registry_view_fits_budget(catalog_schema):
+    """Test that a compact view stays under the token budget and reports it."""
+    registry = SchemaRegistry(catalog_schema, compact=True,
+                              token_budget=None, count_tokens=char_tokens)
+    selected = ['genes', 'variants', 'variants_genes']
+    full = registry.view(selected)
+    budget = sum(registry.token_counts[name][COMPACT] for name in selected) - 1
+
+    view = registry.view(selected, token_budget=budget)
+    report = view.report()
+
+    assert full.report()['levels'] == dict.fromkeys(selected, COMPACT)
+    assert FIELDS in report['levels'].values()
+    assert report['tokens'] == len(str(view))
+    assert report['tokens'] < len(str(full))
+    assert len(str(full)) < len(
+        str(SchemaRegistry(catalog_schema).view(selected)))
+
+
+def test_compact_registry_view_drops_collections_over_budget(catalog_schema):
+    """Test that collections that do not fit are left out of the view."""
+    registry = SchemaRegistry(catalog_schema, compact=True,
+                              token_budget=1, count_tokens=char_tokens)
+    view = registry.view(['genes', 'variants_genes'])
+
+    assert view.collection_names == ()
+    assert view['Graph Schema'] == ()
+    assert view.report()['levels'] == {
+        'genes': DROPPED, 'variants_genes': DROPPED}
+
+
+def test_compact_registry_view_serializes_the_graph_schema_as_lists(catalog_schema):
+    """Test that the compacted graph schema reaches the prompt as plain dicts and lists."""
+    view = SchemaRegistry(catalog_schema, compact=True).view(
+        ['genes', 'variants', 'variants_genes'])
+
+    assert 'mappingproxy' not in str(view)
+    assert "'from_vertex_collections': ['variants']" in str(view)
@@ -0,0 +1,276 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import AsyncMock, Mock
+from langchain_community.graphs import ArangoGraph
+from aql_guard import AqlGuard, AqlGuardError
+from metrics import ShapeTimings
+from result_cache import ResultCache
+from schema_registry import GraphView, SchemaRegistry, freeze, thaw
+
+
+def test_view_formats_like_the_schema_dict(catalog_schema):
+    """Test that a view formats into prompts exactly as the equivalent dict did."""
+    registry = SchemaRegistry(catalog_schema)
+    selected = ['genes', 'variants']
+
+    expected = {
+        'Graph Schema': catalog_schema['Graph Schema'],
+        'Collection Schema': [
+            c for name in selected for c in catalog_schema['Collection Schema']
+            if c['collection_name'] == name],
+    }
+
+    assert str(registry.view(selected)) == str(expected)
+    assert '{adb_schema}'.format(
+        adb_schema=registry.view(selected)) == str(expected)
+
+
+def test_view_uses_registry_order_and_skips_unknown(catalog_schema):
+    """Test that the view has a stable order and ignores unknown names."""
+    registry = SchemaRegistry(catalog_schema)
+    view = registry.view(['variants', 'unknown', 'genes', 'variants'])
+
+    assert view.collection_names == ('genes', 'variants')
+    assert [c['collection_name']
+            for c in view['Collection Schema']] == ['genes', 'variants']
+    assert str(view) == str(registry.view(['genes', 'variants']))
+
+
+def test_view_is_read_only(catalog_schema):
+    """Test that neither the view nor its collections can be modified."""
+    registry = SchemaRegistry(catalog_schema)
+    view = registry.view(['genes'])
+
+    with pytest.raises(TypeError):
+        view['Collection Schema'] = []
+    with pytest.raises(TypeError):
+        view['Collection Schema'][0]['collection_name'] = 'variants'
+    assert registry.collection('genes')['collection_name'] == 'genes'
+
+
+def test_view_to_dict(catalog_schema):
+    """Test that a view converts back to plain JSON-compatible data."""
+    view = SchemaRegistry(catalog_schema).view(['genes'])
+    result = view.to_dict()
+
+    assert isinstance(result['Collection Schema'], list)
+    assert isinstance(result['Collection Schema'][0], dict)
+    assert result['Graph Schema'] == catalog_schema['Graph Schema']
+
+
+def test_registry_lookup(catalog_schema):
+    """Test registry membership and lookups."""
+    registry = SchemaRegistry(catalog_schema)
+
+    assert 'genes' in registry
+    assert 'unknown' not in registry
+    assert len(registry) == len(catalog_schema['Collection Schema'])
+    assert registry.collection_names[0] == 'genes'
+
+
+def test_empty_registry():
+    """Test a registry built without a schema."""
+    registry = SchemaRegistry(None)
+    assert len(registry) == 0
+    assert (str(registry.view(['genes']))
+            == "{'Graph Schema': [], 'Collection Schema': []}")
+
+
+def test_freeze_and_thaw_round_trip():
+    """Test that freezing and thawing returns equal plain data."""
+    value = {'a': [1, {'b': [2, 3]}], 'c': 'd'}
+    assert thaw(freeze(value)) == value
+
+
+def test_graph_view_query_uses_shared_db(catalog_schema):
+    """Test that GraphView queries through the db it was given."""
+    db = Mock()
+    db.aql.execute.return_value = iter([{'a': 1}, {'a': 2}, {'a': 3}])
+    graph = GraphView(db, SchemaRegistry(catalog_schema).view(['genes']))
+
+    assert isinstance(graph, ArangoGraph)
+    assert graph.query('FOR g IN genes RETURN g', 2) == [{'a': 1}, {'a': 2}]
+    db.aql.execute.assert_called_once_with('FOR g IN genes RETURN g')
+    with pytest.raises(TypeError):
+        graph.set_schema({})
+
+
+def test_graph_view_query_uses_result_cache(catalog_schema):
+    """Test that repeated queries are served from the result cache."""
+    db = Mock()
+    db.aql.execute.side_effect = lambda *args, **kwargs: iter([{'a': 1}])
+    cache = ResultCache()
+    view = SchemaRegistry(catalog_schema).view(['genes'])
+
+    first = GraphView(db, view, result_cache=cache).query(
+        'FOR g IN genes RETURN g', 5)
+    second = GraphView(db, view, result_cache=cache).query(
+        'FOR g  IN genes\nRETURN g', 5)
+
+    assert first == second == [{'a': 1}]
+    assert db.aql.execute.call_count == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_graph_view_query_asks_for_server_cache_when_read_only(catalog_schema):
+    """Test that only read-only queries request ArangoDB's result cache."""
+    db = Mock()
+    db.aql.execute.return_value = iter([])
+    view = SchemaRegistry(catalog_schema).view(['genes'])
+    graph = GraphView(db, view, server_cache=True)
+
+    graph.query('FOR g IN genes RETURN g')
+    assert db.aql.execute.call_args[1] == {'cache': True}
+    graph.query('FOR g IN genes REMOVE g IN genes')
+    assert db.aql.execute.call_args[1] == {}
+
+
+def test_graph_view_query_parameterizes_literals(catalog_schema):
+    """Test that literals are lifted into bind variables before execution."""
+    db = Mock()
+    db.aql.execute.side_effect = lambda *args, **kwargs: iter([{'a': 1}])
+    cache = ResultCache()
+    view = SchemaRegistry(catalog_schema).view(['genes'])
+    graph = GraphView(db, view, result_cache=cache, parameterize=True)
+
+    graph.query('FOR g IN genes FILTER g.name == "PAH" RETURN g', 5)
+    graph.query('FOR g IN genes FILTER g.name == "SAMD11" RETURN g', 5)
+    graph.query('for g in genes filter g.name == \'PAH\' return g', 5)
+
+    first, second = db.aql.execute.call_args_list
+    assert first[0][0] == second[0][0] == 'FOR g IN genes FILTER g.name == @lit0 RETURN g'
+    assert first[1]['bind_vars'] == {'lit0': 'PAH'}
+    assert second[1]['bind_vars'] == {'lit0': 'SAMD11'}
+    assert cache.stats()['hits'] == 1
+
+
+def test_graph_view_caches_parameterized_documents_under_their_collection(catalog_schema):
+    """Test that results stay invalidated by collections lifted into bind variables."""
+    db = Mock()
+    db.aql.execute.side_effect = lambda *args, **kwargs: iter(
+        [{'name': 'PAH'}])
+    cache = ResultCache()
+    graph = GraphView(db, SchemaRegistry(catalog_schema).view(['genes']),
+                      result_cache=cache, parameterize=True)
+
+    graph.query('RETURN DOCUMENT("genes/ENSG00000171759")', 5)
+    assert db.aql.execute.call_args[0][0] == 'RETURN DOCUMENT(@lit0)'
+    cache.invalidate('genes')
+
+    assert cache.stats()['invalidations'] == 1
+    assert len(cache) == 0
+
+
+def test_graph_view_times_query_shapes(catalog_schema):
+    """Test that parameterized queries are timed per shape in `shape_timings`."""
+    db = Mock()
+    db.aql.execute.side_effect = lambda *args, **kwargs: iter([])
+    timings = ShapeTimings()
+    graph = GraphView(db, SchemaRegistry(catalog_schema).view(['genes']),
+                      parameterize=True, shape_timings=timings)
+
+    graph.query('FOR g IN genes FILTER g.name == "PAH" RETURN g', 5)
+    graph.query('FOR g IN genes FILTER g.name == "SAMD11" RETURN g', 5)
+
+    (timing,) = timings.snapshot()['shapes'].values()
+    assert timing['count'] == 2
+
+
+def test_graph_view_query_runs_through_the_guard(catalog_schema):
+    """Test that queries are rewritten, explained and run with the guard's limits."""
+    db = Mock()
+    db.aql.explain.return_value = {'estimatedCost': 10, 'nodes': []}
+    db.aql.execute.return_value = iter([{'a': 1}])
+    graph = GraphView(db, SchemaRegistry(catalog_schema).view(['genes']),
+                      parameterize=True, guard=AqlGuard(db, memory_limit=1024))
+
+    rows = graph.query('FOR g IN genes FILTER g.name == "PAH" RETURN g', 5)
+    assert rows == [{'a': 1}]
+    aql = 'FOR g IN genes FILTER g.name == @lit0 LIMIT @lit1 RETURN g'
+    db.aql.explain.assert_called_once_with(
+        aql, bind_vars={'lit0': 'PAH', 'lit1': 5})
+    db.aql.execute.assert_called_once_with(
+        aql, bind_vars={'lit0': 'PAH', 'lit1': 5}, max_runtime=30, memory_limit=1024)
+
+
+def test_graph_view_counts_added_limits_once_per_query(catalog_schema):
+    """Test that a query estimated before it runs counts its added LIMIT once."""
+    db = Mock()
+    db.aql.explain.return_value = {'estimatedCost': 10, 'nodes': []}
+    db.aql.execute.return_value = iter([])
+    guard = AqlGuard(db)
+    view = SchemaRegistry(catalog_schema).view(['genes'])
+    graph = GraphView(db, view, guard=guard)
+
+    graph.estimate('FOR g IN genes RETURN g', 5)
+    graph.query('FOR g IN genes RETURN g', 5, check=False)
+
+    assert guard.stats()['limits_added'] == 1
+
+
+def test_graph_view_query_does_not_run_rejected_queries(catalog_schema):
+    """Test that a plan rejected by the guard never reaches execution."""
+    db = Mock()
+    db.aql.explain.return_value = {'estimatedCost': 1e9, 'nodes': []}
+    graph = GraphView(db, SchemaRegistry(catalog_schema).view(['genes']),
+                      guard=AqlGuard(db))
+
+    with pytest.raises(AqlGuardError):
+        graph.query('FOR g IN genes RETURN g', 5)
+    db.aql.execute.assert_not_called()
+
+
+def test_graph_view_aquery_runs_through_the_async_db(catalog_schema):
+    """Test that aquery explains and executes through async_db with the same rewrite."""
+    db = Mock()
+    async_db = AsyncMock()
+    async_db.explain.return_value = {'estimatedCost': 10, 'nodes': []}
+    async_db.execute.return_value = [{'a': 1}]
+    guard = AqlGuard(db, async_db=async_db)
+    graph = GraphView(db, SchemaRegistry(catalog_schema).view(['genes']),
+                      parameterize=True, guard=guard, async_db=async_db)
+
+    rows = asyncio.run(graph.aquery(
+        'FOR g IN genes FILTER g.name == "PAH" RETURN g', 5))
+
+    assert rows == [{'a': 1}]
+    aql = 'FOR g IN genes FILTER g.name == @lit0 LIMIT @lit1 RETURN g'
+    async_db.explain.assert_awaited_once_with(
+        aql, bind_vars={'lit0': 'PAH', 'lit1': 5})
+    async_db.execute.assert_awaited_once_with(
+        aql, top_k=5, bind_vars={'lit0': 'PAH', 'lit1': 5}, max_runtime=30)
+    db.aql.execute.assert_not_called()
+
+
+def test_graph_view_aquery_reads_markers_off_the_event_loop(catalog_schema):
+    """Test that the result cache's collection markers are read in a thread."""
+    threads = []
+
+    def marker(collection):
+        threads.append(threading.current_thread())
+        return 'r1'
+
+    async_db = AsyncMock()
+    async_db.execute.return_value = [{'a': 1}]
+    cache = ResultCache(marker=marker, check_interval=0)
+    view = SchemaRegistry(catalog_schema).view(['genes'])
+    graph = GraphView(Mock(), view, result_cache=cache, async_db=async_db)
+
+    for _ in range(2):
+        rows = asyncio.run(graph.aquery('FOR g IN genes RETURN g', 5))
+
+    assert rows == [{'a': 1}]
+    async_db.execute.assert_awaited_once()
+    assert threads
+    assert threading.main_thread() not in threads
+
+
+def test_graph_view_aquery_without_async_db_runs_in_a_thread(catalog_schema):
+    """Test that aquery falls back to the synchronous client."""
+    db = Mock()
+    db.aql.execute.return_value = iter([{'a': 1}])
+    graph = GraphView(db, SchemaRegistry(catalog_schema).view(['genes']))
+
+    assert asyncio.run(graph.aquery(
+        'FOR g IN genes RETURN g', 5)) == [{'a': 1}]
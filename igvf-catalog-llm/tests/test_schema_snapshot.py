@@ -0,0 +1,151 @@
+import json
+import os
+import pytest
+from unittest.mock import patch
+from arango import ArangoClient
+from arango.exceptions import ServerConnectionError
+from schema_snapshot import (
+    SNAPSHOT_FORMAT_VERSION, SnapshotArangoGraph, build_snapshot, load_snapshot, write_snapshot)
+
+
+@pytest.fixture
+def db():
+    # client.db() does not contact the server unless verify=True
+    return ArangoClient(hosts='https://test-db.example.com/').db('igvf', username='u', password='p')
+
+
+def test_build_snapshot(catalog_schema):
+    """Test snapshot metadata."""
+    snapshot = build_snapshot(
+        catalog_schema, 'https://db.example.com/', 'igvf', 'v1')
+
+    assert snapshot['format_version'] == SNAPSHOT_FORMAT_VERSION
+    assert snapshot['backend_url'] == 'https://db.example.com/'
+    assert snapshot['data_release'] == 'v1'
+    assert snapshot['collection_names'][:2] == ['genes', 'transcripts']
+    assert snapshot['schema']['Graph Schema'][0]['edge_definitions']
+    assert snapshot['schema_version']
+
+
+def test_write_and_load_round_trip(catalog_schema, tmp_path):
+    """Test that a written snapshot loads back unchanged."""
+    path = str(tmp_path / 'snapshot.json')
+    snapshot = build_snapshot(
+        catalog_schema, 'https://db.example.com/', 'igvf')
+    write_snapshot(path, snapshot)
+
+    assert load_snapshot(path) == snapshot
+    assert os.listdir(tmp_path) == ['snapshot.json']
+
+
+def test_load_missing_snapshot(tmp_path):
+    """Test that a missing or unset snapshot path yields None."""
+    assert load_snapshot(str(tmp_path / 'missing.json')) is None
+    assert load_snapshot(None) is None
+
+
+def test_load_corrupt_snapshot(tmp_path):
+    """Test that an unreadable snapshot is treated as missing."""
+    path = tmp_path / 'snapshot.json'
+    path.write_text('{not json')
+    assert load_snapshot(str(path)) is None
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'max_age': 60},
+    {'backend_url': 'https://other.example.com/'},
+    {'data_release': 'v2'},
+])
+def test_load_stale_snapshot(catalog_schema, tmp_path, kwargs):
+    """Test that old, foreign or outdated snapshots are rejected."""
+    path = str(tmp_path / 'snapshot.json')
+    snapshot = build_snapshot(
+        catalog_schema, 'https://db.example.com/', 'igvf', 'v1')
+    snapshot['created_at'] -= 3600
+    write_snapshot(path, snapshot)
+
+    assert load_snapshot(path, **kwargs) is None
+
+
+def test_load_other_format_version(catalog_schema, tmp_path):
+    """Test that snapshots from another format version are rejected."""
+    path = tmp_path / 'snapshot.json'
+    snapshot = build_snapshot(
+        catalog_schema, 'https://db.example.com/', 'igvf')
+    snapshot['format_version'] = SNAPSHOT_FORMAT_VERSION + 1
+    path.write_text(json.dumps(snapshot))
+    assert load_snapshot(str(path)) is None
+
+
+def test_snapshot_graph_does_not_sample(db, catalog_schema):
+    """Test that a snapshot graph uses the given schema without querying Arango."""
+    with patch('langchain_community.graphs.arangodb_graph.ArangoGraph.generate_schema') as generate:
+        graph = SnapshotArangoGraph(db, catalog_schema)
+
+    generate.assert_not_called()
+    assert graph.schema == catalog_schema
+    assert graph.db is db
+
+
+def connect_unverified(app):
+    # The test database cannot be reached to verify the connection
+    connect = app.connect_arango_db
+    return lambda http_client, verify=False: connect(http_client)
+
+
+def test_initialize_arango_graph_prefers_snapshot(schema_snapshot, tmp_path):
+    """Test that app start up loads a fresh snapshot instead of sampling."""
+    import app
+    path = str(tmp_path / 'snapshot.json')
+    write_snapshot(path, {**schema_snapshot, 'backend_url': app.BACKEND_URL,
+                          'created_at': 0})
+
+    with patch('app.SCHEMA_SNAPSHOT_PATH', path), \
+            patch('app.SCHEMA_SNAPSHOT_MAX_AGE', None), \
+            patch('app.connect_arango_db',
+                  side_effect=connect_unverified(app)) as mock_connect, \
+            patch('app.build_schema') as mock_build_schema:
+        graph, healthy, error = app.initialize_arango_graph()
+
+    mock_connect.assert_called_once_with(app.arango_http_client, verify=True)
+    mock_build_schema.assert_not_called()
+    assert healthy is True
+    assert error is None
+    assert graph.schema == schema_snapshot['schema']
+
+
+def test_initialize_arango_graph_with_snapshot_reports_connection_errors(
+        schema_snapshot, tmp_path):
+    """Test that an unreachable database is unhealthy even with a snapshot."""
+    import app
+    path = str(tmp_path / 'snapshot.json')
+    write_snapshot(path, {**schema_snapshot, 'backend_url': app.BACKEND_URL,
+                          'created_at': 0})
+
+    with patch('app.SCHEMA_SNAPSHOT_PATH', path), \
+            patch('app.SCHEMA_SNAPSHOT_MAX_AGE', None), \
+            patch('app.connect_arango_db',
+                  side_effect=ServerConnectionError('unauthorized')):
+        graph, healthy, error = app.initialize_arango_graph()
+
+    assert graph is None
+    assert healthy is False
+    assert 'unauthorized' in error
+
+
+def test_initialize_arango_graph_writes_snapshot_after_sampling(catalog_schema, tmp_path):
+    """Test that a missing snapshot is sampled once and then written."""
+    import app
+    path = str(tmp_path / 'snapshot.json')
+
+    with patch('app.SCHEMA_SNAPSHOT_PATH', path), \
+            patch('app.connect_arango_db',
+                  side_effect=connect_unverified(app)), \
+            patch('app.build_schema', return_value=catalog_schema) as mock_build_schema:
+        graph, healthy, _ = app.initialize_arango_graph()
+
+    mock_build_schema.assert_called_once()
+    assert healthy is True
+    assert graph.schema == catalog_schema
+    snapshot = load_snapshot(path, backend_url=app.BACKEND_URL)
+    assert snapshot['schema'] == catalog_schema
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import patch, Mock
 from select_collections import create_prompt, select_collections
+from metrics import metrics
 
 
 def test_create_prompt_basic():
@@ -44,14 +45,14 @@ def test_create_prompt_contains_examples():
     assert 'answer: [' in result
 
 
-@patch('select_collections.openai')
-def test_select_collections_success(mock_openai):
+@patch('select_collections.openai_pool')
+def test_select_collections_success(mock_pool):
     """Test successful collection selection."""
     # Mock the OpenAI response
     mock_response = Mock()
     mock_response.choices = [Mock()]
     mock_response.choices[0].message.content = '{"category_names": ["genes", "diseases_genes"]}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_pool.client.chat.completions.create.return_value = mock_response
 
     query = 'What diseases are associated with gene PAH?'
     collection_names = ['genes', 'diseases_genes', 'variants']
@@ -59,16 +60,16 @@ def test_select_collections_success(mock_openai):
     result = select_collections(query, collection_names)
 
     assert result == ['genes', 'diseases_genes']
-    mock_openai.chat.completions.create.assert_called_once()
+    mock_pool.client.chat.completions.create.assert_called_once()
 
 
-@patch('select_collections.openai')
-def test_select_collections_single_category(mock_openai):
+@patch('select_collections.openai_pool')
+def test_select_collections_single_category(mock_pool):
     """Test collection selection with single category."""
     mock_response = Mock()
     mock_response.choices = [Mock()]
     mock_response.choices[0].message.content = '{"category_names": ["genes"]}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_pool.client.chat.completions.create.return_value = mock_response
 
     query = 'Tell me about gene PAH?'
     collection_names = ['genes', 'diseases_genes', 'variants']
@@ -78,13 +79,13 @@ def test_select_collections_single_category(mock_openai):
     assert result == ['genes']
 
 
-@patch('select_collections.openai')
-def test_select_collections_invalid_json(mock_openai):
+@patch('select_collections.openai_pool')
+def test_select_collections_invalid_json(mock_pool):
     """Test collection selection with invalid JSON response."""
     mock_response = Mock()
     mock_response.choices = [Mock()]
     mock_response.choices[0].message.content = 'Invalid JSON response'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_pool.client.chat.completions.create.return_value = mock_response
 
     query = 'Test query'
     collection_names = ['genes', 'diseases']
@@ -95,13 +96,13 @@ def test_select_collections_invalid_json(mock_openai):
     assert result == 'Invalid JSON response'
 
 
-@patch('select_collections.openai')
-def test_select_collections_missing_category_names(mock_openai):
+@patch('select_collections.openai_pool')
+def test_select_collections_missing_category_names(mock_pool):
     """Test collection selection with missing category_names in response."""
     mock_response = Mock()
     mock_response.choices = [Mock()]
     mock_response.choices[0].message.content = '{"other_field": ["genes"]}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_pool.client.chat.completions.create.return_value = mock_response
 
     query = 'Test query'
     collection_names = ['genes', 'diseases']
@@ -112,10 +113,11 @@ def test_select_collections_missing_category_names(mock_openai):
     assert result == '{"other_field": ["genes"]}'
 
 
-@patch('select_collections.openai')
-def test_select_collections_api_error(mock_openai):
+@patch('select_collections.openai_pool')
+def test_select_collections_api_error(mock_pool):
     """Test collection selection with API error."""
-    mock_openai.chat.completions.create.side_effect = Exception('API Error')
+    mock_pool.client.chat.completions.create.side_effect = Exception(
+        'API Error')
 
     query = 'Test query'
     collection_names = ['genes', 'diseases']
@@ -124,13 +126,13 @@ def test_select_collections_api_error(mock_openai):
         select_collections(query, collection_names)
 
 
-@patch('select_collections.openai')
-def test_select_collections_verify_api_call(mock_openai):
+@patch('select_collections.openai_pool')
+def test_select_collections_verify_api_call(mock_pool):
     """Test that the API is called with correct parameters."""
     mock_response = Mock()
     mock_response.choices = [Mock()]
     mock_response.choices[0].message.content = '{"category_names": ["genes"]}'
-    mock_openai.chat.completions.create.return_value = mock_response
+    mock_pool.client.chat.completions.create.return_value = mock_response
 
     query = 'Test query'
     collection_names = ['genes', 'diseases']
@@ -138,9 +140,41 @@ def test_select_collections_verify_api_call(mock_openai):
     select_collections(query, collection_names)
 
     # Verify the API call parameters
-    call_args = mock_openai.chat.completions.create.call_args
+    call_args = mock_pool.client.chat.completions.create.call_args
     assert call_args[1]['model'] == 'gpt-4o'
     assert call_args[1]['temperature'] == 0
     assert call_args[1]['response_format'] == {'type': 'json_object'}
     assert len(call_args[1]['messages']) == 1
     assert call_args[1]['messages'][0]['role'] == 'user'
+
+
+def test_create_prompt_input_comes_last():
+    """Test that the prompt is a static prefix followed by the input."""
+    categories = ['genes', 'diseases_genes', 'variants']
+
+    first = create_prompt('Tell me about gene PAH?', categories)
+    second = create_prompt('What does NEK5 interact with?', categories)
+
+    prefix = first[:first.index('Input: Tell me about gene PAH?')]
+    assert second.startswith(prefix)
+    assert '- diseases_genes' in prefix
+    assert first.rstrip().endswith('Input: Tell me about gene PAH?')
+
+
+@patch('select_collections.openai_pool')
+def test_select_collections_records_cached_tokens(mock_pool):
+    """Test that prompt and cached token counts are recorded from usage."""
+    mock_response = Mock()
+    mock_response.choices = [Mock()]
+    mock_response.choices[0].message.content = '{"category_names": ["genes"]}'
+    mock_response.usage.prompt_tokens = 1200
+    mock_response.usage.completion_tokens = 10
+    mock_response.usage.prompt_tokens_details.cached_tokens = 1024
+    mock_pool.client.chat.completions.create.return_value = mock_response
+    metrics.reset()
+
+    select_collections('Test query', ['genes'])
+
+    assert metrics.counter('tokens.select_collections.prompt') == 1200
+    assert metrics.counter('tokens.select_collections.cached') == 1024
+    metrics.reset()
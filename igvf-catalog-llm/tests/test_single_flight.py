@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_threads_share_one_call():
+    """Test that threads asking for the same key wait for the first call."""
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def answer(question):
+        calls.append(question)
+        release.wait(5)
+        return {'result': question}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('pah', answer, 'PAH')))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()['coalesced'] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['PAH']
+    assert results == [{'result': 'PAH'}] * 5
+    assert flight.stats() == {'leaders': 1, 'coalesced': 4, 'coalesced_rate': 0.8,
+                              'in_flight': 0}
+
+
+def test_finished_calls_are_not_reused():
+    """Test that a key runs again once its call has finished."""
+    flight = SingleFlight()
+    calls = []
+
+    flight.do('pah', calls.append, 1)
+    flight.do('pah', calls.append, 2)
+
+    assert calls == [1, 2]
+    assert flight.stats()['coalesced'] == 0
+
+
+def test_waiting_threads_get_the_error():
+    """Test that an exception reaches every caller of the shared call."""
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        release.wait(5)
+        raise ValueError('no luck')
+
+    def ask():
+        try:
+            flight.do('q', fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=ask) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()['coalesced'] < 2:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == ['no luck'] * 3
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_concurrent_coroutines_share_one_call():
+    """Test that coroutines on one loop share the first call, even if one leaves."""
+    flight = SingleFlight()
+    calls = []
+
+    async def answer(question):
+        calls.append(question)
+        await asyncio.sleep(0.05)
+        return question.upper()
+
+    async def run():
+        leaving = asyncio.ensure_future(flight.ado('pah', answer, 'pah'))
+        others = [asyncio.ensure_future(flight.ado('pah', answer, 'pah'))
+                  for _ in range(3)]
+        await asyncio.sleep(0)
+        leaving.cancel()
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(run()) == ['PAH'] * 3
+    assert calls == ['pah']
+    assert flight.stats()['coalesced'] == 3
+    assert flight.stats()['in_flight'] == 0
@@ -0,0 +1,80 @@
+import pytest
+from text_index import HashedTfidfIndex, ngrams, tokenize
+
+
+def test_tokenize():
+    """Test that tokens are lowercased words and identifiers."""
+    assert tokenize('Tell me about gene PAH?') == [
+        'tell', 'me', 'about', 'gene', 'pah']
+    assert tokenize('ENSG00000187642, score>0.85') == [
+        'ensg00000187642', 'score', '0', '85']
+
+
+def test_ngrams_adds_bigrams():
+    """Test that bigrams are added after the unigrams."""
+    assert ngrams(['a', 'b', 'c']) == ['a', 'b', 'c', 'a b', 'b c']
+
+
+def test_search_empty_index():
+    """Test searching an index with nothing in it."""
+    assert HashedTfidfIndex().search('anything') == []
+
+
+def test_search_ranks_most_similar_first():
+    """Test that the closest text is returned first with its payload."""
+    index = HashedTfidfIndex()
+    index.add('what diseases are associated with gene PAH', 'diseases')
+    index.add('what does NEK5 interact with', 'interactions')
+    index.add('tell me about gene SAMD11', 'gene')
+
+    results = index.search(
+        'which diseases are associated with gene BRCA1', k=2)
+
+    assert results[0][1] == 'diseases'
+    assert results[0][0] > results[1][0]
+    assert len(index) == 3
+
+
+def test_search_exact_match_scores_one():
+    """Test that an identical text has cosine similarity of one."""
+    index = HashedTfidfIndex()
+    index.add('tell me about gene PAH', 'gene')
+    index.add('what does NEK5 interact with', 'interactions')
+
+    score, payload = index.search('tell me about gene PAH', k=1)[0]
+
+    assert payload == 'gene'
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_search_without_shared_terms():
+    """Test that texts sharing no features are not returned."""
+    index = HashedTfidfIndex()
+    index.add('tell me about gene PAH', 'gene')
+
+    assert index.search('zzz qqq') == []
+
+
+def test_search_after_add_matches_a_fresh_index():
+    """Test that items added after a search are weighted like a fresh index."""
+    texts = [f'which genes are near variant rs{i} on chromosome {i % 7}'
+             for i in range(300)]
+    index = HashedTfidfIndex()
+    for text in texts[:150]:
+        index.add(text, text)
+    index.search('genes near rs3')
+    for text in texts[150:]:
+        index.add(text, text)
+    fresh = HashedTfidfIndex()
+    for text in texts:
+        fresh.add(text, text)
+
+    results = index.search('which genes are near rs3', k=3)
+    expected = fresh.search('which genes are near rs3', k=3)
+
+    assert [payload for _, payload in results] == [
+        payload for _, payload in expected]
+    assert [score for score, _ in results] == pytest.approx(
+        [score for score, _ in expected])
+    assert results[0][1] == texts[3]
+    assert len(index) == 300
@@ -0,0 +1,105 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+
+
+_TOKEN = re.compile(r'[a-z0-9_]+')
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def ngrams(tokens):
+    return tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+
+
+class HashedTfidfIndex:
+    """Small in-memory TF-IDF index over hashed word uni- and bigrams.
+
+    Features are hashed with crc32 so vectors are stable across processes.
+    Rows are stored sparsely and document frequencies are updated as items
+    are added, so a search weights rows with the current idf without
+    rebuilding a matrix.
+    """
+
+    def __init__(self, dimensions=4096):
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        self._payloads = []
+        # One (row, feature, 1 + log count) entry per feature of each item
+        self._size = 0
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._features = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._document_frequency = np.zeros(dimensions, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def add(self, text, payload):
+        features, counts = self._counts(text)
+        with self._lock:
+            start = self._size
+            end = start + len(features)
+            if end > len(self._rows):
+                self._grow(end)
+            self._rows[start:end] = len(self._payloads)
+            self._features[start:end] = features
+            self._weights[start:end] = 1 + np.log(counts)
+            self._document_frequency[features] += 1
+            self._size = end
+            self._payloads.append(payload)
+
+    def search(self, text, k=5):
+        with self._lock:
+            count = len(self._payloads)
+            if not count:
+                return []
+            # Adds only write past `_size` or into new arrays, so these
+            # views stay valid once the lock is released.
+            rows = self._rows[:self._size]
+            features = self._features[:self._size]
+            weights = self._weights[:self._size]
+            document_frequency = self._document_frequency.copy()
+            payloads = self._payloads
+
+        idf = np.log((1 + count) / (1 + document_frequency)) + 1
+        query_features, query_counts = self._counts(text)
+        if not len(query_features):
+            return []
+        query = np.zeros(self.dimensions)
+        query[query_features] = (
+            (1 + np.log(query_counts)) * idf[query_features])
+        query /= np.linalg.norm(query)
+
+        values = weights * idf[features]
+        norms = np.sqrt(np.bincount(rows, values * values, minlength=count))
+        scores = np.bincount(rows, values * query[features], minlength=count)
+        scores /= np.where(norms == 0, 1, norms)
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), payloads[i]) for i in top if scores[i] > 0]
+
+    def _counts(self, text):
+        features = [zlib.crc32(gram.encode('utf-8')) % self.dimensions
+                    for gram in ngrams(tokenize(text))]
+        return np.unique(np.array(features, dtype=np.int32),
+                         return_counts=True)
+
+    def _grow(self, size):
+        # New arrays rather than resizing in place, which would invalidate
+        # the views searches hold.
+        capacity = max(size, 2 * len(self._rows), 1024)
+        self._rows = _resized(self._rows, capacity)
+        self._features = _resized(self._features, capacity)
+        self._weights = _resized(self._weights, capacity)
+
+
+def _resized(array, capacity):
+    resized = np.zeros(capacity, dtype=array.dtype)
+    resized[:len(array)] = array
+    return resized